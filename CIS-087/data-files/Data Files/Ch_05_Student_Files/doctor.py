@@ -5,6 +5,7 @@ Conducts an interactive session of nondirective psychotherapy.
 """
 
 import random
+import re
 
 hedges = ("Please tell me more.",
           "Many of my patients tell me the same thing.",
@@ -17,6 +18,43 @@ qualifiers = ("Why do you say that ",
 replacements = {"I":"you", "me":"you", "my":"your",
                 "we":"you", "us":"you", "mine":"yours"} 
 
+def casedReplacements(replacements):
+    """Expands the replacements to lower case, capitalized and all
+    capital words.  "I" is always capitalized, so it becomes "you"
+    (a lower case "i" is left alone)."""
+    cased = {}
+    for word, replacement in replacements.items():
+        word, replacement = word.lower(), replacement.lower()
+        for variant, changed in ((word, replacement),
+                                 (word.capitalize(), replacement.capitalize()),
+                                 (word.upper(), replacement.upper())):
+            if variant == "i":
+                continue
+            if variant == "I":
+                changed = replacement
+            cased.setdefault(variant, changed)
+    return cased
+
+# One regular expression finds every pronoun as a whole word, even next
+# to punctuation ("me."), but not inside a contraction ("I'm").
+casedWords = casedReplacements(replacements)
+pronouns = re.compile(r"(?<![\w'])(?:%s)(?![\w'])" % "|".join(
+    re.escape(word) for word in sorted(casedWords, key=len, reverse=True)))
+
+class ChangedWords(dict):
+    """Remembers how each word was rewritten, so each distinct
+    word only goes through the regular expression once."""
+    MAX_WORDS = 100000
+
+    def __missing__(self, word):
+        if len(self) >= ChangedWords.MAX_WORDS:
+            self.clear()
+        changed = pronouns.sub(lambda match: casedWords[match.group()], word)
+        self[word] = changed
+        return changed
+
+changedWords = ChangedWords()
+
 def reply(sentence):
     """Implements two different reply strategies."""
     probability = random.randint(1, 4)
@@ -28,11 +66,12 @@ def reply(sentence):
 def changePerson(sentence):
     """Replaces first person pronouns with second person
     pronouns."""
-    words = sentence.split()
-    replyWords = []
-    for word in words:
-        replyWords.append(replacements.get(word, word))
-    return " ".join(replyWords) 
+    return " ".join(map(changedWords.__getitem__, sentence.split()))
+
+def changePersons(sentences):
+    """changePerson for a list of sentences, rewriting all of them
+    in one call."""
+    return [changePerson(sentence) for sentence in sentences]
 
 def main():
     """Handles the interaction between patient and doctor."""
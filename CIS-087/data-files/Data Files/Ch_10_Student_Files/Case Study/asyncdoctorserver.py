@@ -0,0 +1,264 @@
+"""
+File: asyncdoctorserver.py
+Server for providing non-directive psychotherapy to thousands of
+patients at once.  Every session is a coroutine on one asyncio event
+loop instead of a thread per patient, and each Doctor keeps only
+its most recent sentences (Doctor.HISTORY_SIZE).
+
+As with doctorserver.py, the doctor greets the patient and answers every
+message (whatever one recv returns) with one reply, so doctorclient.py
+works with either server.  A patient who starts with
+
+    /patient NAME
+
+is remembered: with --store DIR the history is saved when the session
+ends and loaded again when the same name comes back.
+
+Sessions, memory per session and the reply latency distribution are
+printed every --stats-seconds and when the server shuts down.
+
+A servercore.ServerLimits turns away patients over the connection caps
+or rate and ends the sessions of patients who say nothing for the idle
+timeout.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+
+from doctor import Doctor
+from doctorhandler import PATIENT_COMMAND, TIME_UP
+from patientstore import PatientStore
+from servercore import ServerLimits, add_arguments, limits_from_arguments
+
+HOST = "localhost"
+PORT = 5000
+ADDRESS = (HOST, PORT)
+BUFSIZE = 1024
+CODE = "ascii"
+
+BACKLOG = 1024
+# Latency percentiles are computed from the most recent replies.
+LATENCY_SAMPLES = 100000
+# A patient who says nothing for this long is disconnected.
+IDLE_SECONDS = 600.0
+
+def rss_bytes():
+    """ :return: resident set size of this process, None if unknown """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+class SessionStats:
+    """Counts sessions and replies and times each reply."""
+
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+        self.sessions = 0
+        self.replies = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.base_rss = rss_bytes()
+        self.peak_rss = self.base_rss
+
+    def session_started(self):
+        self.open += 1
+        self.sessions += 1
+        if self.open > self.peak:
+            self.peak = self.open
+
+    def session_finished(self):
+        self.open -= 1
+
+    def reply_sent(self, seconds):
+        self.replies += 1
+        self.latencies.append(seconds)
+
+    def memory_per_session(self):
+        """Growth of the RSS since the server started divided by the most
+        sessions open at once (the RSS doesn't shrink when they close)."""
+        rss = rss_bytes()
+        if rss is None or self.base_rss is None:
+            return None
+        self.peak_rss = max(self.peak_rss, rss)
+        if self.peak == 0:
+            return 0.0
+        return (self.peak_rss - self.base_rss) / self.peak
+
+    def report(self):
+        latencies = sorted(self.latencies)
+        lines = ["sessions: %d open, %d peak, %d total; %d replies"
+                 % (self.open, self.peak, self.sessions, self.replies),
+                 "reply latency ms: p50 %.3f  p90 %.3f  p99 %.3f  max %.3f"
+                 % (percentile(latencies, 0.5) * 1000, percentile(latencies, 0.9) * 1000,
+                    percentile(latencies, 0.99) * 1000,
+                    (latencies[-1] if latencies else 0.0) * 1000)]
+        per_session = self.memory_per_session()
+        if per_session is not None:
+            lines.append("memory: RSS %.1f MB, %.1f KB per session at peak"
+                         % (self.peak_rss / 2 ** 20, per_session / 1024))
+        return "\n".join(lines)
+
+class AsyncDoctorServer:
+    """Serves a Doctor to every patient that connects."""
+
+    def __init__(self, address=ADDRESS, store=None,
+                 history_size=Doctor.HISTORY_SIZE, verbose=True, limits=None):
+        """
+        :param address: (host, port), port 0 for any free port
+        :param store: PatientStore, None to forget patients between sessions
+        :param history_size: sentences each Doctor remembers
+        :param verbose: print every connection, like doctorserver.py
+        :param limits: servercore.ServerLimits, one with IDLE_SECONDS when None
+        """
+        self.address = address
+        self.store = store
+        self.history_size = history_size
+        self.verbose = verbose
+        self.limits = limits if limits is not None else ServerLimits(IDLE_SECONDS)
+        self.idle = self.limits.idle_tracker()
+        self.stats = SessionStats()
+
+    async def serve(self, stats_seconds=0, started=None):
+        """
+        Serve until cancelled.
+        :param stats_seconds: print the stats this often, 0 for never
+        :param started: function called with the address once listening
+        """
+        server = await asyncio.start_server(self.handle_session, *self.address,
+                                            backlog=BACKLOG)
+        self.address = server.sockets[0].getsockname()[:2]
+        print("Doctor is in on %s:%d" % self.address)
+        if started is not None:
+            started(self.address)
+        # Keep references: the loop only holds tasks weakly.
+        tasks = []
+        if stats_seconds > 0:
+            tasks.append(asyncio.create_task(self.report_every(stats_seconds)))
+        if self.idle is not None:
+            tasks.append(asyncio.create_task(self.end_idle_sessions()))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def report_every(self, seconds):
+        while True:
+            await asyncio.sleep(seconds)
+            print(self.stats.report())
+
+    async def end_idle_sessions(self):
+        """Tell the patients who said nothing for the idle timeout that
+        their time is up and hang up on them."""
+        while True:
+            await asyncio.sleep(self.idle.check_seconds)
+            for writer in self.idle.expired():
+                self.limits.connection_timed_out()
+                writer.write(bytes(TIME_UP, CODE))
+                if writer.transport.get_write_buffer_size() > 0:
+                    # Not reading either: closing would wait for it.
+                    writer.transport.abort()
+                else:
+                    writer.close()
+
+    async def handle_session(self, reader, writer):
+        """One patient's session, until the patient disconnects."""
+        address = writer.get_extra_info("peername")
+        if self.verbose:
+            print("... connected from: ", address)
+        refused = self.limits.admit(address)
+        if refused is not None:
+            if self.verbose:
+                print("... refused:", refused)
+            writer.write(bytes("Sorry, the doctor can't see you now (%s)." % refused, CODE))
+            writer.close()
+            return
+        self.stats.session_started()
+        dr = Doctor(history_size=self.history_size)
+        patient = None
+        try:
+            writer.write(bytes(dr.greeting(), CODE))
+            await writer.drain()
+            while True:
+                if self.idle is not None:
+                    self.idle.touch(writer)
+                data = await reader.read(BUFSIZE)
+                if not data:
+                    break
+                start = time.perf_counter()
+                message = data.decode(CODE, "replace")
+                if patient is None and message.startswith(PATIENT_COMMAND):
+                    patient = message[len(PATIENT_COMMAND):].strip()
+                    history = await self.load_history(patient)
+                    dr = Doctor(history, self.history_size)
+                    if len(history) > 0:
+                        reply = "Welcome back, %s.  How have you been?" % patient
+                    else:
+                        reply = "Nice to meet you, %s.  " % patient + dr.greeting()
+                else:
+                    reply = dr.reply(message)
+                writer.write(bytes(reply, CODE, "replace"))
+                self.stats.reply_sent(time.perf_counter() - start)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if self.verbose:
+                print("Client disconnected")
+            self.stats.session_finished()
+            if self.idle is not None:
+                self.idle.forget(writer)
+            self.limits.release(address)
+            writer.close()
+            if patient and self.store is not None:
+                await self.save_history(patient, dr.history)
+
+    async def load_history(self, patient):
+        if self.store is None:
+            return []
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.store.load, patient)
+
+    async def save_history(self, patient, history):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.store.save, patient, list(history))
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Doctor server (asyncio)")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--store", help="directory to keep patient histories in")
+    parser.add_argument("--history", type=int, default=Doctor.HISTORY_SIZE,
+                        help="sentences the doctor remembers per patient")
+    parser.add_argument("--stats-seconds", type=float, default=0,
+                        help="print the stats this often (0 for only at shutdown)")
+    parser.add_argument("--quiet", action="store_true", help="don't print every connection")
+    add_arguments(parser, IDLE_SECONDS)
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    store = None if args.store is None else PatientStore(args.store, args.history)
+    server = AsyncDoctorServer((HOST, args.port), store, args.history, not args.quiet,
+                               limits_from_arguments(args))
+    try:
+        asyncio.run(server.serve(args.stats_seconds))
+    except KeyboardInterrupt:
+        print("Server shutting down.")
+    finally:
+        print(server.stats.report())
+        print(server.limits.report())
+
+if __name__ == "__main__":
+    main()
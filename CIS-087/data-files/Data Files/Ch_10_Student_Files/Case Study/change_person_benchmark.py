@@ -0,0 +1,76 @@
+"""
+File: change_person_benchmark.py
+Times Doctor.change_person over a corpus of a million sentences, the
+way whole transcripts are rewritten: the old split and look up every
+word loop, the compiled regular expression alone, change_person (the
+regular expression behind a table of the words already rewritten) and
+change_persons rewriting the whole list in one call.
+
+    python change_person_benchmark.py
+    python change_person_benchmark.py --sentences 200000
+"""
+
+import argparse
+import random
+import time
+
+from doctor import Doctor
+
+SENTENCES = 1000000
+SUBJECTS = ["I", "We", "My mother", "My boss", "You", "Everyone around me"]
+VERBS = ["think", "feel", "am sure", "said", "worry", "wonder if"]
+OBJECTS = ["you never listen to me.", "my job is too hard!", "we should move away.",
+           "nobody understands us?", "it is all my fault.", "I'm doing fine, really."]
+
+def loop_change_person(sentence):
+    """ change_person as it was: split and look up every word. """
+    newlist = []
+    for word in sentence.split():
+        newlist.append(Doctor.REPLACEMENTS.get(word, word))
+    return " ".join(newlist)
+
+def build_corpus(count):
+    """ :return: count sentences made up from the parts above """
+    rng = random.Random(1)
+    return ["%s %s %s" % (rng.choice(SUBJECTS), rng.choice(VERBS), rng.choice(OBJECTS))
+            for _ in range(count)]
+
+def timed(function, corpus):
+    """ :return: (seconds, result) of the fastest of three runs """
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        result = function(corpus)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, result)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="change_person benchmark")
+    parser.add_argument("--sentences", type=int, default=SENTENCES, help="corpus size")
+    args = parser.parse_args()
+    corpus = build_corpus(args.sentences)
+    doctor = Doctor()
+
+    runs = [("split loop", lambda sentences: [loop_change_person(s) for s in sentences]),
+            ("regex", lambda sentences: [Doctor.PRONOUNS.change(s) for s in sentences]),
+            ("table", lambda sentences: [doctor.change_person(s) for s in sentences]),
+            ("table batch", doctor.change_persons)]
+    print("%d sentences, best of 3" % len(corpus))
+    print("%-12s %10s %14s" % ("", "seconds", "sentences/sec"))
+    results = {}
+    for name, function in runs:
+        seconds, results[name] = timed(function, corpus)
+        print("%-12s %10.3f %14.0f" % (name, seconds, len(corpus) / seconds))
+    assert results["regex"] == results["table"] == results["table batch"]
+
+    changed = sum(old != new for old, new in zip(results["split loop"], results["table"]))
+    print("%d sentences rewritten differently from the split loop, for example:" % changed)
+    for old, new, sentence in zip(results["split loop"], results["table"], corpus):
+        if old != new:
+            print("  %s\n    loop:  %s\n    now:   %s" % (sentence, old, new))
+            break
+
+if __name__ == "__main__":
+    main()
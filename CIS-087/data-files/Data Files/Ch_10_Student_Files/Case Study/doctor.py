@@ -1,4 +1,66 @@
-import random
+import os
+import re
+from collections import deque
+
+from responserules import ResponseRules, load_rules
+
+# Rules and strategy weights used when a Doctor isn't given any.
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "doctor_rules.txt")
+
+# Most distinct words PronounTable remembers before starting over.
+MAX_WORDS = 100000
+
+def cased_replacements(replacements):
+    """Expands a table of pronoun replacements to every way a word is
+    usually typed: lower case, capitalized and all capitals.  "I" is
+    always capitalized, so it becomes "you" (a lower case "i" is left
+    alone), and anything that becomes "I" is capitalized."""
+    cased = {}
+    for word, replacement in replacements.items():
+        word, replacement = word.lower(), replacement.lower()
+        for variant, changed in ((word, replacement),
+                                 (word.capitalize(), replacement.capitalize()),
+                                 (word.upper(), replacement.upper())):
+            if variant == "i":
+                continue
+            if changed.lower() == "i":
+                changed = "I"
+            elif variant == "I":
+                changed = replacement
+            cased.setdefault(variant, changed)
+    return cased
+
+class PronounTable(dict):
+    """Rewrites pronouns.  A compiled regular expression finds them as
+    whole words, even next to punctuation ("me.") but not inside a
+    contraction ("I'm").  Every word it has rewritten is remembered, so
+    after the first few sentences rewriting one is a split, a dictionary
+    lookup per word and a join."""
+
+    def __init__(self, replacements, max_words=MAX_WORDS):
+        dict.__init__(self)
+        self.cased = cased_replacements(replacements)
+        self.max_words = max_words
+        alternatives = "|".join(re.escape(word) for word in
+                                sorted(self.cased, key=len, reverse=True))
+        self.pattern = re.compile(r"(?<![\w'])(?:%s)(?![\w'])" % alternatives)
+
+    def change(self, text):
+        """Rewrites text with the regular expression alone."""
+        return self.pattern.sub(lambda match: self.cased[match.group()], text)
+
+    def change_words(self, text):
+        """Rewrites text a word at a time, looking the words up.  Like
+        the original change_person, it splits on any whitespace, so
+        runs of spaces and tabs come back as one space."""
+        return " ".join(map(self.__getitem__, text.split()))
+
+    def __missing__(self, word):
+        if len(self) >= self.max_words:
+            self.clear()
+        changed = self.change(word)
+        self[word] = changed
+        return changed
 
 class Doctor():
 
@@ -12,8 +74,31 @@ class Doctor():
     HEDGES = ['Go on.', 'I would like to hear more about that.',
               'And what do you think about this?', 'Please continue.']
 
-    def __init__(self):
-        self.history = []
+    PRONOUNS = PronounTable(REPLACEMENTS)
+
+    # Only the most recent sentences are remembered, so a long session
+    # doesn't keep growing.
+    HISTORY_SIZE = 100
+
+    # Loaded from RULES_FILE the first time a Doctor needs them.
+    default_rules = None
+
+    def __init__(self, history=(), history_size=HISTORY_SIZE, rules=None):
+        self.history = deque(history, maxlen=history_size)
+        if rules is None:
+            rules = Doctor.load_default_rules()
+        self.rules = rules
+
+    @staticmethod
+    def load_default_rules():
+        """Returns the rules in RULES_FILE, or the original hedges and
+        qualifiers alone if there is no such file."""
+        if Doctor.default_rules is None:
+            if os.path.exists(RULES_FILE):
+                Doctor.default_rules = load_rules(RULES_FILE)
+            else:
+                Doctor.default_rules = ResponseRules()
+        return Doctor.default_rules
 
     def greeting(self):
         return 'Good morning, how can I help you today?'
@@ -22,30 +107,20 @@ class Doctor():
         return 'Have a nice day!'
 
     def reply(self, sentence):
-        choice = random.randint (1, 10)
-        if choice == 1:
-            if len(self.history) > 3:
-                answer = 'Earlier you said that ' + \
-                self.change_person(random.choice(self.history))
-            else:
-                answer = random.choice(Doctor.HEDGES)
-        elif choice in (2,3,4,5):
-            answer = random.choice(Doctor.QUALIFIERS) + \
-            self.change_person(sentence)
-        else:
-            answer = random.choice(Doctor.HEDGES)
+        answer = self.rules.reply(self, sentence)
         self.history.append(sentence)
         return answer
         
     def change_person(self, sentence):
-        oldlist = sentence.split()
-        newlist = []
-        for word in oldlist:
-            if word in Doctor.REPLACEMENTS:
-                newlist.append(Doctor.REPLACEMENTS[word])
-            else:
-                newlist.append(word)
-        return " ".join(newlist)
+        """Replaces first person pronouns with second person pronouns
+        and the other way around."""
+        return Doctor.PRONOUNS.change_words(sentence)
+
+    def change_persons(self, sentences):
+        """change_person for a list of sentences, rewriting all of them
+        in one call."""
+        change_words = Doctor.PRONOUNS.change_words
+        return [change_words(sentence) for sentence in sentences]
     
         
     
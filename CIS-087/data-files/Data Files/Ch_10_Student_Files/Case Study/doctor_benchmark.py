@@ -0,0 +1,160 @@
+"""
+File: doctor_benchmark.py
+Opens thousands of concurrent sessions with asyncdoctorserver.py and
+has every patient talk to the doctor.  Reports the reply latency seen by
+the patients, the server's memory per open session and, at the end, the
+server's own report.
+
+The server runs in another process.  With --store each patient gives a
+name and the sessions are run twice: the second time every patient
+should be welcomed back with their history loaded from disk.
+
+    python doctor_benchmark.py
+    python doctor_benchmark.py --sessions 5000 --messages 50 --store
+"""
+
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+
+from asyncdoctorserver import AsyncDoctorServer, BUFSIZE, CODE, HOST, PATIENT_COMMAND
+from asyncdoctorserver import percentile
+from patientstore import PatientStore
+
+# Connections being opened at once, so the listen queue never overflows.
+CONNECTING = 200
+SENTENCES = ["I am worried about my exams", "My mother never calls me",
+             "We argued about money again", "I think my boss dislikes me",
+             "You never listen to me", "I am tired all the time"]
+
+def run_server(address_queue, store_directory):
+    """ Body of the server process. """
+    store = None if store_directory is None else PatientStore(store_directory)
+    server = AsyncDoctorServer((HOST, 0), store, verbose=False)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            asyncio.run(server.serve(started=address_queue.put))
+    except KeyboardInterrupt:
+        pass
+    print("server report:")
+    print(server.stats.report())
+    print(server.limits.report())
+
+def server_rss(pid):
+    """ :return: RSS of another process in bytes, None if unknown """
+    try:
+        with open("/proc/%d/statm" % pid) as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class Patient:
+    """ One session: connect, talk, hang up. """
+    def __init__(self, number, name):
+        self.number = number
+        self.name = name
+        self.reader = None
+        self.writer = None
+        self.latencies = []
+        self.welcomed_back = False
+
+    async def connect(self, address, connecting):
+        async with connecting:
+            self.reader, self.writer = await asyncio.open_connection(*address)
+        await self.reader.read(BUFSIZE)                  # The greeting
+        if self.name is not None:
+            reply = await self.say(PATIENT_COMMAND + self.name)
+            self.welcomed_back = reply.startswith("Welcome back")
+
+    async def say(self, sentence):
+        start = time.perf_counter()
+        self.writer.write(bytes(sentence, CODE))
+        reply = await self.reader.read(BUFSIZE)
+        if not reply:
+            raise ConnectionError("Doctor disconnected")
+        self.latencies.append(time.perf_counter() - start)
+        return reply.decode(CODE)
+
+    async def talk(self, messages):
+        for count in range(messages):
+            await self.say("%s (%d)" % (SENTENCES[(self.number + count) % len(SENTENCES)],
+                                        count))
+
+    async def hang_up(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def run_sessions(address, args, pid, names):
+    """
+    Open every session, then have them all talk at once.
+    :return: (patients, seconds talking, server RSS before, server RSS after)
+    """
+    connecting = asyncio.Semaphore(CONNECTING)
+    patients = [Patient(number, "patient %d" % number if names else None)
+                for number in range(args.sessions)]
+    rss_before = server_rss(pid)
+    await asyncio.gather(*(patient.connect(address, connecting) for patient in patients))
+    start = time.perf_counter()
+    await asyncio.gather(*(patient.talk(args.messages) for patient in patients))
+    seconds = time.perf_counter() - start
+    rss_after = server_rss(pid)
+    await asyncio.gather(*(patient.hang_up() for patient in patients))
+    return patients, seconds, rss_before, rss_after
+
+def print_round(patients, seconds, rss_before, rss_after):
+    latencies = sorted(lat for patient in patients for lat in patient.latencies)
+    print("%d sessions, %d replies in %.2f seconds: %.0f replies/sec"
+          % (len(patients), len(latencies), seconds, len(latencies) / seconds))
+    print("latency ms: p50 %.3f  p90 %.3f  p99 %.3f  max %.3f"
+          % (percentile(latencies, 0.5) * 1000, percentile(latencies, 0.9) * 1000,
+             percentile(latencies, 0.99) * 1000, latencies[-1] * 1000))
+    # Later rounds reuse the memory freed by the first one.
+    if rss_before is not None and rss_after is not None:
+        print("server RSS %.1f -> %.1f MB: %.1f KB per open session"
+              % (rss_before / 2 ** 20, rss_after / 2 ** 20,
+                 (rss_after - rss_before) / len(patients) / 1024))
+
+def main():
+    parser = argparse.ArgumentParser(description="Doctor server session benchmark")
+    parser.add_argument("--sessions", type=int, default=2000,
+                        help="sessions open at the same time")
+    parser.add_argument("--messages", type=int, default=20, help="messages per session")
+    parser.add_argument("--store", action="store_true",
+                        help="name the patients, keep their histories on disk and "
+                             "run the sessions a second time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="doctor-benchmark-") as directory:
+        store_directory = directory if args.store else None
+        address_queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=run_server,
+                                         args=(address_queue, store_directory))
+        server.start()
+        try:
+            address = address_queue.get(timeout=30)
+            rounds = 2 if args.store else 1
+            for number in range(rounds):
+                if rounds > 1:
+                    print("round %d" % (number + 1))
+                patients, seconds, rss_before, rss_after = asyncio.run(
+                    run_sessions(address, args, server.pid, args.store))
+                if number > 0:
+                    rss_before = rss_after = None
+                print_round(patients, seconds, rss_before, rss_after)
+                if args.store:
+                    print("%d of %d patients welcomed back"
+                          % (sum(patient.welcomed_back for patient in patients),
+                             len(patients)))
+                    # Histories are saved after each session closes.
+                    time.sleep(1)
+        finally:
+            os.kill(server.pid, signal.SIGINT)
+            server.join()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 """
 File: doctorclient.py
 GUI-based view for client for non-directive psychotherapy.
+A patient who gives a name is greeted by it, and remembered
+between sessions by asyncdoctorserver.py.
 """
 
 from socket import *
@@ -12,6 +14,7 @@ PORT = 5000
 BUFSIZE = 1024
 ADDRESS = (HOST, PORT)
 CODE = "ascii"
+PATIENT_COMMAND = "/patient "
 
 class DoctorClient(EasyFrame):
     """Represents the client's window."""
@@ -38,6 +41,11 @@ class DoctorClient(EasyFrame):
         self.connectBtn = self.addButton(row = 2, column = 1,
                                       text = "Connect",
                                       command = self.connect)
+        self.nameLabel = self.addLabel(text = "Your name (optional)",
+                                       row = 3, column = 0,
+                                       background = DoctorClient.COLOR)
+        self.nameField = self.addTextField(text = "", row = 3,
+                                           column = 1, width = 20)
         
         # Support the return key in the input field
         self.ptField.bind("<Return>", lambda event: self.sendReply())
@@ -61,6 +69,11 @@ class DoctorClient(EasyFrame):
         self.server = socket(AF_INET, SOCK_STREAM)
         self.server.connect(ADDRESS)
         self.drLabel["text"] = decode(self.server.recv(BUFSIZE), CODE)
+        name = self.nameField.getText().strip()
+        if name != "":
+            # The server looks up what the patient said last time.
+            self.server.send(bytes(PATIENT_COMMAND + name, CODE))
+            self.drLabel["text"] = decode(self.server.recv(BUFSIZE), CODE)
         self.connectBtn["text"] = "Disconnect"
         self.connectBtn["command"] = self.disconnect
         self.sendBtn["state"] = "normal"
@@ -0,0 +1,44 @@
+"""
+File: doctorhandler.py
+Protocol handler for providing non-directive psychotherapy
+with socketframework.py.  It greets the patient and answers
+every message (whatever one recv returns) with one reply,
+and tells a patient who goes quiet that their time is up.
+A patient may give a name with "/patient NAME", which
+doctorclient.py sends when given one; the doctor answers
+it with a greeting by name (only asyncdoctorserver.py also
+remembers the patient between sessions).
+It never blocks, so every backend of the framework can
+serve it, a thread per patient included.
+"""
+
+from doctor import Doctor
+from socketframework import Handler
+
+CODE = "ascii"
+PATIENT_COMMAND = "/patient "
+# Said to a patient whose session ends for being quiet too long.
+TIME_UP = "Our time is up.  Goodbye."
+
+class DoctorHandler(Handler):
+    """Handles a session between a doctor and a patient."""
+
+    def __init__(self, connection):
+        Handler.__init__(self, connection)
+        self.dr = Doctor()
+        self.patient = None
+
+    def connection_made(self):
+        self.connection.send(bytes(self.dr.greeting(), CODE))
+
+    def data_received(self, data):
+        message = data.decode(CODE, "replace")
+        if self.patient is None and message.startswith(PATIENT_COMMAND):
+            self.patient = message[len(PATIENT_COMMAND):].strip()
+            reply = "Nice to meet you, %s.  " % self.patient + self.dr.greeting()
+        else:
+            reply = self.dr.reply(message)
+        self.connection.send(bytes(reply, CODE, "replace"))
+
+    def timed_out(self):
+        self.connection.send(bytes(TIME_UP, CODE))
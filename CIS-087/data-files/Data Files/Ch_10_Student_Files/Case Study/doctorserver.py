@@ -1,25 +1,50 @@
 """
 File: doctorserver.py
 Server for providing non-directive psychotherapy.
-Uses client handlers to handle clients' requests.
+socketframework.py accepts the patients and a DoctorHandler
+serves each of them; --backend picks how (a thread per
+patient by default).  servercore.ServerLimits turns away
+patients over the connection caps or rate and ends sessions
+that go quiet, so a stalled client can't keep a thread
+forever.
 """
 
-from socket import *
-from doctorclienthandler import DoctorClientHandler
+import argparse
+
+from doctorhandler import CODE, DoctorHandler
+from servercore import add_arguments, limits_from_arguments
+from socketframework import BACKENDS, make_server
 
 HOST = "localhost"
 PORT = 5000
 ADDRESS = (HOST, PORT)
+# A patient who says nothing for this long is disconnected.
+IDLE_SECONDS = 600.0
+MAX_CONNECTIONS = 1000
+
+def refused_message(reason):
+    return bytes("Sorry, the doctor can't see you now (%s)." % reason, CODE)
 
-server = socket(AF_INET, SOCK_STREAM)
-server.bind(ADDRESS)
-server.listen(5)
+def main():
+    parser = argparse.ArgumentParser(description="Doctor server")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="thread",
+                        help="how patients are served (default thread)")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    add_arguments(parser, IDLE_SECONDS, MAX_CONNECTIONS)
+    args = parser.parse_args()
+    server = make_server(args.backend, DoctorHandler, (HOST, args.port),
+                         limits=limits_from_arguments(args),
+                         refused_message=refused_message, verbose=True)
+    server.start()
+    print("Doctor is in on %s:%d (%s backend).  ctrl-c to shut down."
+          % (server.address + (args.backend,)))
+    try:
+        while server.thread.is_alive():
+            server.thread.join(0.5)
+    except KeyboardInterrupt:
+        print("Server shutting down.")
+        server.stop()
+    print(server.stats.report())
 
-# The server now just waits for connections from clients
-# and hands sockets off to client handlers
-while True:
-    print("Waiting for connection . . .")
-    client, address = server.accept()
-    print("... connected from: ", address)
-    handler = DoctorClientHandler(client)
-    handler.start()
+if __name__ == "__main__":
+    main()
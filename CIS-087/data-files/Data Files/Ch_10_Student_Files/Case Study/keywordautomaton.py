@@ -0,0 +1,79 @@
+"""
+File: keywordautomaton.py
+Aho-Corasick automaton: finds every occurrence of any of a set of
+keywords in one pass over a text.  The time to search a sentence grows
+with the length of the sentence and the number of matches, not with the
+number of keywords, so the doctor can know tens of thousands of them.
+"""
+
+from collections import deque
+
+class KeywordAutomaton:
+    """Keywords are added, then build() links the trie for searching.
+    State 0 is the root.  goto[s] maps a character to the next state,
+    fail[s] is the state for the longest proper suffix of s that is also
+    in the trie, and out[s] lists the (length, value) of every keyword
+    ending at s, including those of its suffixes."""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        self.built = True
+
+    def __len__(self):
+        """Returns the number of states."""
+        return len(self.goto)
+
+    def add(self, keyword, value):
+        """Adds a keyword; value is returned with each match of it."""
+        if keyword == "":
+            raise ValueError("keywords can't be empty")
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][char] = next_state
+            state = next_state
+        self.out[state].append((len(keyword), value))
+        self.built = False
+
+    def build(self):
+        """Computes the failure links breadth first, so the link of
+        every shorter state is known before it is needed."""
+        goto, fail, out = self.goto, self.fail, self.out
+        queue = deque()
+        for state in goto[0].values():
+            fail[state] = 0
+            queue.append(state)
+        while len(queue) > 0:
+            parent = queue.popleft()
+            for char, state in goto[parent].items():
+                queue.append(state)
+                link = fail[parent]
+                while link != 0 and char not in goto[link]:
+                    link = fail[link]
+                fail[state] = goto[link].get(char, 0)
+                if len(out[fail[state]]) > 0:
+                    out[state] = out[state] + out[fail[state]]
+        self.built = True
+
+    def search(self, text):
+        """Returns a list of (start, end, value) for every keyword found
+        in text, in the order their ends appear."""
+        if not self.built:
+            self.build()
+        goto, fail, out = self.goto, self.fail, self.out
+        matches = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state != 0 and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in out[state]:
+                matches.append((end - length, end, value))
+        return matches
@@ -0,0 +1,55 @@
+"""
+File: patientstore.py
+On-disk histories for the doctor server, one file per patient name, so a
+patient who comes back picks up where the last session left off.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from doctor import Doctor
+
+class PatientStore:
+    """Saves and loads the sentences each patient has said."""
+
+    def __init__(self, directory, history_size=Doctor.HISTORY_SIZE):
+        """Creates the directory if needed.  Only the last history_size
+        sentences of a patient are kept."""
+        self.directory = directory
+        self.history_size = history_size
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        """Names can hold any character, so the file is named by a hash
+        of the name (ignoring case and surrounding spaces)."""
+        key = hashlib.sha1(name.strip().lower().encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def load(self, name):
+        """Returns the patient's saved sentences, oldest first
+        ([] for a new patient)."""
+        try:
+            with open(self.path(name), encoding="utf-8") as f:
+                history = json.load(f)["history"]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, KeyError, TypeError):
+            # Unreadable: start over rather than refuse the patient.
+            return []
+        return history[-self.history_size:]
+
+    def save(self, name, history):
+        """Replaces the patient's saved sentences.  The file is written
+        under a temporary name first so it is never left half written."""
+        path = self.path(name)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"name": name,
+                           "history": list(history)[-self.history_size:]}, f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,170 @@
+"""
+File: responserules.py
+Rule engine for the doctor's replies.  Rules and the weights of the
+reply strategies are loaded from a text file (see doctor_rules.txt):
+
+    # A comment
+    strategy rule 6
+    strategy hedge 5
+
+    rule: mother, father, family
+        Tell me more about your family.
+    rule 3: i feel
+        Why do you feel{rest}?
+
+A rule has keywords (whole words or phrases, any case), an optional
+weight and the templates indented under it.  A template can use
+{keyword}, the keyword found, {rest}, what the patient said after it,
+and {sentence}, the whole sentence (both with the pronouns changed).
+
+For every sentence a strategy is drawn by weight from those that can be
+used: rule (a keyword was found), history (the patient has said more
+than three things), qualifier and hedge.  Without a file the weights
+are the doctor's original ones.  All keywords go into one
+KeywordAutomaton, so finding them takes the same time with ten rules
+as with tens of thousands.
+"""
+
+import random
+
+from keywordautomaton import KeywordAutomaton
+
+STRATEGIES = ("rule", "history", "qualifier", "hedge")
+# Doctor.reply before rules: 1 in 10 history, 4 in 10 a qualifier and
+# the rest hedges.
+DEFAULT_WEIGHTS = {"rule": 0, "history": 1, "qualifier": 4, "hedge": 5}
+TEMPLATE_FIELDS = {"keyword": "", "rest": "", "sentence": ""}
+# Stripped from {rest} so "I feel sad." gives "Why do you feel sad?".
+TRAILING_PUNCTUATION = " .!?,;:"
+
+class Rule:
+    """Keywords and the replies to give when one of them is found."""
+
+    def __init__(self, keywords, templates, weight=1):
+        self.keywords = keywords
+        self.templates = templates
+        self.weight = weight
+
+class ResponseRules:
+    """Chooses the doctor's replies."""
+
+    def __init__(self, rules=(), weights=None):
+        """rules is a list of Rule, weights maps strategies to their
+        weights (DEFAULT_WEIGHTS for any left out)."""
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights is not None:
+            self.weights.update(weights)
+        self.rules = []
+        self.automaton = KeywordAutomaton()
+        for rule in rules:
+            self.add(rule)
+        self.automaton.build()
+
+    def add(self, rule):
+        self.rules.append(rule)
+        for keyword in rule.keywords:
+            self.automaton.add(keyword.lower(), rule)
+
+    def match(self, sentence):
+        """Returns a list of (rule, start, end) for every keyword found in
+        the sentence as whole words."""
+        lowered = sentence.lower()
+        found = []
+        for start, end, rule in self.automaton.search(lowered):
+            if start > 0 and lowered[start - 1].isalnum():
+                continue
+            if end < len(lowered) and lowered[end].isalnum():
+                continue
+            found.append((rule, start, end))
+        return found
+
+    def reply(self, doctor, sentence, rng=random):
+        """Returns a reply to the sentence.  doctor gives the hedges,
+        qualifiers, history and change_person to use."""
+        found = self.match(sentence) if len(self.rules) > 0 else []
+        weights = [self.weights["rule"] if len(found) > 0 else 0,
+                   self.weights["history"] if len(doctor.history) > 3 else 0,
+                   self.weights["qualifier"],
+                   self.weights["hedge"]]
+        if sum(weights) == 0:
+            return rng.choice(doctor.HEDGES)
+        strategy = rng.choices(STRATEGIES, weights)[0]
+        if strategy == "rule":
+            rule_weights = [rule.weight for rule, _, _ in found]
+            if sum(rule_weights) == 0:
+                rule_weights = None
+            rule, start, end = rng.choices(found, rule_weights)[0]
+            rest = sentence[end:].rstrip(TRAILING_PUNCTUATION)
+            return rng.choice(rule.templates).format(
+                keyword=sentence[start:end],
+                rest=doctor.change_person(rest),
+                sentence=doctor.change_person(sentence.rstrip(TRAILING_PUNCTUATION)))
+        if strategy == "history":
+            return 'Earlier you said that ' + \
+                   doctor.change_person(rng.choice(doctor.history))
+        if strategy == "qualifier":
+            return rng.choice(doctor.QUALIFIERS) + doctor.change_person(sentence)
+        return rng.choice(doctor.HEDGES)
+
+def parse_rules(lines, source="rules"):
+    """Returns a ResponseRules from the lines of a rules file.
+    Raises ValueError naming the line of anything it can't read."""
+    rules = []
+    weights = {}
+    rule = None
+    for number, line in enumerate(lines, 1):
+        text = line.strip()
+        if text == "" or text.startswith("#"):
+            continue
+
+        def error(message):
+            return ValueError("%s:%d: %s: %s" % (source, number, message, text))
+
+        if line[0].isspace():
+            if rule is None:
+                raise error("template outside of a rule")
+            try:
+                text.format(**TEMPLATE_FIELDS)
+            except (KeyError, IndexError, ValueError):
+                raise error("template can only use {keyword}, {rest} and {sentence}")
+            rule.templates.append(text)
+            continue
+        if rule is not None and len(rule.templates) == 0:
+            raise ValueError("%s: rule before line %d has no templates" % (source, number))
+        rule = None
+        words = text.split()
+        if words[0] == "strategy":
+            if len(words) != 3 or words[1] not in STRATEGIES:
+                raise error("expected strategy %s WEIGHT" % "|".join(STRATEGIES))
+            weights[words[1]] = parse_weight(words[2], error)
+        elif words[0] == "rule" or words[0].startswith("rule:"):
+            head, colon, keywords = text.partition(":")
+            head = head.split()
+            if colon == "" or head[0] != "rule" or len(head) > 2:
+                raise error("expected rule [WEIGHT]: KEYWORD, KEYWORD ...")
+            weight = parse_weight(head[1], error) if len(head) == 2 else 1
+            keywords = [keyword.strip() for keyword in keywords.split(",")
+                        if keyword.strip() != ""]
+            if len(keywords) == 0:
+                raise error("rule has no keywords")
+            rule = Rule(keywords, [], weight)
+            rules.append(rule)
+        else:
+            raise error("expected strategy, rule or an indented template")
+    if rule is not None and len(rule.templates) == 0:
+        raise ValueError("%s: last rule has no templates" % source)
+    return ResponseRules(rules, weights)
+
+def parse_weight(text, error):
+    try:
+        weight = float(text)
+    except ValueError:
+        raise error("weight is not a number")
+    if weight < 0:
+        raise error("weight can't be negative")
+    return weight
+
+def load_rules(path):
+    """Returns the ResponseRules in a rules file."""
+    with open(path, encoding="utf-8") as f:
+        return parse_rules(f, path)
@@ -0,0 +1,90 @@
+"""
+File: rules_benchmark.py
+Reply latency of the Doctor as the number of rules grows.  Adds
+synthetic rules (one made up keyword each) to the rules in
+doctor_rules.txt and times matching a sentence with the
+KeywordAutomaton, a whole Doctor.reply, and, for comparison, checking
+the keywords one at a time.
+
+    python rules_benchmark.py
+    python rules_benchmark.py --rules 10 1000 100000
+"""
+
+import argparse
+import random
+import time
+
+from doctor import RULES_FILE, Doctor
+from responserules import ResponseRules, Rule, load_rules
+
+RULE_COUNTS = [10, 1000, 10000, 50000]
+SENTENCES = 2000
+# One keyword scan is timed on this many sentences; it gets slow.
+SCAN_SENTENCES = 200
+WORDS = ["I", "feel", "think", "my", "mother", "work", "today", "never", "sad",
+         "because", "the", "a", "about", "really", "always", "friends", "dream",
+         "money", "tired", "am", "we", "went", "home", "and", "it", "was", "fine"]
+
+def synthetic_keyword(rng):
+    """ :return: a made up word such as "brelvimo" """
+    return "".join(rng.choice("abcdefghiklmnoprstuvw") for _ in range(rng.randint(5, 9)))
+
+def build_rules(count, rng):
+    """ :return: the rules of doctor_rules.txt plus synthetic ones, count in all """
+    base = load_rules(RULES_FILE)
+    rules = list(base.rules)
+    keywords = []
+    while len(rules) < count:
+        keyword = synthetic_keyword(rng)
+        keywords.append(keyword)
+        rules.append(Rule([keyword], ["Tell me more about {keyword}."]))
+    return ResponseRules(rules[:count], base.weights), keywords
+
+def build_sentences(keywords, rng):
+    """ :return: SENTENCES sentences, some with a synthetic keyword in them """
+    sentences = []
+    for _ in range(SENTENCES):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+        if len(keywords) > 0 and rng.random() < 0.2:
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        sentences.append(" ".join(words) + ".")
+    return sentences
+
+def scan(all_keywords, sentence):
+    """ Checking every keyword, as a list of rules would without an index. """
+    lowered = sentence.lower()
+    return [keyword for keyword in all_keywords if keyword in lowered]
+
+def microseconds_per(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Doctor rule engine scaling")
+    parser.add_argument("--rules", type=int, nargs="+", default=RULE_COUNTS,
+                        help="rule counts to measure")
+    args = parser.parse_args()
+    print("%8s %10s %9s %12s %12s %12s" % ("rules", "states", "build s", "match us",
+                                          "reply us", "scan us"))
+    for count in args.rules:
+        rng = random.Random(count)
+        start = time.perf_counter()
+        rules, keywords = build_rules(count, rng)
+        build_seconds = time.perf_counter() - start
+        sentences = build_sentences(keywords, rng)
+        doctor = Doctor(rules=rules)
+        for sentence in sentences[:100]:
+            # Warm change_person's table of words.
+            doctor.reply(sentence)
+        all_keywords = [keyword.lower() for rule in rules.rules for keyword in rule.keywords]
+        print("%8d %10d %9.3f %12.2f %12.2f %12.2f"
+              % (len(rules.rules), len(rules.automaton), build_seconds,
+                 microseconds_per(rules.match, sentences),
+                 microseconds_per(doctor.reply, sentences),
+                 microseconds_per(lambda sentence: scan(all_keywords, sentence),
+                                  sentences[:SCAN_SENTENCES])))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+File: socketframework.py
+The socket server framework is kept in one file,
+../ClientServer/socketframework.py.  This loads that file in place of
+itself, so doctorserver.py and doctorhandler.py import socketframework
+as usual and every fix to the framework is made once.
+"""
+
+import importlib.util
+import os
+import sys
+
+SHARED = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      "ClientServer", "socketframework.py")
+
+spec = importlib.util.spec_from_file_location(__name__, SHARED)
+module = importlib.util.module_from_spec(spec)
+sys.modules[__name__] = module
+spec.loader.exec_module(module)
@@ -0,0 +1,37 @@
+"""
+File: test_doctor.py
+Tests of how Doctor.change_person rewrites pronouns.
+
+    python -m unittest test_doctor
+"""
+
+import unittest
+
+from doctor import Doctor
+
+class ChangePersonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doctor = Doctor()
+
+    def test_runs_of_whitespace_become_one_space(self):
+        self.assertEqual(self.doctor.change_person("I  hate   my\tjob"),
+                         "you hate your job")
+        self.assertEqual(self.doctor.change_person("  me \t "), "you")
+
+    def test_lower_case_i_is_left_alone(self):
+        self.assertEqual(self.doctor.change_person("i think"), "i think")
+
+    def test_case_and_punctuation(self):
+        self.assertEqual(self.doctor.change_person("My mother hates me."),
+                         "Your mother hates you.")
+        self.assertEqual(self.doctor.change_person("you know I'm fine"),
+                         "I know I'm fine")
+
+    def test_change_persons_matches_change_person(self):
+        sentences = ["I  am sad", "we\tlove you", "", "line\nbreak me"]
+        self.assertEqual(self.doctor.change_persons(sentences),
+                         [self.doctor.change_person(sentence) for sentence in sentences])
+
+if __name__ == "__main__":
+    unittest.main()
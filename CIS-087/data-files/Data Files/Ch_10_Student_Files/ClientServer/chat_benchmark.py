@@ -0,0 +1,169 @@
+"""
+File: chat_benchmark.py
+Fan-out throughput of chatserver.py.  Starts the server in another
+process, connects many clients (1000 by default) to one room, has a few
+of them send messages and times how long it takes until every client
+has received every message.  All clients are read from one selector in
+this process.
+
+Clients that never read (--slow) show slow consumer eviction: the server
+disconnects them once their queues fill up, and the rest of the room
+keeps getting its messages.
+
+    python chat_benchmark.py
+    python chat_benchmark.py --clients 1000 --slow 10 --max-queue 65536
+"""
+
+import argparse
+import contextlib
+import multiprocessing
+import os
+import selectors
+import time
+from socket import *
+
+from chatserver import HOST, MAX_QUEUE_BYTES, ChatServer
+
+ROOM = "bench"
+MARKER = b"BENCH:"
+JOINED = b"*** you are in " + bytes(ROOM, "ascii")
+BUFSIZE = 65536
+TIMEOUT_SECONDS = 120
+
+def run_server(address_queue, max_queue_bytes):
+    """ Body of the server process. """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        server = ChatServer((HOST, 0), max_queue_bytes, verbose=False)
+        address_queue.put(server.address)
+        server.serve_forever()
+
+class BenchmarkClient:
+    """ One connection and what has been received on it so far. """
+    def __init__(self, address):
+        self.sock = create_connection(address)
+        self.sock.setblocking(False)
+        self.tail = b""
+        self.joined = False
+        self.received = 0
+        self.done_at = None
+
+    def read(self, now, expected):
+        """
+        Count the complete lines read.
+        :return: False once the server closed the connection
+        """
+        try:
+            data = self.sock.recv(BUFSIZE)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+        if data == b"":
+            return False
+        data = self.tail + data
+        cut = data.rfind(b"\n") + 1
+        complete, self.tail = data[:cut], data[cut:]
+        if not self.joined and JOINED in complete:
+            self.joined = True
+        self.received += complete.count(MARKER)
+        if self.done_at is None and self.received >= expected:
+            self.done_at = now
+        return True
+
+def read_until(selector, clients, finished, expected, deadline):
+    """ Read from every client until finished() or the deadline. """
+    while not finished() and time.perf_counter() < deadline:
+        for key, _ in selector.select(1.0):
+            client = key.data
+            if not client.read(time.perf_counter(), expected):
+                selector.unregister(client.sock)
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+def count_evicted(slow_clients):
+    """ :return: how many of the clients that never read were disconnected """
+    evicted = 0
+    for client in slow_clients:
+        client.sock.setblocking(True)
+        client.sock.settimeout(0.5)
+        try:
+            while client.sock.recv(BUFSIZE) != b"":
+                pass
+            evicted += 1
+        except timeout:
+            pass
+        except OSError:
+            evicted += 1
+    return evicted
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat server fan-out benchmark")
+    parser.add_argument("--clients", type=int, default=1000, help="clients in the room")
+    parser.add_argument("--senders", type=int, default=10, help="clients that send")
+    parser.add_argument("--messages", type=int, default=100, help="messages per sender")
+    parser.add_argument("--size", type=int, default=100, help="bytes per message")
+    parser.add_argument("--slow", type=int, default=0,
+                        help="extra clients in the room that never read")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE_BYTES,
+                        help="server's per-client queue limit in bytes")
+    args = parser.parse_args()
+
+    address_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=run_server,
+                                     args=(address_queue, args.max_queue), daemon=True)
+    server.start()
+    address = address_queue.get(timeout=30)
+    try:
+        start = time.perf_counter()
+        clients = [BenchmarkClient(address) for _ in range(args.clients)]
+        slow_clients = [BenchmarkClient(address) for _ in range(args.slow)]
+        selector = selectors.DefaultSelector()
+        for client in clients:
+            selector.register(client.sock, selectors.EVENT_READ, client)
+        for client in clients + slow_clients:
+            client.sock.sendall(bytes("/join %s\n" % ROOM, "ascii"))
+        read_until(selector, clients, lambda: all(client.joined for client in clients),
+                   0, start + TIMEOUT_SECONDS)
+        print("%d clients connected and joined in %.2f seconds"
+              % (args.clients + args.slow, time.perf_counter() - start))
+
+        expected = args.senders * args.messages
+        for client in clients:
+            client.received = 0
+            client.done_at = None
+        padding = "x" * max(0, args.size - 20)
+        start = time.perf_counter()
+        for sender in range(args.senders):
+            lines = "".join("BENCH:%d:%d %s\n" % (sender, number, padding)
+                            for number in range(args.messages))
+            clients[sender].sock.setblocking(True)
+            clients[sender].sock.sendall(bytes(lines, "ascii"))
+            clients[sender].sock.setblocking(False)
+        read_until(selector, clients,
+                   lambda: all(client.done_at is not None for client in clients),
+                   expected, start + TIMEOUT_SECONDS)
+        elapsed = time.perf_counter() - start
+
+        delivered = sum(min(client.received, expected) for client in clients)
+        finish = sorted(client.done_at - start for client in clients
+                        if client.done_at is not None)
+        print("%d senders x %d messages of %d bytes to %d clients"
+              % (args.senders, args.messages, args.size, args.clients))
+        print("%d of %d deliveries in %.3f seconds: %.0f deliveries/sec, %.1f MB/sec"
+              % (delivered, expected * args.clients, elapsed, delivered / elapsed,
+                 delivered * args.size / elapsed / 1e6))
+        print("client finished at  p50 %.3f   p99 %.3f   max %.3f seconds"
+              % (percentile(finish, 0.5), percentile(finish, 0.99),
+                 finish[-1] if finish else 0.0))
+        if args.slow > 0:
+            print("%d of %d clients that never read were evicted"
+                  % (count_evicted(slow_clients), args.slow))
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,59 @@
 """
 File: chatclient.py
-Client for a chat room.
+Client for a chat room.  A thread prints whatever the server sends
+while the user types, so messages from the room show up as they
+arrive instead of only after each reply.  An empty line quits.
 """
 
 from socket import *
-from codecs import decode
+from threading import Thread
 
 HOST = "localhost"
 PORT = 5000
 BUFSIZE = 1024
 ADDRESS = (HOST, PORT)
-CODE = "ascii"
+CODE = "utf-8"
 
-server = socket(AF_INET, SOCK_STREAM)
-server.connect(ADDRESS)
+class Receiver(Thread):
+    """Prints the lines the server sends until it disconnects."""
+    def __init__(self, server):
+        Thread.__init__(self, daemon=True)
+        self.server = server
+        self.quitting = False
 
-print(decode(server.recv(BUFSIZE), CODE))       # The server's greeting
-while True:
-    message = input("> ")                       # Get my reply or quit
-    if not message:
-        break
-    server.send(bytes(message, CODE))           # Send my reply to the server
-    reply = decode(server.recv(BUFSIZE), CODE)  # Get the server's reply
-    if not reply:
-        print("Server disconnected")
-        break
-    print(reply)                                # Display the server's reply
-server.close()
+    def run(self):
+        reader = self.server.makefile("r", encoding=CODE, errors="replace")
+        try:
+            for line in reader:
+                print(line.rstrip("\n"))
+        except OSError:
+            pass
+        if not self.quitting:
+            print("Server disconnected")
+
+def main():
+    server = socket(AF_INET, SOCK_STREAM)
+    try:
+        server.connect(ADDRESS)
+    except ConnectionRefusedError:
+        print("Error connecting to the server.")
+        return
+    receiver = Receiver(server)
+    receiver.start()
+    try:
+        while receiver.is_alive():
+            message = input()                       # Get my message or quit
+            if not message:
+                break
+            server.sendall(bytes(message + "\n", CODE))
+    except (OSError, EOFError, KeyboardInterrupt):
+        pass
+    receiver.quitting = True
+    try:
+        server.shutdown(SHUT_RDWR)
+    except OSError:
+        pass
+    server.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,371 @@
 """
 File: chatserver.py
-Server for a chat room.  Handles one client at a 
-time and participates in the conversation.
+Server for chat rooms.  Handles any number of clients at once with
+one thread: a selector says which sockets can be read or written and
+no call ever blocks.
+
+Every line a client sends is a message to the room it is in, or a
+command:
+
+    /nick NAME     change your name
+    /join ROOM     move to another room (created when first joined)
+    /rooms         list the rooms
+    /who           list the people in your room
+    /quit          leave
+
+A message is encoded once and the same bytes are queued for everyone
+in the room.  Queues are sent once per pass of the loop, so a burst of
+messages goes out to each client in one system call.  Each client's
+queue is bounded: a client that stops
+reading while the room keeps talking is disconnected rather than
+letting its queue grow without limit (slow consumer eviction).
+
+A servercore.ServerLimits turns away connections over its caps or rate
+and disconnects clients that send nothing for the idle timeout.
 """
 
+import argparse
+import selectors
+from collections import deque
 from socket import *
-from codecs import decode
 
-HOST = "localhost" 
+from servercore import ServerLimits, add_arguments, limits_from_arguments
+
+HOST = "localhost"
 PORT = 5000
 ADDRESS = (HOST, PORT)
-BUFSIZE = 1024
-CODE = "ascii"
-
-server = socket(AF_INET, SOCK_STREAM)
-server.bind(ADDRESS)
-server.listen(5)
-
-while True:
-    print("Waiting for connection . . .")
-    client, address = server.accept()
-    print("... connected from: ", address)
-    client.send(bytes("Welcome to my chat room!", CODE))   # Send greeting
-
-    while True:
-        message = decode(client.recv(BUFSIZE), CODE)       # Reply from client
-        if not message:
-            print("Client disconnected")
-            client.close()
-            break
+BUFSIZE = 65536
+CODE = "utf-8"
+
+LOBBY = "lobby"
+BACKLOG = 128
+MAX_LINE = 4096
+# Bytes waiting to be sent to one client, on top of what the kernel buffers.
+MAX_QUEUE_BYTES = 256 * 1024
+# Queued messages sent with one system call.
+MAX_SEND_BATCH = 64
+# People sit in chat rooms reading without saying anything, so only a
+# client silent for this long is disconnected.
+IDLE_SECONDS = 3600.0
+
+class ChatClient:
+    """
+    A connected client: its socket, name, room, the partial line read so
+    far and the messages waiting to be sent to it.
+    """
+    __slots__ = ("sock", "address", "nick", "room", "inbuf", "outq",
+                 "queued", "sent", "writing", "pending", "closed")
+
+    def __init__(self, sock, address, nick):
+        self.sock = sock
+        self.address = address
+        self.nick = nick
+        self.room = None
+        self.inbuf = b""
+        self.outq = deque()
+        self.queued = 0       # bytes in outq
+        self.sent = 0         # bytes of outq[0] already sent
+        self.writing = False  # registered for EVENT_WRITE
+        self.pending = False  # in ChatServer.pending
+        self.closed = False
+
+class ChatServer:
+    """
+    Chat rooms served from one selector loop.  serve_forever runs until
+    stop is called (from any thread) or ctrl-c.
+    """
+    def __init__(self, address=ADDRESS, max_queue_bytes=MAX_QUEUE_BYTES, verbose=True,
+                 limits=None):
+        """ limits is a servercore.ServerLimits, one with IDLE_SECONDS when None. """
+        self.max_queue_bytes = max_queue_bytes
+        self.verbose = verbose
+        self.limits = limits if limits is not None else ServerLimits(IDLE_SECONDS)
+        self.idle = self.limits.idle_tracker()
+        self.selector = selectors.DefaultSelector()
+        self.server = socket(AF_INET, SOCK_STREAM)
+        self.server.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self.server.bind(address)
+        self.server.listen(BACKLOG)
+        self.server.setblocking(False)
+        self.address = self.server.getsockname()[:2]
+        self.wakeup_reader, self.wakeup_writer = socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        self.clients = {}
+        self.rooms = {}
+        self.pending = []
+        self.next_guest = 1
+        self.running = True
+        self.evictions = 0
+        self.messages = 0
+
+    def log(self, text):
+        if self.verbose:
+            print(text)
+
+    def serve_forever(self):
+        print("Chat server on %s:%d" % self.address)
+        timeout = None if self.idle is None else self.idle.check_seconds
+        try:
+            while self.running:
+                for key, events in self.selector.select(timeout):
+                    sock = key.fileobj
+                    if sock is self.server:
+                        self.accept()
+                    elif sock is self.wakeup_reader:
+                        self.running = False
+                    else:
+                        client = key.data
+                        if events & selectors.EVENT_WRITE and not client.closed:
+                            self.flush(client)
+                        if events & selectors.EVENT_READ and not client.closed:
+                            self.receive(client)
+                if self.idle is not None:
+                    self.disconnect_idle()
+                self.flush_pending()
+        finally:
+            for client in list(self.clients.values()):
+                self.disconnect(client, None)
+            self.selector.close()
+            self.server.close()
+            self.wakeup_reader.close()
+            self.wakeup_writer.close()
+
+    def stop(self):
+        """ Make serve_forever return.  Safe to call from another thread. """
+        try:
+            self.wakeup_writer.send(b"x")
+        except OSError:
+            pass
+
+    def accept(self):
+        """ Accept every connection that is waiting. """
+        while True:
+            try:
+                sock, address = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as ex:
+                # Out of file descriptors, connection reset before accept ...
+                self.log("accept failed: %s" % ex)
+                return
+            sock.setblocking(False)
+            refused = self.limits.admit(address)
+            if refused is not None:
+                self.log("... refused %s: %s" % (address, refused))
+                try:
+                    sock.send(bytes("*** refused: %s\n" % refused, CODE))
+                except OSError:
+                    pass
+                sock.close()
+                continue
+            client = ChatClient(sock, address, "guest%d" % self.next_guest)
+            self.next_guest += 1
+            self.clients[sock] = client
+            self.selector.register(sock, selectors.EVENT_READ, client)
+            if self.idle is not None:
+                self.idle.touch(client)
+            self.log("... connected from: %s as %s" % (address, client.nick))
+            self.send_line(client, "Welcome to my chat room!  You are %s.  "
+                                   "Commands: /nick /join /rooms /who /quit" % client.nick)
+            self.join(client, LOBBY)
+
+    def receive(self, client):
+        """ Read what the client sent and handle every complete line. """
+        try:
+            data = client.sock.recv(BUFSIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if data == b"":
+            self.disconnect(client, "left")
+            return
+        if self.idle is not None:
+            self.idle.touch(client)
+        lines = (client.inbuf + data).split(b"\n")
+        client.inbuf = lines.pop()
+        if len(client.inbuf) > MAX_LINE:
+            self.disconnect(client, "was disconnected (line too long)")
+            return
+        for line in lines:
+            if client.closed:
+                return
+            self.handle_line(client, line.decode(CODE, "replace").rstrip("\r"))
+
+    def handle_line(self, client, line):
+        if not line.startswith("/"):
+            if line != "":
+                self.messages += 1
+                self.broadcast(client.room, "[%s] %s: %s" % (client.room, client.nick, line))
+            return
+        command, _, argument = line.partition(" ")
+        argument = argument.strip()
+        if command == "/nick" and argument != "":
+            old, client.nick = client.nick, argument[:32]
+            self.broadcast(client.room, "*** %s is now %s" % (old, client.nick))
+        elif command == "/join" and argument != "":
+            self.join(client, argument[:32])
+        elif command == "/rooms":
+            self.send_line(client, "*** rooms: " + ", ".join(
+                "%s (%d)" % (name, len(members)) for name, members in sorted(self.rooms.items())))
+        elif command == "/who":
+            self.send_line(client, "*** in %s: %s" % (client.room, ", ".join(
+                sorted(member.nick for member in self.rooms[client.room]))))
+        elif command == "/quit":
+            self.disconnect(client, "left")
         else:
-            print(message) 
-            client.send(bytes(input('> '), CODE))          # Reply to client
+            self.send_line(client, "*** unknown command: %s" % line)
+
+    def join(self, client, room):
+        if room == client.room:
+            return
+        self.leave_room(client, "went to " + room)
+        client.room = room
+        self.rooms.setdefault(room, set()).add(client)
+        self.send_line(client, "*** you are in %s" % room)
+        self.broadcast(room, "*** %s joined %s" % (client.nick, room), client)
+
+    def leave_room(self, client, why):
+        """ Take the client out of its room, telling the others why. """
+        room = client.room
+        if room is None:
+            return
+        client.room = None
+        members = self.rooms[room]
+        members.discard(client)
+        if len(members) == 0:
+            del self.rooms[room]
+        elif why is not None:
+            self.broadcast(room, "*** %s %s" % (client.nick, why))
+
+    def broadcast(self, room, text, skip=None):
+        """
+        Send a line to everyone in a room.  The line is encoded once; every
+        member's queue holds the same bytes object.
+        """
+        members = self.rooms.get(room)
+        if members is None:
+            return
+        data = bytes(text + "\n", CODE)
+        # A failed send can disconnect a member and change the room.
+        slow = [member for member in list(members)
+                if member is not skip and not self.enqueue(member, data)]
+        for member in slow:
+            self.evictions += 1
+            self.disconnect(member, "was disconnected (not reading)")
+
+    def send_line(self, client, text):
+        if not self.enqueue(client, bytes(text + "\n", CODE)):
+            self.evictions += 1
+            self.disconnect(client, "was disconnected (not reading)")
+
+    def enqueue(self, client, data):
+        """
+        Queue data for a client.  It is sent at the end of this pass of the
+        loop, together with anything else queued for the client meanwhile.
+        :return: False if the client's queue is full (it should be evicted)
+        """
+        if client.queued + len(data) > self.max_queue_bytes and not client.writing:
+            # Only full because this pass queued a lot: try the socket first.
+            self.flush(client)
+        if client.closed:
+            return True
+        if client.queued + len(data) > self.max_queue_bytes:
+            return False
+        client.outq.append(data)
+        client.queued += len(data)
+        if not client.writing and not client.pending:
+            client.pending = True
+            self.pending.append(client)
+        return True
+
+    def flush_pending(self):
+        """
+        Send what was queued during this pass.  Usually it all fits in the
+        socket buffer and the client never needs EVENT_WRITE.
+        """
+        while len(self.pending) > 0:
+            pending, self.pending = self.pending, []
+            for client in pending:
+                client.pending = False
+                if not client.closed:
+                    self.flush(client)
+
+    def flush(self, client):
+        """ Send as much of the client's queue as the socket takes. """
+        outq = client.outq
+        while len(outq) > 0:
+            batch = [memoryview(outq[0])[client.sent:]]
+            for index in range(1, min(len(outq), MAX_SEND_BATCH)):
+                batch.append(outq[index])
+            try:
+                count = client.sock.sendmsg(batch)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self.disconnect(client, "left")
+                return
+            count += client.sent
+            while len(outq) > 0 and count >= len(outq[0]):
+                count -= len(outq[0])
+                client.queued -= len(outq[0])
+                outq.popleft()
+            client.sent = count
+            if count > 0:
+                # The socket took part of a message: it is full.
+                break
+        writing = len(outq) > 0
+        if writing != client.writing:
+            client.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(client.sock, events, client)
+
+    def disconnect_idle(self):
+        """ Disconnect the clients that sent nothing for the idle timeout. """
+        for client in self.idle.expired():
+            if client.closed:
+                continue
+            self.limits.connection_timed_out()
+            self.send_line(client, "*** disconnected: idle too long")
+            if not client.closed:
+                self.flush(client)
+                self.disconnect(client, "was disconnected (idle)")
+
+    def disconnect(self, client, why):
+        """
+        Close a client's connection.
+        :param why: told to the client's room, None to tell no one
+        """
+        if client.closed:
+            return
+        client.closed = True
+        self.log("%s %s" % (client.nick, why or "disconnected"))
+        del self.clients[client.sock]
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        client.outq.clear()
+        if self.idle is not None:
+            self.idle.forget(client)
+        self.limits.release(client.address)
+        self.leave_room(client, why)
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat server")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE_BYTES,
+                        help="bytes queued for a client before it is disconnected")
+    parser.add_argument("--quiet", action="store_true", help="don't log connections")
+    add_arguments(parser, IDLE_SECONDS)
+    args = parser.parse_args()
+    server = ChatServer((HOST, args.port), args.max_queue, not args.quiet,
+                        limits_from_arguments(args))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Server shutting down.")
+    print(server.limits.report())
 
+if __name__ == "__main__":
+    main()
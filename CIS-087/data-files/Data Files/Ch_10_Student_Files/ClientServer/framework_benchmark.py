@@ -0,0 +1,139 @@
+"""
+File: framework_benchmark.py
+Compares the concurrency backends of socketframework.py on identical
+workloads.  Each backend in turn serves the same handler in another
+process while the clients, all on one asyncio loop in this process, put
+the same load on it:
+
+    echo   every client keeps one connection open and sends lines one
+           at a time, waiting for each to come back (EchoHandler)
+    time   every client opens connection after connection and reads
+           the time until the server hangs up (TimeHandler)
+
+Reported per backend: throughput, the latency the clients saw and the
+server's own ServerStats.
+
+    python framework_benchmark.py
+    python framework_benchmark.py --workload time --clients 50 --count 200
+    python framework_benchmark.py --backends selector asyncio --clients 1000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import time
+
+from handlers import EchoHandler, TimeHandler
+from servercore import ServerLimits
+from socketframework import BACKENDS, HOST, make_server, percentile
+
+WORKLOADS = {"echo": EchoHandler, "time": TimeHandler}
+# Connections being opened at once, so the listen queue never overflows.
+CONNECTING = 100
+LINE = b"x" * 64 + b"\n"
+TIMEOUT_SECONDS = 30
+
+def run_server(backend, workload, workers, address_queue, stop, stats_queue):
+    """ Body of the server process. """
+    options = {}
+    if backend == "pool":
+        options["workers"] = workers
+    # No idle timeout or caps: every client must be served.
+    limits = ServerLimits(0, 0)
+    server = make_server(backend, WORKLOADS[workload], (HOST, 0), limits=limits, **options)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        server.start()
+        address_queue.put(server.address)
+        stop.wait()
+        server.stop()
+    stats_queue.put(server.stats.snapshot())
+
+async def echo_client(address, count, connecting, latencies):
+    async with connecting:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*address),
+                                                TIMEOUT_SECONDS)
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            writer.write(LINE)
+            if await asyncio.wait_for(reader.readline(), TIMEOUT_SECONDS) != LINE:
+                raise ConnectionError("echo was wrong")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+async def time_client(address, count, connecting, latencies):
+    for _ in range(count):
+        start = time.perf_counter()
+        async with connecting:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(*address),
+                                                    TIMEOUT_SECONDS)
+        try:
+            if not await asyncio.wait_for(reader.read(), TIMEOUT_SECONDS):
+                raise ConnectionError("no time sent")
+        finally:
+            writer.close()
+        latencies.append(time.perf_counter() - start)
+
+async def run_clients(address, args):
+    """ :return: (latencies, errors, seconds) """
+    connecting = asyncio.Semaphore(CONNECTING)
+    client = echo_client if args.workload == "echo" else time_client
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client(address, args.count, connecting, latencies)
+                                     for _ in range(args.clients)),
+                                   return_exceptions=True)
+    seconds = time.perf_counter() - start
+    errors = sum(isinstance(result, BaseException) for result in results)
+    return sorted(latencies), errors, seconds
+
+def measure(backend, args):
+    """ Serve the workload with one backend and time the clients. """
+    address_queue = multiprocessing.Queue()
+    stats_queue = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server,
+                                     args=(backend, args.workload, args.workers,
+                                           address_queue, stop, stats_queue))
+    server.start()
+    try:
+        address = address_queue.get(timeout=TIMEOUT_SECONDS)
+        latencies, errors, seconds = asyncio.run(run_clients(address, args))
+    finally:
+        stop.set()
+    stats = dict(stats_queue.get(timeout=TIMEOUT_SECONDS))
+    server.join()
+    return latencies, errors, seconds, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="socketframework backend benchmark")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="echo")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS),
+                        default=list(BACKENDS), help="backends to measure")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent clients")
+    parser.add_argument("--count", type=int, default=100,
+                        help="lines (echo) or connections (time) per client")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads of the pool backend (default one per client)")
+    args = parser.parse_args()
+    if args.workers is None:
+        args.workers = args.clients
+    unit = "req" if args.workload == "echo" else "conn"
+
+    print("%s workload, %d clients x %d" % (args.workload, args.clients, args.count))
+    print("%-9s %10s %8s %8s %8s %7s %8s %10s" % ("backend", unit + "/sec", "p50 ms",
+                                                "p99 ms", "max ms", "errors", "peak",
+                                                "handler us"))
+    for backend in args.backends:
+        latencies, errors, seconds, stats = measure(backend, args)
+        print("%-9s %10.0f %8.3f %8.3f %8.3f %7d %8d %10.1f"
+              % (backend, len(latencies) / seconds, percentile(latencies, 0.5) * 1000,
+                 percentile(latencies, 0.99) * 1000,
+                 (latencies[-1] if latencies else 0.0) * 1000, errors,
+                 stats["peak"], stats["handler.p50_ms"] * 1000))
+
+if __name__ == "__main__":
+    main()
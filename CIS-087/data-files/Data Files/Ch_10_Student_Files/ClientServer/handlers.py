@@ -0,0 +1,26 @@
+"""
+File: handlers.py
+Protocol handlers for socketframework.py.  Any backend can serve them.
+
+TimeHandler   sends the day and time as TimeClientHandler does and
+              hangs up
+EchoHandler   sends every line straight back, a request and response
+              workload for comparing the backends
+"""
+
+from time import ctime
+
+from socketframework import LineHandler, Handler
+
+class TimeHandler(Handler):
+    """Sends the time as soon as the client connects."""
+
+    def connection_made(self):
+        self.connection.send(bytes(ctime() + "\nHave a nice day!", "ascii"))
+        self.connection.close()
+
+class EchoHandler(LineHandler):
+    """Answers every line with the same line."""
+
+    def line_received(self, line):
+        self.connection.send(line + b"\n")
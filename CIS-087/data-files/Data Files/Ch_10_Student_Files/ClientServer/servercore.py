@@ -0,0 +1,300 @@
+"""
+File: servercore.py
+Limits shared by the socket servers (time, chat, doctor and NBA record)
+so that slow or abusive clients can't use up the threads, sockets and
+memory every other client needs:
+
+- An idle timeout.  A connection that sends nothing for idle_seconds is
+  closed.  Servers with a thread per client set it as the socket's
+  timeout; event loop servers keep an IdleTracker and close what it
+  says has expired.
+- A token bucket per client address.  An address can open connect_rate
+  new connections a second, in bursts of up to connect_burst.
+- A cap on the connections open at once, in all and per address.
+
+ServerLimits bundles the three.  A server calls admit(address) for
+each new connection, serves it only if that returns None (otherwise it
+is why the connection is refused) and calls release(address) once the
+connection is closed.  add_arguments gives every server the same
+command line options.
+
+This is the only copy.  The servers in week-14, week-16 and the Case
+Study have a servercore.py of their own that just loads this file.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+IDLE_SECONDS = 300.0
+MAX_CONNECTIONS = 10000
+# Off (0) unless asked for, since benchmark clients all connect from
+# 127.0.0.1.
+MAX_PER_ADDRESS = 0
+CONNECT_RATE = 0.0
+CONNECT_BURST = 20
+# Buckets kept before the ones of addresses that stopped connecting are
+# forgotten.
+MAX_TRACKED_ADDRESSES = 65536
+
+REFUSED_FULL = "server full"
+REFUSED_ADDRESS = "too many connections from your address"
+REFUSED_RATE = "connecting too often"
+
+def client_host(address):
+    """ :return: the host of a peer address (None for a socket without one) """
+    if isinstance(address, tuple) and len(address) > 0:
+        return address[0]
+    return None
+
+class TokenBucket:
+    """
+    Holds up to burst tokens and gains rate tokens a second.  Taking a
+    token fails when the bucket is empty.
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """ :return: True if there was a token to take """
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def full(self, now):
+        self.refill(now)
+        return self.tokens >= self.burst
+
+class RateLimiter:
+    """
+    A TokenBucket per client host.  A full bucket is the same as a new
+    one, so those are forgotten when too many hosts are being tracked.
+    Thread safe.
+    """
+    def __init__(self, rate=CONNECT_RATE, burst=CONNECT_BURST,
+                 max_hosts=MAX_TRACKED_ADDRESSES, clock=monotonic):
+        """
+        :param rate: connections a second allowed per host, 0 for no limit
+        :param burst: connections a host can open at once after a quiet spell
+        :param max_hosts: buckets kept before old ones are forgotten
+        :param clock: function returning the time in seconds
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_hosts = max_hosts
+        self.clock = clock
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def allow(self, host):
+        """ :return: True if host may open another connection now """
+        if self.rate <= 0 or host is None:
+            return True
+        with self.lock:
+            now = self.clock()
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                if len(self.buckets) >= self.max_hosts:
+                    self.forget(now)
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst, now)
+            else:
+                self.buckets.move_to_end(host)
+            return bucket.take(now)
+
+    def forget(self, now):
+        """
+        Make room for new hosts: drop the full buckets and, if that isn't
+        enough, the buckets least recently used down to three quarters.
+        """
+        for host in [host for host, bucket in self.buckets.items() if bucket.full(now)]:
+            del self.buckets[host]
+        while len(self.buckets) > self.max_hosts * 3 // 4:
+            self.buckets.popitem(last=False)
+
+class ConnectionLimiter:
+    """ Counts open connections, in all and per host.  Thread safe. """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_per_address=MAX_PER_ADDRESS):
+        """
+        :param max_connections: connections open at once, 0 for no limit
+        :param max_per_address: connections open at once from one host,
+                                0 for no limit
+        """
+        self.max_connections = max_connections
+        self.max_per_address = max_per_address
+        self.open = 0
+        self.per_host = {}
+        self.lock = Lock()
+
+    def acquire(self, host):
+        """
+        Count a new connection if there is room for it.
+        :return: None if there was, otherwise why not
+        """
+        with self.lock:
+            if 0 < self.max_connections <= self.open:
+                return REFUSED_FULL
+            count = self.per_host.get(host, 0)
+            if 0 < self.max_per_address <= count:
+                return REFUSED_ADDRESS
+            self.open += 1
+            self.per_host[host] = count + 1
+            return None
+
+    def release(self, host):
+        """ A connection counted by acquire was closed. """
+        with self.lock:
+            self.open -= 1
+            count = self.per_host[host] - 1
+            if count == 0:
+                del self.per_host[host]
+            else:
+                self.per_host[host] = count
+
+class IdleTracker:
+    """
+    When each connection last did something, oldest first, for event loop
+    servers that close idle connections themselves.  touch a connection
+    whenever it sends something and call expired every check_seconds.
+    """
+    def __init__(self, idle_seconds, clock=monotonic):
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self.active = OrderedDict()
+        # Connections are closed at most this late.
+        self.check_seconds = min(1.0, idle_seconds / 4)
+
+    def __len__(self):
+        return len(self.active)
+
+    def touch(self, connection):
+        self.active[connection] = self.clock()
+        self.active.move_to_end(connection)
+
+    def forget(self, connection):
+        self.active.pop(connection, None)
+
+    def expired(self):
+        """
+        Forget the connections idle for idle_seconds or more.
+        :return: list of them, to be closed
+        """
+        deadline = self.clock() - self.idle_seconds
+        idle = []
+        for connection, last in self.active.items():
+            if last > deadline:
+                break
+            idle.append(connection)
+        for connection in idle:
+            del self.active[connection]
+        return idle
+
+class ServerLimits:
+    """
+    Idle timeout, connection rate per host and connection caps of a
+    server, and counts of the connections they turned away or closed.
+    """
+    def __init__(self, idle_seconds=IDLE_SECONDS, max_connections=MAX_CONNECTIONS,
+                 max_per_address=MAX_PER_ADDRESS, connect_rate=CONNECT_RATE,
+                 connect_burst=CONNECT_BURST):
+        """
+        :param idle_seconds: close a connection that sends nothing for this
+                             long, 0 to never
+        :param max_connections: connections open at once, 0 for no limit
+        :param max_per_address: connections open at once from one host,
+                                0 for no limit
+        :param connect_rate: new connections a second per host, 0 for no limit
+        :param connect_burst: new connections a host can open at once
+        """
+        self.idle_seconds = idle_seconds if idle_seconds > 0 else None
+        self.connections = ConnectionLimiter(max_connections, max_per_address)
+        self.rate = RateLimiter(connect_rate, connect_burst)
+        self.lock = Lock()
+        self.refused = {REFUSED_FULL: 0, REFUSED_ADDRESS: 0, REFUSED_RATE: 0}
+        self.timed_out = 0
+
+    def admit(self, address):
+        """
+        Decide whether to serve a new connection.
+        :param address: the peer address returned by accept
+        :return: None to serve it (release must be called once it is
+                 closed), otherwise why it is refused
+        """
+        host = client_host(address)
+        reason = None
+        if not self.rate.allow(host):
+            reason = REFUSED_RATE
+        else:
+            reason = self.connections.acquire(host)
+        if reason is not None:
+            with self.lock:
+                self.refused[reason] += 1
+        return reason
+
+    def release(self, address):
+        """ A connection admitted from address was closed. """
+        self.connections.release(client_host(address))
+
+    def set_timeout(self, sock):
+        """
+        Make blocking calls on a client's socket raise socket.timeout once
+        it has been quiet for idle_seconds.
+        """
+        sock.settimeout(self.idle_seconds)
+
+    def idle_tracker(self):
+        """ :return: an IdleTracker for the idle timeout, None if there is none """
+        if self.idle_seconds is None:
+            return None
+        return IdleTracker(self.idle_seconds)
+
+    def connection_timed_out(self):
+        with self.lock:
+            self.timed_out += 1
+
+    def report(self):
+        """ :return: one line with the open, refused and timed out connections """
+        with self.lock:
+            refused = ", ".join("%d %s" % (count, reason)
+                                for reason, count in self.refused.items())
+            timed_out = self.timed_out
+        return "connections: %d open; refused: %s; %d idle timed out" \
+               % (self.connections.open, refused, timed_out)
+
+def add_arguments(parser, idle_seconds=IDLE_SECONDS, max_connections=MAX_CONNECTIONS):
+    """
+    Add the limit options to an argparse parser.
+    :param idle_seconds: this server's default idle timeout
+    :param max_connections: this server's default connection cap
+    """
+    parser.add_argument("--idle-seconds", type=float, default=idle_seconds,
+                        help="close connections quiet for this long, 0 to never "
+                             "(default %g)" % idle_seconds)
+    parser.add_argument("--max-connections", type=int, default=max_connections,
+                        help="connections open at once, 0 for no limit "
+                             "(default %d)" % max_connections)
+    parser.add_argument("--max-per-address", type=int, default=MAX_PER_ADDRESS,
+                        help="connections open at once from one address, "
+                             "0 for no limit (default %d)" % MAX_PER_ADDRESS)
+    parser.add_argument("--connect-rate", type=float, default=CONNECT_RATE,
+                        help="new connections a second per address, 0 for no "
+                             "limit (default %g)" % CONNECT_RATE)
+    parser.add_argument("--connect-burst", type=int, default=CONNECT_BURST,
+                        help="new connections an address can open at once "
+                             "(default %d)" % CONNECT_BURST)
+
+def limits_from_arguments(args):
+    """ :return: ServerLimits for options added by add_arguments """
+    return ServerLimits(args.idle_seconds, args.max_connections, args.max_per_address,
+                        args.connect_rate, args.connect_burst)
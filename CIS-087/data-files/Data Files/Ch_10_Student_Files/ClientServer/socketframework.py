@@ -0,0 +1,925 @@
+"""
+File: socketframework.py
+A socket server with pluggable protocol handlers and a choice of
+concurrency backends.  The time, chat and doctor servers each bind,
+listen, accept and serve their clients their own way; this does it once
+so a protocol can be written once and served (and benchmarked) by every
+backend.
+
+A handler serves one connection.  The server calls it back and it
+answers through its connection:
+
+    class EchoHandler(LineHandler):
+        def line_received(self, line):
+            self.connection.send(line + b"\\n")
+
+    server = make_server("selector", EchoHandler, ("localhost", 5000))
+    server.start()
+    ...
+    server.stop()
+
+Callbacks must not block, since with the selector and asyncio backends
+every connection shares one thread, and send and close may only be
+called from the handler's own callbacks.
+
+Backends (BACKENDS):
+
+    thread    a thread per connection (timeserver.py, doctorserver.py)
+    pool      a fixed pool of threads; a connection keeps its thread
+              until it closes and at most queue_depth wait for one
+    selector  one thread and a selectors loop (chatserver.py)
+    asyncio   one asyncio event loop (asyncdoctorserver.py)
+
+Every backend takes the same servercore.ServerLimits (idle timeout,
+connection rate and caps), counts the same ServerStats and shuts down
+the same way: stop() stops accepting, stops reading from the open
+connections, gives them shutdown_seconds to send what they have queued
+and then cuts off the rest.
+
+This is the only copy; the Case Study's socketframework.py just loads
+this file.
+"""
+
+import asyncio
+import selectors
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from socket import *
+from threading import BoundedSemaphore, Condition, Event, Lock, Thread
+from time import monotonic, perf_counter
+
+from servercore import ServerLimits
+
+HOST = "localhost"
+PORT = 5000
+ADDRESS = (HOST, PORT)
+BUFSIZE = 65536
+BACKLOG = 128
+SHUTDOWN_SECONDS = 5.0
+# The accept loops of the threaded backends look at the stop flag this
+# often even if nothing wakes them.
+STOP_CHECK_SECONDS = 0.5
+POOL_WORKERS = 16
+QUEUE_DEPTH = 64
+# Bytes waiting to be sent to one connection (selector backend) before
+# it is closed for not reading.
+MAX_QUEUE_BYTES = 1024 * 1024
+MAX_SEND_BATCH = 64
+MAX_LINE = 64 * 1024
+# Latency percentiles are computed from the most recent callbacks.
+LATENCY_SAMPLES = 100000
+
+REFUSED_BUSY = "server busy"
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+class Handler:
+    """
+    Serves one connection.  Subclasses override the callbacks they need;
+    self.connection has the peer's address and send and close.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def connection_made(self):
+        """ The client connected.  A greeting is sent from here. """
+
+    def data_received(self, data):
+        """ The client sent some bytes (however a recv split them). """
+
+    def timed_out(self):
+        """
+        The client sent nothing for the idle timeout and is being hung up
+        on.  A goodbye sent from here is the last thing it gets, if it is
+        still reading.
+        """
+
+    def connection_lost(self):
+        """ The connection is closed.  Nothing can be sent any more. """
+
+class LineHandler(Handler):
+    """ A handler for newline terminated messages. """
+    max_line = MAX_LINE
+
+    def __init__(self, connection):
+        Handler.__init__(self, connection)
+        self.partial = b""
+
+    def data_received(self, data):
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        for line in lines:
+            if self.connection.closing:
+                return
+            self.line_received(line.rstrip(b"\r"))
+        if len(self.partial) > self.max_line:
+            self.connection.close()
+
+    def line_received(self, line):
+        """ One line from the client, without its newline. """
+
+class ServerStats:
+    """
+    What every backend counts.  Updated from the handler threads of the
+    threaded backends, so under a lock.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.accepted = 0
+        self.refused = 0
+        self.open = 0
+        self.peak = 0
+        self.timed_out = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.callbacks = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def connection_opened(self):
+        with self.lock:
+            self.accepted += 1
+            self.open += 1
+            if self.open > self.peak:
+                self.peak = self.open
+
+    def connection_closed(self):
+        with self.lock:
+            self.open -= 1
+
+    def connection_refused(self):
+        with self.lock:
+            self.refused += 1
+
+    def connection_timed_out(self):
+        with self.lock:
+            self.timed_out += 1
+
+    def data_handled(self, size, seconds):
+        """ :param seconds: time the handler took over the data """
+        with self.lock:
+            self.bytes_received += size
+            self.callbacks += 1
+            self.latencies.append(seconds)
+
+    def data_sent(self, size):
+        with self.lock:
+            self.bytes_sent += size
+
+    def snapshot(self):
+        """ :return: list of (name, value) pairs.  Latencies are in milliseconds. """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return [("accepted", self.accepted),
+                    ("refused", self.refused),
+                    ("open", self.open),
+                    ("peak", self.peak),
+                    ("timed_out", self.timed_out),
+                    ("bytes_received", self.bytes_received),
+                    ("bytes_sent", self.bytes_sent),
+                    ("callbacks", self.callbacks),
+                    ("handler.p50_ms", percentile(latencies, 0.5) * 1000),
+                    ("handler.p99_ms", percentile(latencies, 0.99) * 1000),
+                    ("handler.max_ms", (latencies[-1] if latencies else 0.0) * 1000)]
+
+    def report(self):
+        lines = []
+        for name, value in self.snapshot():
+            if isinstance(value, float):
+                lines.append("%-16s %12.3f" % (name, value))
+            else:
+                lines.append("%-16s %12d" % (name, value))
+        return "\n".join(lines)
+
+class SocketServer:
+    """
+    What the backends have in common.  Subclasses implement serve_forever
+    and wake.
+    """
+    backend = None
+
+    def __init__(self, handler_factory, address=ADDRESS, limits=None, backlog=BACKLOG,
+                 shutdown_seconds=SHUTDOWN_SECONDS, refused_message=None, verbose=False):
+        """
+        :param handler_factory: called with a connection, returns its Handler
+                                (usually the Handler subclass itself)
+        :param address: (host, port) to listen on.  Port 0 picks a free
+                        port; self.address holds the real one once ready.
+        :param limits: servercore.ServerLimits, default ones when None
+        :param backlog: connections the OS queues before they are accepted
+        :param shutdown_seconds: time open connections get to finish
+                                 after stop() is called
+        :param refused_message: function(reason) returning the bytes to
+                                send a refused client, None to just close
+        :param verbose: print every connection
+        """
+        self.handler_factory = handler_factory
+        self.address = address
+        self.limits = limits if limits is not None else ServerLimits()
+        self.backlog = backlog
+        self.shutdown_seconds = shutdown_seconds
+        self.refused_message = refused_message
+        self.verbose = verbose
+        self.stats = ServerStats()
+        self.ready = Event()
+        self.stopping = Event()
+        self.thread = None
+        # What stopped a server started with start() from listening.
+        self.error = None
+
+    def log(self, text):
+        if self.verbose:
+            print(text)
+
+    def listen(self):
+        """ :return: a non-blocking listening socket; sets self.address """
+        server = socket(AF_INET, SOCK_STREAM)
+        server.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        server.bind(self.address)
+        server.listen(self.backlog)
+        server.setblocking(False)
+        self.address = server.getsockname()[:2]
+        return server
+
+    def start(self):
+        """
+        Serve from a thread of its own.  Returns once listening, or raises
+        what kept the server from listening (the port is taken ...).
+        """
+        self.thread = Thread(target=self.run, name="%s server" % self.backend,
+                             daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def run(self):
+        """ Body of the thread made by start(). """
+        try:
+            self.serve_forever()
+        except BaseException as ex:
+            if self.ready.is_set():
+                raise
+            # Failed before listening: start() raises it.
+            self.error = ex
+        finally:
+            self.ready.set()
+
+    def serve_forever(self):
+        """ Accept and serve connections until stop() is called. """
+        raise NotImplementedError
+
+    def stop(self, wait=True):
+        """
+        Shut the server down gracefully.  Safe to call from any thread.
+        :param wait: wait for a server started with start() to finish
+        """
+        self.stopping.set()
+        self.wake()
+        if wait and self.thread is not None:
+            self.thread.join()
+
+    def wake(self):
+        """ Make serve_forever notice that stopping is set. """
+        raise NotImplementedError
+
+    def admit(self, address):
+        """
+        Apply the limits to a new connection.
+        :return: None if it should be served (release the limits once it
+                 is closed), otherwise why it is refused
+        """
+        self.log("... connected from: %s" % (address,))
+        refused = self.limits.admit(address)
+        if refused is not None:
+            self.refused(address, refused)
+        return refused
+
+    def refused(self, address, reason):
+        """ Count a refused connection. """
+        self.log("... refused %s: %s" % (address, reason))
+        self.stats.connection_refused()
+
+    def refuse(self, sock, reason):
+        """ Tell a refused client why (if there is a refused_message) and close it. """
+        if self.refused_message is not None:
+            try:
+                sock.setblocking(False)
+                sock.send(self.refused_message(reason))
+            except OSError:
+                pass
+        sock.close()
+
+    def timed_out(self):
+        self.stats.connection_timed_out()
+        self.limits.connection_timed_out()
+
+    def dispatch(self, connection, callback, *args):
+        """
+        Call a handler callback.  A callback that raises closes its
+        connection instead of taking the server down.
+        """
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
+            connection.close()
+
+    def received(self, connection, data):
+        """ Pass data to the handler, timing it. """
+        start = perf_counter()
+        self.dispatch(connection, connection.handler.data_received, data)
+        self.stats.data_handled(len(data), perf_counter() - start)
+
+class BlockingConnection:
+    """ A connection served by a thread of its own (thread and pool backends). """
+
+    def __init__(self, server, sock, address):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.closing = False
+        self.handler = None
+
+    def send(self, data):
+        """
+        Blocks until the data is sent.  If it can't be (the client hung up
+        or didn't read it within the idle timeout) the connection closes.
+        """
+        if self.closing:
+            return
+        try:
+            self.sock.sendall(data)
+        except timeout:
+            self.server.timed_out()
+            self.closing = True
+            return
+        except OSError:
+            self.closing = True
+            return
+        self.server.stats.data_sent(len(data))
+
+    def close(self):
+        """ Hang up once the current callback returns. """
+        self.closing = True
+
+    def shutdown(self, how):
+        try:
+            self.sock.shutdown(how)
+        except OSError:
+            # Already closed by the handler or the client.
+            pass
+
+class ThreadServer(SocketServer):
+    """
+    A thread per connection, the way TimeServer and doctorserver.py do it,
+    with an accept loop that stop() can wake up.
+    """
+    backend = "thread"
+
+    def __init__(self, handler_factory, address=ADDRESS, **options):
+        SocketServer.__init__(self, handler_factory, address, **options)
+        self.connections = set()
+        self.connections_changed = Condition()
+        self.wakeup_reader, self.wakeup_writer = socketpair()
+
+    def wake(self):
+        try:
+            self.wakeup_writer.send(b"x")
+        except OSError:
+            # Already woken (the buffer is full) or already shut down.
+            pass
+
+    def listen_or_close(self):
+        """ listen(), closing the wakeup pair if that fails. """
+        try:
+            return self.listen()
+        except OSError:
+            self.wakeup_reader.close()
+            self.wakeup_writer.close()
+            raise
+
+    def serve_forever(self):
+        server = self.listen_or_close()
+        selector = selectors.DefaultSelector()
+        selector.register(server, selectors.EVENT_READ)
+        selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        self.ready.set()
+        try:
+            while not self.stopping.is_set():
+                for key, events in selector.select(STOP_CHECK_SECONDS):
+                    if key.fileobj is server:
+                        self.accept(server)
+        finally:
+            selector.close()
+            server.close()
+            self.drain()
+            self.wakeup_reader.close()
+            self.wakeup_writer.close()
+
+    def accept(self, server):
+        try:
+            sock, address = server.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as ex:
+            # Out of file descriptors, connection reset before accept ...
+            self.log("accept failed: %s" % ex)
+            return
+        refused = self.admit(address)
+        if refused is None and not self.has_room():
+            self.limits.release(address)
+            refused = REFUSED_BUSY
+            self.refused(address, refused)
+        if refused is not None:
+            self.refuse(sock, refused)
+            return
+        self.limits.set_timeout(sock)
+        connection = BlockingConnection(self, sock, address)
+        with self.connections_changed:
+            self.connections.add(connection)
+        self.stats.connection_opened()
+        self.submit(connection)
+
+    def has_room(self):
+        """ :return: True if another connection can be served """
+        return True
+
+    def submit(self, connection):
+        """ Have connection served. """
+        Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+    def serve_connection(self, connection):
+        """ Body of a connection's thread: read and dispatch until it is done. """
+        sock = connection.sock
+        try:
+            connection.handler = self.handler_factory(connection)
+            self.dispatch(connection, connection.handler.connection_made)
+            while not connection.closing:
+                data = sock.recv(BUFSIZE)
+                if data == b"":
+                    break
+                self.received(connection, data)
+        except timeout:
+            self.timed_out()
+            self.say_goodbye(connection)
+        except OSError:
+            # Reset by the client or cut off by drain.
+            pass
+        finally:
+            if connection.handler is not None:
+                self.dispatch(connection, connection.handler.connection_lost)
+            sock.close()
+            self.finished(connection)
+
+    def say_goodbye(self, connection):
+        """ Let the handler of a connection that went quiet send its goodbye. """
+        try:
+            # Don't wait on a client that isn't reading.
+            connection.sock.setblocking(False)
+        except OSError:
+            return
+        self.dispatch(connection, connection.handler.timed_out)
+
+    def finished(self, connection):
+        """ Forget a connection that has been closed. """
+        self.limits.release(connection.address)
+        self.stats.connection_closed()
+        with self.connections_changed:
+            self.connections.discard(connection)
+            self.connections_changed.notify_all()
+
+    def drain(self):
+        """
+        Stop reading from every connection so the handlers finish what they
+        were sent and hang up, then cut off those still open at the deadline.
+        """
+        with self.connections_changed:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.shutdown(SHUT_RD)
+        deadline = monotonic() + self.shutdown_seconds
+        with self.connections_changed:
+            self.connections_changed.wait_for(lambda: len(self.connections) == 0,
+                                              max(0.0, deadline - monotonic()))
+            left = list(self.connections)
+        for connection in left:
+            connection.shutdown(SHUT_RDWR)
+        if len(left) > 0:
+            self.log("Shutting down: cut off %d connections" % len(left))
+
+class PoolServer(ThreadServer):
+    """
+    A fixed pool of threads, like NbaRecordServerListener.  A connection
+    keeps its thread until it closes; up to queue_depth more wait for one
+    and any past that are refused as busy.
+    """
+    backend = "pool"
+
+    def __init__(self, handler_factory, address=ADDRESS, workers=POOL_WORKERS,
+                 queue_depth=QUEUE_DEPTH, **options):
+        ThreadServer.__init__(self, handler_factory, address, **options)
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Handler")
+        # The executor's queue has no limit.  This counts connections being
+        # served or waiting.
+        self.slots = BoundedSemaphore(workers + queue_depth)
+
+    def has_room(self):
+        return self.slots.acquire(blocking=False)
+
+    def submit(self, connection):
+        future = self.pool.submit(self.serve_connection, connection)
+        future.add_done_callback(lambda f: self.slot_done(connection, f))
+
+    def slot_done(self, connection, future):
+        self.slots.release()
+        if future.cancelled():
+            # Never ran, so the connection was never closed.
+            connection.sock.close()
+            self.finished(connection)
+
+    def drain(self):
+        ThreadServer.drain(self)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class SelectorConnection:
+    """ A connection served by the selector loop. """
+    __slots__ = ("server", "sock", "address", "handler", "outq", "queued", "sent",
+                 "events", "closing", "closed")
+
+    def __init__(self, server, sock, address):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.handler = None
+        self.outq = deque()
+        self.queued = 0       # bytes in outq
+        self.sent = 0         # bytes of outq[0] already sent
+        self.events = selectors.EVENT_READ  # what the selector watches for
+        self.closing = False
+        self.closed = False
+
+    def send(self, data):
+        """ Queue data.  It is sent once the current callback returns. """
+        if self.closed:
+            return
+        self.outq.append(data)
+        self.queued += len(data)
+        self.server.touched.add(self)
+
+    def close(self):
+        """ Hang up once everything queued has been sent. """
+        self.closing = True
+        self.server.touched.add(self)
+
+class SelectorServer(SocketServer):
+    """
+    Every connection served from one thread by a selectors loop, the way
+    ChatServer does it.  What a callback sends is queued and flushed after
+    the callback with as few system calls as the socket allows.
+    """
+    backend = "selector"
+
+    def __init__(self, handler_factory, address=ADDRESS, max_queue_bytes=MAX_QUEUE_BYTES,
+                 **options):
+        SocketServer.__init__(self, handler_factory, address, **options)
+        self.max_queue_bytes = max_queue_bytes
+        self.selector = selectors.DefaultSelector()
+        self.connections = {}
+        # Connections that sent or closed during this pass of the loop.
+        self.touched = set()
+        self.idle = None
+        self.wakeup_reader, self.wakeup_writer = socketpair()
+        self.wakeup_reader.setblocking(False)
+
+    def wake(self):
+        try:
+            self.wakeup_writer.send(b"x")
+        except OSError:
+            pass
+
+    def listen_or_close(self):
+        """ listen(), closing the selector and wakeup pair if that fails. """
+        try:
+            return self.listen()
+        except OSError:
+            self.selector.close()
+            self.wakeup_reader.close()
+            self.wakeup_writer.close()
+            raise
+
+    def serve_forever(self):
+        server = self.listen_or_close()
+        self.idle = self.limits.idle_tracker()
+        self.selector.register(server, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        timeout = STOP_CHECK_SECONDS
+        if self.idle is not None:
+            timeout = min(timeout, self.idle.check_seconds)
+        self.ready.set()
+        deadline = None
+        try:
+            while True:
+                if deadline is None and self.stopping.is_set():
+                    # Stop accepting and reading; what is queued still goes out.
+                    self.selector.unregister(server)
+                    server.close()
+                    for connection in list(self.connections.values()):
+                        connection.close()
+                    self.flush_touched()
+                    deadline = monotonic() + self.shutdown_seconds
+                if deadline is not None and (len(self.connections) == 0
+                                             or monotonic() >= deadline):
+                    break
+                for key, events in self.selector.select(timeout):
+                    sock = key.fileobj
+                    if sock is server:
+                        self.accept(server)
+                    elif sock is self.wakeup_reader:
+                        self.drain_wakeup()
+                    else:
+                        connection = key.data
+                        if events & selectors.EVENT_WRITE and not connection.closed:
+                            self.flush(connection)
+                        if events & selectors.EVENT_READ and not connection.closing:
+                            self.receive(connection)
+                if self.idle is not None and deadline is None:
+                    self.close_idle()
+                self.flush_touched()
+        finally:
+            if len(self.connections) > 0:
+                self.log("Shutting down: cut off %d connections" % len(self.connections))
+            for connection in list(self.connections.values()):
+                self.finish(connection)
+            if deadline is None:
+                server.close()
+            self.selector.close()
+            self.wakeup_reader.close()
+            self.wakeup_writer.close()
+
+    def drain_wakeup(self):
+        try:
+            self.wakeup_reader.recv(BUFSIZE)
+        except OSError:
+            pass
+
+    def accept(self, server):
+        """ Accept every connection that is waiting. """
+        while True:
+            try:
+                sock, address = server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as ex:
+                self.log("accept failed: %s" % ex)
+                return
+            refused = self.admit(address)
+            if refused is not None:
+                self.refuse(sock, refused)
+                continue
+            sock.setblocking(False)
+            connection = SelectorConnection(self, sock, address)
+            self.connections[sock] = connection
+            self.selector.register(sock, selectors.EVENT_READ, connection)
+            self.stats.connection_opened()
+            if self.idle is not None:
+                self.idle.touch(connection)
+            connection.handler = self.handler_factory(connection)
+            self.dispatch(connection, connection.handler.connection_made)
+
+    def receive(self, connection):
+        try:
+            data = connection.sock.recv(BUFSIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if data == b"":
+            self.finish(connection)
+            return
+        if self.idle is not None:
+            self.idle.touch(connection)
+        self.received(connection, data)
+
+    def close_idle(self):
+        for connection in self.idle.expired():
+            if not connection.closed:
+                self.timed_out()
+                self.dispatch(connection, connection.handler.timed_out)
+                # One try at sending the goodbye; a full socket isn't waited for.
+                self.flush(connection)
+                self.finish(connection)
+
+    def flush_touched(self):
+        """ Send what the callbacks of this pass queued and close what they closed. """
+        while len(self.touched) > 0:
+            touched, self.touched = self.touched, set()
+            for connection in touched:
+                if connection.closed:
+                    continue
+                if connection.queued > self.max_queue_bytes:
+                    # Not reading what it is sent.
+                    self.finish(connection)
+                    continue
+                self.flush(connection)
+
+    def flush(self, connection):
+        """ Send as much of the queue as the socket takes. """
+        outq = connection.outq
+        while len(outq) > 0:
+            batch = [memoryview(outq[0])[connection.sent:]]
+            for index in range(1, min(len(outq), MAX_SEND_BATCH)):
+                batch.append(outq[index])
+            try:
+                count = connection.sock.sendmsg(batch)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self.finish(connection)
+                return
+            self.stats.data_sent(count)
+            count += connection.sent
+            while len(outq) > 0 and count >= len(outq[0]):
+                count -= len(outq[0])
+                connection.queued -= len(outq[0])
+                outq.popleft()
+            connection.sent = count
+            if count > 0:
+                # The socket took part of a message: it is full.
+                break
+        if connection.closing and len(outq) == 0:
+            self.finish(connection)
+            return
+        # A closing connection isn't read from any more; left registered
+        # for reading it would wake the loop on every pass.
+        events = selectors.EVENT_WRITE if len(outq) > 0 else 0
+        if not connection.closing:
+            events |= selectors.EVENT_READ
+        if events != connection.events:
+            connection.events = events
+            self.selector.modify(connection.sock, events, connection)
+
+    def finish(self, connection):
+        """ Close a connection and tell its handler. """
+        if connection.closed:
+            return
+        connection.closed = connection.closing = True
+        del self.connections[connection.sock]
+        self.selector.unregister(connection.sock)
+        connection.sock.close()
+        connection.outq.clear()
+        if self.idle is not None:
+            self.idle.forget(connection)
+        if connection.handler is not None:
+            self.dispatch(connection, connection.handler.connection_lost)
+        self.limits.release(connection.address)
+        self.stats.connection_closed()
+
+class AsyncioConnection(asyncio.Protocol):
+    """ A connection served by the asyncio backend. """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.address = None
+        self.handler = None
+        self.closing = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.address = transport.get_extra_info("peername")
+        self.server.connection_made(self)
+
+    def data_received(self, data):
+        self.server.data_received(self, data)
+
+    def connection_lost(self, exc):
+        self.server.connection_lost(self)
+
+    def send(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+            self.server.stats.data_sent(len(data))
+
+    def close(self):
+        """ Hang up once everything written has been sent. """
+        self.closing = True
+        self.transport.close()
+
+class AsyncioServer(SocketServer):
+    """ Every connection served by one asyncio event loop. """
+    backend = "asyncio"
+
+    def __init__(self, handler_factory, address=ADDRESS, **options):
+        SocketServer.__init__(self, handler_factory, address, **options)
+        self.loop = None
+        self.stopped = None
+        self.connections = set()
+        self.idle = None
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    def wake(self):
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.stopped.set)
+            except RuntimeError:
+                # The loop already finished.
+                pass
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.idle = self.limits.idle_tracker()
+        sweeper = None
+        server = await self.loop.create_server(lambda: AsyncioConnection(self),
+                                               sock=self.listen())
+        try:
+            if self.idle is not None:
+                sweeper = asyncio.create_task(self.close_idle())
+            self.ready.set()
+            if not self.stopping.is_set():
+                await self.stopped.wait()
+        finally:
+            self.ready.set()
+            if sweeper is not None:
+                sweeper.cancel()
+            server.close()
+            await self.drain()
+            await server.wait_closed()
+
+    async def drain(self):
+        """ Stop reading, let the queued data go out, cut off the rest at the deadline. """
+        for connection in list(self.connections):
+            connection.transport.pause_reading()
+            connection.close()
+        deadline = monotonic() + self.shutdown_seconds
+        while len(self.connections) > 0 and monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if len(self.connections) > 0:
+            self.log("Shutting down: cut off %d connections" % len(self.connections))
+        for connection in list(self.connections):
+            connection.transport.abort()
+        # connection_lost is called soon after abort.
+        await asyncio.sleep(0)
+
+    async def close_idle(self):
+        while True:
+            await asyncio.sleep(self.idle.check_seconds)
+            for connection in self.idle.expired():
+                self.timed_out()
+                self.dispatch(connection, connection.handler.timed_out)
+                if connection.transport.get_write_buffer_size() > 0:
+                    # Not reading either: closing would wait for it.
+                    connection.transport.abort()
+                else:
+                    connection.close()
+
+    def connection_made(self, connection):
+        transport = connection.transport
+        refused = self.admit(connection.address)
+        if refused is not None:
+            if self.refused_message is not None:
+                transport.write(self.refused_message(refused))
+            transport.close()
+            return
+        self.connections.add(connection)
+        self.stats.connection_opened()
+        if self.idle is not None:
+            self.idle.touch(connection)
+        connection.handler = self.handler_factory(connection)
+        self.dispatch(connection, connection.handler.connection_made)
+
+    def data_received(self, connection, data):
+        if connection.closing:
+            return
+        if self.idle is not None:
+            self.idle.touch(connection)
+        self.received(connection, data)
+
+    def connection_lost(self, connection):
+        if connection not in self.connections:
+            return
+        self.connections.discard(connection)
+        if self.idle is not None:
+            self.idle.forget(connection)
+        self.dispatch(connection, connection.handler.connection_lost)
+        self.limits.release(connection.address)
+        self.stats.connection_closed()
+
+BACKENDS = {"thread": ThreadServer, "pool": PoolServer,
+            "selector": SelectorServer, "asyncio": AsyncioServer}
+
+def make_server(backend, handler_factory, address=ADDRESS, **options):
+    """
+    :param backend: key of BACKENDS
+    :param options: keyword arguments of the backend's constructor
+    :return: a server, not yet started
+    """
+    return BACKENDS[backend](handler_factory, address, **options)
@@ -0,0 +1,43 @@
+"""
+File: timeserver3.py
+Server for providing the day and time, built on
+socketframework.py.  The same TimeHandler can be served
+by any of the framework's backends:
+
+    python timeserver3.py --backend thread
+    python timeserver3.py --backend asyncio
+
+timeclient.py works with every one of them.
+"""
+
+import argparse
+
+from handlers import TimeHandler
+from servercore import add_arguments, limits_from_arguments
+from socketframework import BACKENDS, HOST, PORT, make_server
+
+# The time is sent straight away, so a client has no reason to be
+# connected for long.
+IDLE_SECONDS = 10.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Day and time server")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="thread",
+                        help="how connections are served (default thread)")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    add_arguments(parser, IDLE_SECONDS)
+    args = parser.parse_args()
+    server = make_server(args.backend, TimeHandler, (HOST, args.port),
+                         limits=limits_from_arguments(args), verbose=True)
+    server.start()
+    print("Sending the time on %s:%d (%s backend)" % (server.address + (args.backend,)))
+    try:
+        input("Press enter to shut the server down.\n")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    server.stop()
+    print(server.stats.report())
+    print("Server shutting down.")
+
+if __name__ == "__main__":
+    main()
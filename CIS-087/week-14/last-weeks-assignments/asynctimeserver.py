@@ -0,0 +1,241 @@
+"""
+File: asynctimeserver.py
+
+Server for providing the day and time without a thread per client.
+One asyncio event loop accepts every connection, sends the time and
+closes the connection, so a burst of clients costs a few callbacks
+instead of a TimeClientHandler thread each.  Like TimeServer, the loop
+runs in a thread and waits for the user to shut it down, but quitting
+no longer needs another client to connect.
+
+The time can be sent the classic way (ctime and a greeting, what
+timeclient.py expects) or in a high resolution format (ISO 8601 with
+microseconds, or nanoseconds since the epoch).
+
+The same loop answers clock skew probes on PROBE_PORT.  A client sends
+one line per probe, as many lines at a time as it likes (batch mode),
+and gets each line back followed by the server's time in nanoseconds
+when the line was read and when the answer was written:
+
+    <line> <received ns> <sent ns>
+
+timeprobe.py uses these to estimate how far its clock is from the
+server's.
+
+Both ports share one servercore.ServerLimits: connections over its caps
+or rate are closed without an answer and a probe connection that sends
+nothing for the idle timeout is closed.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+from threading import Event, Thread
+from time import ctime, time_ns
+
+from servercore import ServerLimits, add_arguments, limits_from_arguments
+
+HOST = "localhost"
+PORT = 5000
+PROBE_PORT = 5001
+ADDRESS = (HOST, PORT)
+PROBE_ADDRESS = (HOST, PROBE_PORT)
+
+# timeserver.py listens with a backlog of 5.  The event loop accepts fast
+# enough that a deeper queue only absorbs bursts of connections.
+BACKLOG = 128
+MAX_PROBE_LINE = 1024
+# A probe connection that sends nothing for this long is closed.
+IDLE_SECONDS = 10.0
+
+def classic_time():
+    """ The day and time as TimeClientHandler sends them. """
+    return ctime() + "\nHave a nice day!"
+
+def iso_time():
+    """ Local time with microseconds and UTC offset (2022-12-23T10:15:02.123456-08:00). """
+    return datetime.now().astimezone().isoformat(timespec="microseconds") + "\n"
+
+def ns_time():
+    """ Nanoseconds since the epoch. """
+    return "%d\n" % time_ns()
+
+TIME_FORMATS = {"ctime": classic_time, "iso": iso_time, "ns": ns_time}
+
+class TimeProtocol(asyncio.Protocol):
+    """
+    Sends the time as soon as a client connects and closes the connection.
+    Nothing is read from the client.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.address = None
+
+    def connection_made(self, transport):
+        address = transport.get_extra_info("peername")
+        if self.server.verbose:
+            print("... connected from:", address)
+        refused = self.server.limits.admit(address)
+        if refused is not None:
+            if self.server.verbose:
+                print("... refused:", refused)
+            transport.abort()
+            return
+        self.address = address
+        self.server.connections += 1
+        transport.write(bytes(self.server.format_time(), "ascii"))
+        transport.close()
+
+    def connection_lost(self, exc):
+        if self.address is not None:
+            self.server.limits.release(self.address)
+
+class AsyncTimeServer(Thread):
+    """Server for the day and time, and for clock skew probes."""
+
+    def __init__(self, address=ADDRESS, probe_address=PROBE_ADDRESS,
+                 time_format="ctime", verbose=True, limits=None):
+        """
+        :param address: (host, port) to send the time on.  Port 0 picks a free
+                        port; self.address holds the real one once ready is set.
+        :param probe_address: (host, port) for probes, None to not answer them
+        :param time_format: key of TIME_FORMATS
+        :param verbose: print every connection, like TimeServer
+        :param limits: servercore.ServerLimits for both ports, one with
+                       IDLE_SECONDS when None
+        """
+        Thread.__init__(self)
+        self.address = address
+        self.probe_address = probe_address
+        self.format_time = TIME_FORMATS[time_format]
+        self.verbose = verbose
+        self.limits = limits if limits is not None else ServerLimits(IDLE_SECONDS)
+        self.idle = None
+        self.done = False
+        self.ready = Event()
+        self.loop = None
+        self.stopped = None
+        self.probe_writers = set()
+        self.connections = 0
+        self.probes = 0
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """ Listen on both ports until quit is called. """
+        self.stopped = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.idle = self.limits.idle_tracker()
+        servers = []
+        sweeper = None
+        try:
+            time_server = await self.loop.create_server(lambda: TimeProtocol(self),
+                                                        *self.address, backlog=BACKLOG)
+            servers.append(time_server)
+            self.address = time_server.sockets[0].getsockname()[:2]
+            if self.probe_address is not None:
+                probe_server = await asyncio.start_server(self.handle_probes,
+                                                          *self.probe_address,
+                                                          backlog=BACKLOG,
+                                                          limit=MAX_PROBE_LINE)
+                servers.append(probe_server)
+                self.probe_address = probe_server.sockets[0].getsockname()[:2]
+            print("Sending the time on %s:%d" % self.address)
+            if self.probe_address is not None:
+                print("Answering probes on %s:%d" % self.probe_address)
+            if self.idle is not None:
+                sweeper = asyncio.create_task(self.close_idle_probes())
+            self.ready.set()
+            if not self.done:
+                await self.stopped.wait()
+        finally:
+            self.ready.set()
+            if sweeper is not None:
+                sweeper.cancel()
+            for server in servers:
+                server.close()
+            for writer in list(self.probe_writers):
+                writer.close()
+            for server in servers:
+                await server.wait_closed()
+
+    async def close_idle_probes(self):
+        """ Cut off probe connections that sent nothing for the idle timeout. """
+        while True:
+            await asyncio.sleep(self.idle.check_seconds)
+            for writer in self.idle.expired():
+                self.limits.connection_timed_out()
+                writer.transport.abort()
+
+    async def handle_probes(self, reader, writer):
+        """ Answer probe lines until the client closes the connection. """
+        address = writer.get_extra_info("peername")
+        refused = self.limits.admit(address)
+        if refused is not None:
+            if self.verbose:
+                print("... refused probes:", refused)
+            writer.transport.abort()
+            return
+        self.probe_writers.add(writer)
+        try:
+            while True:
+                if self.idle is not None:
+                    self.idle.touch(writer)
+                line = await reader.readline()
+                received = time_ns()
+                if not line.endswith(b"\n"):
+                    break
+                self.probes += 1
+                writer.write(b"%s %d %d\n" % (line.rstrip(), received, time_ns()))
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than MAX_PROBE_LINE.
+            pass
+        finally:
+            self.probe_writers.discard(writer)
+            if self.idle is not None:
+                self.idle.forget(writer)
+            self.limits.release(address)
+            writer.close()
+
+    def quit(self):
+        """The server is signaled to shut down.  No client has to connect."""
+        self.done = True
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.stopped.set)
+            except RuntimeError:
+                # The loop already finished.
+                pass
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Day and time server (asyncio)")
+    parser.add_argument("--port", type=int, default=PORT, help="port to send the time on")
+    parser.add_argument("--probe-port", type=int, default=PROBE_PORT,
+                        help="port for clock skew probes, 0 for any free port")
+    parser.add_argument("--no-probes", action="store_true", help="don't answer probes")
+    parser.add_argument("--format", choices=sorted(TIME_FORMATS), default="ctime",
+                        help="ctime (classic) or a high resolution format")
+    parser.add_argument("--quiet", action="store_true", help="don't print every connection")
+    add_arguments(parser, IDLE_SECONDS)
+    return parser.parse_args()
+
+def main():
+    """Starts the server thread and waits for the user to
+    signal to quit."""
+    args = parse_arguments()
+    probe_address = None if args.no_probes else (HOST, args.probe_port)
+    server = AsyncTimeServer((HOST, args.port), probe_address, args.format, not args.quiet,
+                             limits_from_arguments(args))
+    server.start()
+    server.ready.wait()
+    if server.is_alive():
+        input("Press enter to shut the server down.\n")
+        server.quit()
+        server.join()
+    print(server.limits.report())
+    print("Server shutting down.")
+
+if __name__ == "__main__":
+    main()
@@ -9,14 +9,24 @@ from codecs import decode
 
 class TimeClientHandler(Thread):
     """Handles a client request."""
-    def __init__(self, client):
+    def __init__(self, client, done=None):
+        """done is called with no arguments once the
+        connection is closed."""
         Thread.__init__(self)
         self.client = client
+        self.done = done
    
     def run(self):
-        self.client.send(bytes(ctime() + \
-                               "\nHave a nice day!",
-                               "ascii"))
-        self.client.close()
+        try:
+            self.client.send(bytes(ctime() + \
+                                   "\nHave a nice day!",
+                                   "ascii"))
+        except OSError:
+            # Timed out or the client already hung up.
+            pass
+        finally:
+            self.client.close()
+            if self.done is not None:
+                self.done()
 
 
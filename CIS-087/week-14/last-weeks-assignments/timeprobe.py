@@ -0,0 +1,86 @@
+"""
+File: timeprobe.py
+
+Client for estimating how far this computer's clock is from the time
+server's.  Sends probes to asynctimeserver.py's probe port.  For each
+probe, t0 is when it was sent and t3 when the answer arrived (both on this
+clock).  t1 and t2 are when the server read the probe and wrote the answer
+(on its clock).  Then, as in NTP:
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2     server clock - this clock
+    delay  = (t3 - t0) - (t2 - t1)           time spent on the network
+
+The probe with the smallest delay gives the best offset.  In batch mode
+every probe is sent at once, one round trip for all of them.
+
+    python timeprobe.py --count 20
+    python timeprobe.py --count 100 --batch
+"""
+
+import argparse
+from socket import *
+from statistics import median
+from time import time_ns
+
+from asynctimeserver import HOST, PROBE_PORT
+
+PROBES = 10
+
+def read_answer(server_reader):
+    """
+    :return: (t0, t1, t2, t3) for the next answer from the server
+    """
+    line = server_reader.readline()
+    t3 = time_ns()
+    if not line.endswith(b"\n"):
+        raise ConnectionError("Server closed the connection")
+    t0, t1, t2 = (int(value) for value in line.split())
+    return t0, t1, t2, t3
+
+def probe(address, count=PROBES, batch=False):
+    """
+    Probe the server's clock.
+    param address: (host, port) of the probe port
+    param count: number of probes
+    param batch: send every probe before reading any answer
+    return: list of (offset ns, delay ns), one per probe
+    """
+    server = create_connection(address)
+    server_reader = server.makefile("rb")
+    try:
+        if batch:
+            server.sendall(b"".join(b"%d\n" % time_ns() for _ in range(count)))
+            times = [read_answer(server_reader) for _ in range(count)]
+        else:
+            times = []
+            for _ in range(count):
+                server.sendall(b"%d\n" % time_ns())
+                times.append(read_answer(server_reader))
+    finally:
+        server_reader.close()
+        server.close()
+    return [(((t1 - t0) + (t2 - t3)) / 2, (t3 - t0) - (t2 - t1))
+            for t0, t1, t2, t3 in times]
+
+def main():
+    parser = argparse.ArgumentParser(description="Clock skew probe client")
+    parser.add_argument("--host", default=HOST, help="time server host")
+    parser.add_argument("--port", type=int, default=PROBE_PORT, help="probe port")
+    parser.add_argument("--count", type=int, default=PROBES, help="number of probes")
+    parser.add_argument("--batch", action="store_true",
+                        help="send every probe in one write")
+    args = parser.parse_args()
+    try:
+        samples = probe((args.host, args.port), args.count, args.batch)
+    except ConnectionRefusedError:
+        print("Error connecting to the server.")
+        return
+    best_offset, best_delay = min(samples, key=lambda sample: sample[1])
+    print("%d probes%s" % (len(samples), " (batch)" if args.batch else ""))
+    print("offset (server - local): best %.3f ms, median %.3f ms"
+          % (best_offset / 1e6, median(offset for offset, _ in samples) / 1e6))
+    print("delay: best %.3f ms, median %.3f ms"
+          % (best_delay / 1e6, median(delay for _, delay in samples) / 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -5,37 +5,59 @@ Project 10.3
 Server for providing the day and time.
 Allows the server to be shut down gracefully.
 Uses a thread for the server and waits for user
-input to shut down.
+input to shut down.  servercore.ServerLimits caps the
+connections and how often an address may connect, and
+times out clients that don't take the time.
 """
 
+import argparse
+from functools import partial
 from socket import *
 from timeclienthandler import TimeClientHandler
 from threading import Thread
 
+from servercore import ServerLimits, add_arguments, limits_from_arguments
+
+HOST = 'localhost'
+PORT = 5000
+ADDRESS = (HOST, PORT)
+# The time is sent straight away, so a client has no reason to be
+# connected for long.
+IDLE_SECONDS = 10.0
+
 class TimeServer(Thread):
     """Server for the day and time."""
     
-    def __init__(self):
-        """Includes Boolean flag to shut down."""
+    def __init__(self, address=ADDRESS, backlog=5, limits=None):
+        """Includes Boolean flag to shut down.  limits is a
+        ServerLimits, one with IDLE_SECONDS when None."""
         Thread.__init__(self)
         self.done = False
+        self.address = address
+        self.backlog = backlog
+        if limits is None:
+            limits = ServerLimits(IDLE_SECONDS)
+        self.limits = limits
 
     def run(self):
         """Runs until signaled to shut down.  At least
         one client must connect after the signal is sent."""
-        HOST = 'localhost'
-        PORT = 5000
-        ADDRESS = (HOST, PORT)
-
         server = socket(AF_INET, SOCK_STREAM)
-        server.bind(ADDRESS)
-        server.listen(5)
+        server.bind(self.address)
+        server.listen(self.backlog)
 
         while not self.done:
             print('Waiting for connection . . .')
             client, address = server.accept()
             print('... connected from:', address)
-            handler = TimeClientHandler(client)
+            refused = self.limits.admit(address)
+            if refused is not None:
+                print('... refused:', refused)
+                client.close()
+                continue
+            self.limits.set_timeout(client)
+            handler = TimeClientHandler(client,
+                                        partial(self.limits.release, address))
             handler.start()
 
     def quit(self):
@@ -45,7 +67,11 @@ class TimeServer(Thread):
 def main():
     """Starts the server thread and waits for the user to
     signal to quit."""
-    server = TimeServer()
+    parser = argparse.ArgumentParser(description="Day and time server")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    add_arguments(parser, IDLE_SECONDS)
+    args = parser.parse_args()
+    server = TimeServer((HOST, args.port), limits=limits_from_arguments(args))
     server.start()
     input("Press enter to shut the server down.\n")
     server.quit()
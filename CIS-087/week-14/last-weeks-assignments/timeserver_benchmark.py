@@ -0,0 +1,169 @@
+"""
+File: timeserver_benchmark.py
+
+Connections per second served by the threaded TimeServer (a
+TimeClientHandler thread per client) and by AsyncTimeServer (one event
+loop).  Both servers run in this process on free ports and send the
+classic ctime greeting.  Client threads each open connections one after
+another, read the time until the server closes the connection and
+record how long that took.
+
+TimeServer listens with a backlog of 5.  With more clients than that
+the kernel drops connections and clients retry a second later, which
+swamps everything else, so it is also measured with AsyncTimeServer's
+backlog to show the cost of the threads alone.
+
+    python timeserver_benchmark.py
+    python timeserver_benchmark.py --clients 50 --connections 400
+"""
+
+import argparse
+import contextlib
+import os
+import time
+from socket import *
+from threading import Thread
+
+from asynctimeserver import BACKLOG, HOST, AsyncTimeServer
+from timeserver import TimeServer
+
+BUFSIZE = 1024
+STARTUP_SECONDS = 10
+# A connection the server never answers counts as an error after this long.
+TIMEOUT_SECONDS = 5
+
+def free_address():
+    """ :return: (host, port) nothing is listening on """
+    probe = socket(AF_INET, SOCK_STREAM)
+    probe.bind((HOST, 0))
+    address = probe.getsockname()[:2]
+    probe.close()
+    return address
+
+def get_time(address):
+    """ Connect, read everything the server sends and close. """
+    server = create_connection(address, TIMEOUT_SECONDS)
+    try:
+        data = b""
+        while True:
+            chunk = server.recv(BUFSIZE)
+            if chunk == b"":
+                return data
+            data += chunk
+    finally:
+        server.close()
+
+def wait_until_listening(address):
+    deadline = time.monotonic() + STARTUP_SECONDS
+    while True:
+        try:
+            return get_time(address)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+class TimeClient(Thread):
+    """ Opens connection after connection, timing each one. """
+    def __init__(self, address, connections):
+        Thread.__init__(self)
+        self.address = address
+        self.connections = connections
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        for _ in range(self.connections):
+            start = time.perf_counter()
+            try:
+                if get_time(self.address) == b"":
+                    raise ConnectionError("no time sent")
+            except OSError:
+                self.errors += 1
+                continue
+            self.latencies.append(time.perf_counter() - start)
+
+def start_threaded(backlog):
+    """ :return: (address, function that stops the server) """
+    server = TimeServer(free_address(), backlog)
+    server.daemon = True
+    server.start()
+    wait_until_listening(server.address)
+
+    def stop():
+        # TimeServer only sees quit when the next client connects.
+        server.quit()
+        try:
+            get_time(server.address)
+        except OSError:
+            pass
+        server.join(STARTUP_SECONDS)
+    return server.address, stop
+
+def start_async(backlog):
+    """ :return: (address, function that stops the server) """
+    server = AsyncTimeServer((HOST, 0), None)
+    server.start()
+    server.ready.wait(STARTUP_SECONDS)
+    wait_until_listening(server.address)
+
+    def stop():
+        server.quit()
+        server.join()
+    return server.address, stop
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+def measure(start_server, backlog, clients, connections):
+    """
+    :return: (connections served per second, sorted latencies, errors)
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # Both servers print every connection; that is part of their cost.
+        address, stop = start_server(backlog)
+        threads = [TimeClient(address, connections) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stop()
+    latencies = sorted(lat for thread in threads for lat in thread.latencies)
+    errors = sum(thread.errors for thread in threads)
+    return len(latencies) / elapsed, latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Threaded vs asyncio time server")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--connections", type=int, default=100,
+                        help="connections opened by each client")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="runs of each server; the best is reported")
+    args = parser.parse_args()
+
+    print("%d clients x %d connections, best of %d"
+          % (args.clients, args.connections, args.rounds))
+    print("%-22s %10s %10s %10s %10s %7s"
+          % ("server", "conn/sec", "p50 ms", "p99 ms", "max ms", "errors"))
+    rates = []
+    for name, start_server, backlog in (("threaded", start_threaded, 5),
+                                        ("threaded", start_threaded, BACKLOG),
+                                        ("async", start_async, BACKLOG)):
+        rate, latencies, errors = max((measure(start_server, backlog, args.clients,
+                                               args.connections)
+                                       for _ in range(args.rounds)),
+                                      key=lambda result: result[0])
+        rates.append(rate)
+        print("%-22s %10.0f %10.3f %10.3f %10.3f %7d"
+              % ("%s (backlog %d)" % (name, backlog), rate,
+                 percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+                 (latencies[-1] if latencies else 0.0) * 1000, errors))
+    print("async / threaded: %.2fx (backlog 5), %.2fx (backlog %d)"
+          % (rates[2] / rates[0], rates[2] / rates[1], BACKLOG))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 22, 2022
+Purpose: Microbenchmark of the CPU time respond_to spends per request with and
+         without the cache of encoded responses.  Uses the synthetic league
+         from benchmark_season_lookup and a hot set of requests, the way
+         clients keep asking for the same popular seasons.
+
+         python benchmark_response_cache.py
+"""
+
+import random
+import time
+import timeit
+
+from benchmark_season_lookup import FIRST_YEAR, NUMBER_OF_SEASONS, build_synthetic_cache
+from framing import encode_message
+from request import BatchRequest, Request, season_name
+from request_handler import respond_to
+from response_cache import EncodedResponseCache
+from season_index import SeasonIndex
+
+REQUESTS = 20000
+HOT_REQUESTS = 500
+
+def build_lines(cache, make_request):
+    """
+    :param cache: data cache the requests are for
+    :param make_request: function(team, first season) returning a request
+    :return: REQUESTS encoded request lines drawn from HOT_REQUESTS distinct ones
+    """
+    teams = list(cache.keys())
+    hot = [encode_message(str(make_request(random.choice(teams),
+                                           random.randrange(NUMBER_OF_SEASONS - 10))) + "\n")
+           for _ in range(HOT_REQUESTS)]
+    return [random.choice(hot) for _ in range(REQUESTS)]
+
+def single_season(team, offset):
+    return Request(team, season_name(FIRST_YEAR + offset))
+
+def ten_seasons(team, offset):
+    return BatchRequest.for_range(team, season_name(FIRST_YEAR + offset),
+                                  season_name(FIRST_YEAR + offset + 9))
+
+def cpu_per_request(lines, index, response_cache):
+    """ :return: CPU seconds respond_to takes per line (best of 5 runs) """
+    def run():
+        for line in lines:
+            respond_to(line, index, None, response_cache)
+    best = min(timeit.repeat(run, number=1, repeat=5, timer=time.process_time))
+    return best / len(lines)
+
+def main():
+    cache = build_synthetic_cache()
+    index = SeasonIndex(cache)
+    print("%d requests (%d distinct), CPU time per request" % (REQUESTS, HOT_REQUESTS))
+    print("%-16s %12s %12s %10s" % ("request", "uncached us", "cached us", "saved"))
+    for name, make_request in (("single season", single_season),
+                               ("batch of 10", ten_seasons)):
+        lines = build_lines(cache, make_request)
+        response_cache = EncodedResponseCache()
+
+        # Both paths must send the same bytes before timing them.
+        for line in lines[:100]:
+            assert respond_to(line, index, None, response_cache) == respond_to(line, index)
+
+        uncached = cpu_per_request(lines, index, None)
+        cached = cpu_per_request(lines, index, response_cache)
+        print("%-16s %12.2f %12.2f %9.0f%%" % (name, uncached * 1e6, cached * 1e6,
+                                                (uncached - cached) / uncached * 100))
+
+if __name__ == "__main__":
+    main()
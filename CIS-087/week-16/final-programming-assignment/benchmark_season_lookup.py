@@ -0,0 +1,86 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 12, 2022
+Purpose: Microbenchmark comparing the original linear scan of a team's seasons
+         with the (team, season) index.  Uses a synthetic league of 30 teams
+         with 80 seasons each.
+
+         python benchmark_season_lookup.py
+"""
+
+import random
+import timeit
+
+from request import Request
+from season_data import SeasonData
+from season_index import SeasonIndex
+
+NUMBER_OF_TEAMS = 30
+NUMBER_OF_SEASONS = 80
+FIRST_YEAR = 1943
+LOOKUPS = 10000
+
+def season_name(year):
+    """ :return: season in the format 1980-81 for the season starting in year """
+    return "%d-%02d" % (year, (year + 1) % 100)
+
+def build_synthetic_cache(teams=NUMBER_OF_TEAMS, seasons=NUMBER_OF_SEASONS):
+    """
+    Build a data cache in the same shape load_data builds.
+    :param teams: number of teams to create
+    :param seasons: number of seasons per team
+    :return: dictionary of team name -> list of SeasonData
+    """
+    cache = {}
+    for t in range(teams):
+        team = "Team%02d" % t
+        team_data = []
+        for yr in range(FIRST_YEAR, FIRST_YEAR + seasons):
+            wins = random.randint(10, 72)
+            losses = 82 - wins
+            line = "%s,NBA,City %s,%d,%d,%.3f,,Coach %d (%d-%d),Player %d\n" \
+                   % (season_name(yr), team, wins, losses, wins / 82,
+                      yr % 17, wins, losses, yr % 41)
+            team_data.append(SeasonData(line))
+        cache[team] = team_data
+    return cache
+
+def linear_scan(cache, req):
+    """ The lookup RequestHandler.process used before the index existed. """
+    try:
+        team_data = cache[req.team]
+        matches = (x for x in team_data if req==x)
+        return next(matches)
+    except:
+        return None
+
+def main():
+    cache = build_synthetic_cache()
+    index = SeasonIndex(cache)
+    teams = list(cache.keys())
+    years = [season_name(yr) for yr in range(FIRST_YEAR, FIRST_YEAR + NUMBER_OF_SEASONS)]
+    requests = [Request(random.choice(teams), random.choice(years))
+                for _ in range(LOOKUPS)]
+
+    def run_scan():
+        for req in requests:
+            linear_scan(cache, req)
+
+    def run_index():
+        for req in requests:
+            index.lookup(req.team, req.year)
+
+    # Both approaches must agree before timing them.
+    for req in requests[:100]:
+        assert linear_scan(cache, req) is index.lookup(req.team, req.year)
+
+    scan_time = min(timeit.repeat(run_scan, number=1, repeat=5))
+    index_time = min(timeit.repeat(run_index, number=1, repeat=5))
+
+    print("%d teams x %d seasons, %d lookups" % (NUMBER_OF_TEAMS, NUMBER_OF_SEASONS, LOOKUPS))
+    print("linear scan: %8.2f us/lookup" % (scan_time / LOOKUPS * 1e6))
+    print("index:       %8.2f us/lookup" % (index_time / LOOKUPS * 1e6))
+    print("speedup:     %8.1fx" % (scan_time / index_time))
+
+if __name__ == "__main__":
+    main()
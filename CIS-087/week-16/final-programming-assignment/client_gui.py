@@ -8,16 +8,11 @@ Purpose: Show the gui used by the client.  It accepts a team and a season.
 """
 
 import datetime
+import queue
 
 from breezypythongui import EasyFrame
-from codecs import decode
-from socket import *
 
-from nba_record_server import ADDRESS
-from request import Request
-from response import build_response_from_message
-
-BUFSIZE = 1024
+from nba_record_client import NbaRecordClient, ServerBusyError
 
 FROM_YEAR=1947
 today=datetime.date.today()
@@ -47,35 +42,15 @@ def build_year_list(start_year, end_year):
 
 SEASONS=build_year_list(FROM_YEAR, TO_YEAR)
 
-def establish_connection_to_server():
-    """
-    Connect to the lookup server.
-    return: the socket to communite with.
-    """
-    server_socket = socket(AF_INET, SOCK_STREAM)               # Create a socket
-    server_socket.connect(ADDRESS)                             # Connect it to a host
-    return server_socket
-
-def send_request(server_socket, request):
-    """
-    Send the request to the server for a given team and year.
-    param server_socket: communication channel
-    param request: request object (contains team and year info)
-    """
-    text_response = str(request) + "\n"
-    server_socket.send(bytes(text_response,"ascii"))
-
-def get_response( server_socket ):
-    """
-    Get the server's response and store it into a season data object.
-    param server_socket: Communication channel
-    return: Information from the server.
-    """
-    server_response = decode(server_socket.recv(BUFSIZE), "ascii").split("\n")
-    season_data = build_response_from_message(server_response[0]+"\n")
-    return season_data
+# How often (ms) the gui checks for answers from the background lookups.
+POLL_MILLISECONDS = 50
 
+# Shown until the server sends the teams it has.  The combo box needs at
+# least one entry.
+DEFAULT_TEAMS = ["Lakers","Pelicans"]
 
+# Keys that move around the combo box rather than change the team typed.
+NAVIGATION_KEYS = ("Up", "Down", "Left", "Right", "Return", "Tab", "Escape")
 
 class NbaRecordClientGui(EasyFrame):
     """
@@ -133,7 +108,7 @@ class NbaRecordClientGui(EasyFrame):
                       column=0,
                       sticky="NW"
                       )
-        team_list = ["Lakers","Pelicans"]
+        team_list = DEFAULT_TEAMS
         self.team = self.addCombobox \
             (row = 0,
              column = 1,
@@ -141,6 +116,12 @@ class NbaRecordClientGui(EasyFrame):
              text=""
              )
         self.team.set(team_list[0])
+        # Offer the teams matching what has been typed so far.
+        self.team.bind("<KeyRelease>", self.suggest_teams)
+        # Suggest requests are numbered so a slow answer can't replace the
+        # answer to a later one.
+        self.suggestions_sent = 0
+        self.suggestion_shown = 0
 
         self.addLabel(text="",
                       row=0,
@@ -171,6 +152,16 @@ class NbaRecordClientGui(EasyFrame):
 
         self.result_fields = self.add_result_fields(RESULT_FIELDS,3)
 
+        # Pooled connections and cached answers.  Lookups run on the client's
+        # threads and their results come back through the queue.
+        self.client = NbaRecordClient()
+        self.results = queue.Queue()
+        self.after(POLL_MILLISECONDS, self.poll_results)
+
+        # Fill the team list from the server.
+        self.in_background(self.client.suggest_async(""),
+                           lambda future: self.show_teams(future, 0))
+
     def fill_results(self, season_data):
         """
         Given the data, fill in the page.
@@ -186,24 +177,99 @@ class NbaRecordClientGui(EasyFrame):
         self.result_fields[7].setValue( season_data.coach_name )
         self.result_fields[8].setValue( season_data.best_player )
 
+    def in_background(self, future, show):
+        """
+        Have the gui thread call show(future) once a background request is done.
+        :param future: request running on one of the client's threads
+        :param show: method to call with the finished future
+        """
+        future.add_done_callback(lambda f: self.results.put((show, f)))
+
+    def show_teams(self, future, serial):
+        """
+        Put the team names sent by the server in the team combo box.
+        :param future: the finished suggest request
+        :param serial: which request it was.  Answers to requests older than
+                       the last one shown are dropped.
+        """
+        if serial < self.suggestion_shown:
+            return
+        self.suggestion_shown = serial
+        try:
+            teams = future.result()
+        except OSError:
+            # Keep the list already shown.  Lookups will report the problem.
+            return
+        if len(teams) > 0:
+            self.team["values"] = teams
+
+    def show_result(self, future):
+        """
+        Show the outcome of a background lookup.  Runs on the gui thread.
+        :param future: the finished lookup
+        """
+        try:
+            season_data = future.result()
+        except ServerBusyError:
+            self.messageBox(title="Server Busy",
+                            message="The server is busy.  Please try again.")
+            return
+        except OSError as err:
+            self.messageBox(title="Server Unavailable",
+                            message="Could not reach the server: %s" % err)
+            return
+        self.fill_results( season_data )
+
+    def poll_results(self):
+        """
+        Show any lookups the background threads have finished.  Tk widgets can
+        only be touched from the gui thread, so the threads hand their results
+        over through a queue and this method picks them up from the event loop.
+        """
+        while True:
+            try:
+                show, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            show( future )
+        self.after(POLL_MILLISECONDS, self.poll_results)
+
     # Methods to handle user events.
     def lookup_info(self):
         """
-        Read the year and team from the form, send a request to the information
-        server, wait for the response, and then populate the results form with
-        the supplied data.
+        Read the year and team from the form and look the season up.  A season
+        in the client's cache is shown right away.  Otherwise the request is
+        sent to the information server on a background thread so the window
+        stays responsive, and the results form is populated once it answers.
         """
-        request = Request(self.team.getText(),self.season.getText())
-        socket = establish_connection_to_server()
-        send_request( socket, request )
-        season_data = get_response( socket )
+        team = self.team.getText()
+        year = self.season.getText()
+        season_data = self.client.cached_season(team, year)
+        if season_data is not None:
+            self.fill_results( season_data )
+            return
+        self.in_background(self.client.lookup_async(team, year), self.show_result)
 
-        self.fill_results( season_data )
-        socket.close()
+    def suggest_teams(self, event):
+        """
+        Ask the server for teams matching the text in the team combo box.
+        Any name it knows works for a lookup (LA Lakers, lakers ...).
+        :param event: key release in the team combo box
+        """
+        if event.keysym in NAVIGATION_KEYS:
+            return
+        self.suggestions_sent += 1
+        serial = self.suggestions_sent
+        self.in_background(self.client.suggest_async(self.team.getText()),
+                           lambda future: self.show_teams(future, serial))
 
 def main():
     """ Instantiate window and start gui loop. """
-    NbaRecordClientGui().mainloop()
+    gui = NbaRecordClientGui()
+    try:
+        gui.mainloop()
+    finally:
+        gui.client.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
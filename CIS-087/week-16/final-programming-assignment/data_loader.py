@@ -0,0 +1,94 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 15, 2022
+Purpose: Read the team files in the data directory.  Rows are streamed from
+         the csv module one at a time and large directories are parsed by a
+         pool of processes.  Every file gets a report of the problems found
+         in it instead of being silently skipped.
+"""
+
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from season_data import SEASON_FIELDS, build_season_from_row, is_season
+
+# Processes used to parse the data directory, and the fewest files worth
+# starting them for (a process pool costs more than it saves on a few files).
+LOAD_WORKERS = os.cpu_count() or 1
+PARALLEL_LOAD_MIN_FILES = 16
+
+def team_from_filename(filename: str):
+    """
+    Record data is stored in the data directory in the format <team name>.csv
+    :param filename: Name of file found in data directory.
+    :return: name of the team (as used in dictionary)
+    """
+    dot_idx = filename.index(".")
+    teamname = filename[0:dot_idx].lower().capitalize()
+    return teamname
+
+def read_team_file(filename: str):
+    """
+    Read all seasons of a team from its file in the data directory.  Rows
+    that can't be used are reported and skipped; the rest of the file is kept.
+    :param filename: Name of file found in data directory.
+    :return: (name of the team, list of SeasonData for every season,
+              list of error messages for rows that were skipped)
+    """
+    # Get team's name from the filename
+    if "." not in filename:
+        raise ValueError("file name is not in the format <team name>.csv")
+    teamname = team_from_filename(filename)
+
+    team_data = []
+    errors = []
+    with open(filename, "r", newline="", encoding="utf-8") as f:
+        rows = csv.reader(f)
+        # Skip first line (header info)
+        if next(rows, None) is None:
+            raise ValueError("file is empty")
+
+        for row in rows:
+            if len(row) == 0:
+                continue
+            if len(row) != len(SEASON_FIELDS):
+                errors.append("line %d: expected %d fields, found %d"
+                              % (rows.line_num, len(SEASON_FIELDS), len(row)))
+                continue
+            # The index sorts seasons by the year they started in.
+            if not is_season(row[0]):
+                errors.append("line %d: season is not in the format 1980-81: %s"
+                              % (rows.line_num, row[0]))
+                continue
+            team_data.append( build_season_from_row(row) )
+
+    return teamname, team_data, errors
+
+def load_team_file(filename: str):
+    """
+    Read a team file and report on it.  Never raises so it can be mapped over
+    a whole directory by a process pool.
+    :param filename: Name of file found in data directory.
+    :return: (filename, name of the team or None, list of SeasonData or None
+              if the file couldn't be used, list of error messages)
+    """
+    try:
+        teamname, team_data, errors = read_team_file(filename)
+        return filename, teamname, team_data, errors
+    except (OSError, ValueError, csv.Error) as e:
+        return filename, None, None, [str(e)]
+
+def load_team_files(filenames, workers=LOAD_WORKERS):
+    """
+    Read many team files, in parallel when there are enough of them.
+    :param filenames: Names of files found in data directory.
+    :param workers: most processes to use.  1 reads the files in this process.
+    :return: list of results from load_team_file, one per file
+    """
+    if workers <= 1 or len(filenames) < PARALLEL_LOAD_MIN_FILES:
+        return [load_team_file(name) for name in filenames]
+
+    chunksize = max(1, len(filenames) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load_team_file, filenames, chunksize=chunksize))
@@ -0,0 +1,96 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 18, 2022
+Purpose: Message framing shared by the server and the client.  Every message
+         is one line of text ending in a newline.  LineReader receives
+         straight into one reusable buffer (recv_into through a memoryview)
+         and hands back whole lines no matter how the bytes were split across
+         reads, so a message of any size (up to MAX_LINE_LENGTH) arrives
+         intact.
+"""
+
+BUFSIZE = 4096
+MAX_LINE_LENGTH = 1024 * 1024
+ENCODING = "utf-8"
+NEWLINE = b"\n"
+
+class FramingError(ValueError):
+    """ A line longer than the reader allows was received. """
+
+def encode_message(text: str):
+    """ :return: the text as bytes ready to send """
+    return bytes(text, ENCODING)
+
+def decode_message(line: bytes):
+    """
+    :return: a received line as text.  Bytes that aren't valid text are
+             replaced so the line is rejected as a malformed request instead
+             of breaking the connection.
+    """
+    return str(line, ENCODING, "replace")
+
+class LineReader:
+    """
+    Buffered newline reader on top of a socket.  Bytes between start and end
+    of the buffer have been received but not yet returned as a line.
+    """
+    def __init__(self, sock, bufsize=BUFSIZE, max_line_length=MAX_LINE_LENGTH):
+        """
+        :param sock: connected socket to read from
+        :param bufsize: starting size of the buffer (it grows for long lines)
+        :param max_line_length: longest line accepted before FramingError
+        """
+        self.sock = sock
+        self.max_line_length = max_line_length
+        self.buffer = bytearray(bufsize)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def has_line(self):
+        """ :return: True if a whole line is already buffered """
+        return self.buffer.find(NEWLINE, self.start, self.end) >= 0
+
+    def readline(self):
+        """
+        Read the next line, receiving more data as needed.
+        :return: the line including its newline, or b"" once the peer has
+                 closed the connection (a partial last line is dropped).
+        """
+        while True:
+            newline = self.buffer.find(NEWLINE, self.start, self.end)
+            if newline >= 0:
+                line = bytes(self.view[self.start:newline + 1])
+                self.start = newline + 1
+                if self.start == self.end:
+                    self.start = self.end = 0
+                return line
+            if self.fill() == 0:
+                return b""
+
+    def fill(self):
+        """
+        Receive whatever is available into the free end of the buffer, making
+        room first by moving unread bytes to the front or growing the buffer.
+        :return: number of bytes received (0 when the peer closed)
+        """
+        if self.end == len(self.buffer):
+            pending = self.end - self.start
+            if self.start > 0:
+                self.buffer[:pending] = self.view[self.start:self.end]
+                self.start, self.end = 0, pending
+            else:
+                if pending >= self.max_line_length:
+                    raise FramingError("line longer than %d bytes" % self.max_line_length)
+                # The view has to be released before the bytearray can grow.
+                self.view.release()
+                self.buffer.extend(bytes(min(len(self.buffer), self.max_line_length)))
+                self.view = memoryview(self.buffer)
+
+        received = self.sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def close(self):
+        """ Release the buffer (the socket is left to its owner). """
+        self.view.release()
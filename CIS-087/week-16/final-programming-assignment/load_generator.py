@@ -0,0 +1,143 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 12, 2022
+Purpose: Load generator for the NBA record server.  Starts the server in each
+         mode (threaded, asyncio and prefork) on its own port, drives it with
+         many concurrent clients and prints requests per second and p50/p99
+         latency for the modes side by side.
+
+         python load_generator.py --clients 200 --requests 20
+         python load_generator.py --keep-alive
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from socket import create_connection
+
+from framing import encode_message
+from nba_record_server import HOST, SERVER_MODES
+from request import Request, SINGLE_REQUEST_VERSION, KEEP_ALIVE_VERSION
+
+FIRST_PORT = 33123
+STARTUP_TIMEOUT_SECONDS = 10
+TEAM = "Lakers"
+SEASONS = ["%d-%02d" % (yr, (yr + 1) % 100) for yr in range(1960, 2022)]
+
+def percentile(sorted_values, fraction):
+    """
+    :param sorted_values: values in ascending order
+    :param fraction: 0.5 for the median, 0.99 for p99 ...
+    :return: value at the given percentile
+    """
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+def start_server(mode, port):
+    """
+    Start the server in a child process and wait until it accepts connections.
+    :return: the child process
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen([sys.executable, "nba_record_server.py",
+                               "--mode", mode, "--port", str(port)],
+                              cwd=here,
+                              stdin=subprocess.PIPE,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            create_connection((HOST, port)).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("%s server did not start on port %d" % (mode, port))
+
+async def run_client(port, request_count, keep_alive, latencies):
+    """
+    One simulated client.  With keep-alive every request goes over one
+    connection, otherwise each request opens a new connection (version 1).
+    :param latencies: list each request's latency (seconds) is appended to
+    """
+    reader = writer = None
+    version = KEEP_ALIVE_VERSION if keep_alive else SINGLE_REQUEST_VERSION
+    for _ in range(request_count):
+        request = Request(TEAM, random.choice(SEASONS), version)
+        start = time.perf_counter()
+        if writer is None:
+            reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(encode_message(str(request) + "\n"))
+        await reader.readline()
+        latencies.append(time.perf_counter() - start)
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+async def drive(port, clients, request_count, keep_alive):
+    """
+    Run all of the clients at once.
+    :return: (sorted latencies, elapsed seconds)
+    """
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(port, request_count, keep_alive, latencies)
+                           for _ in range(clients)))
+    return sorted(latencies), time.perf_counter() - start
+
+def measure(mode, port, args):
+    """ Start a server in the given mode, load it and return its results. """
+    server = start_server(mode, port)
+    try:
+        latencies, elapsed = asyncio.run(drive(port, args.clients,
+                                               args.requests, args.keep_alive))
+    finally:
+        # SIGTERM so a prefork server stops its worker processes too.
+        server.terminate()
+        try:
+            server.wait(STARTUP_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+    return {"mode": mode,
+            "requests": len(latencies),
+            "rps": len(latencies) / elapsed,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000}
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="NBA record server load generator")
+    parser.add_argument("--clients", type=int, default=100,
+                        help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=20,
+                        help="requests sent by each client")
+    parser.add_argument("--keep-alive", action="store_true",
+                        help="send every request of a client over one connection")
+    parser.add_argument("--modes", nargs="+", choices=SERVER_MODES,
+                        default=SERVER_MODES, help="server modes to compare")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    results = []
+    for offset, mode in enumerate(args.modes):
+        results.append(measure(mode, FIRST_PORT + offset, args))
+
+    print("%d clients x %d requests (%s)" % (args.clients, args.requests,
+          "keep-alive" if args.keep_alive else "connection per request"))
+    print("%-10s %10s %12s %10s %10s" % ("mode", "requests", "req/sec",
+                                          "p50 ms", "p99 ms"))
+    for r in results:
+        print("%-10s %10d %12.1f %10.2f %10.2f" % (r["mode"], r["requests"],
+              r["rps"], r["p50"], r["p99"]))
+
+if __name__ == "__main__":
+    main()
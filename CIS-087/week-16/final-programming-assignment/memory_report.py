@@ -0,0 +1,98 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 14, 2022
+Purpose: Report how many bytes each season costs in memory (using tracemalloc)
+         for a 100,000 season synthetic league history stored three ways:
+             - SeasonData the way it was (a __dict__ per season)
+             - SeasonData with __slots__
+             - a columnar TeamTable per team
+
+         python memory_report.py
+"""
+
+import random
+import tracemalloc
+
+from response import Response
+from season_data import SeasonData
+from team_table import TeamTable
+
+NUMBER_OF_ROWS = 100000
+SEASONS_PER_TEAM = 80
+FIRST_YEAR = 1943
+LEAGUES = ["NBA", "ABA", "BAA", "NBL"]
+PLAYOFFS = ["", "Won Finals", "Lost Finals", "Lost W. Conf. 1st Rnd.",
+            "Lost E. Conf. Semis"]
+
+class DictSeasonData:
+    """ SeasonData before it used __slots__.  Used as the baseline. """
+    def __init__(self, line_from_csv_file):
+        entries = line_from_csv_file.split(",")
+        entries[8] = entries[8][:-1]
+        self.year = entries[0]
+        self.league_name = entries[1]
+        self.team_name = entries[2]
+        self.wins = entries[3]
+        self.losses = entries[4]
+        self.win_percentage = entries[5]
+        self.playoff_results = entries[6]
+        self.coach_name = entries[7]
+        self.best_player = entries[8]
+
+def synthetic_history(rows=NUMBER_OF_ROWS):
+    """
+    Build csv lines (the way load_data reads them) for a made up league.
+    :return: dictionary of team name -> list of csv lines
+    """
+    history = {}
+    for r in range(rows):
+        team = "Team%04d" % (r // SEASONS_PER_TEAM)
+        yr = FIRST_YEAR + r % SEASONS_PER_TEAM
+        wins = random.randint(10, 72)
+        losses = 82 - wins
+        line = "%d-%02d,%s,City %s,%d,%d,%s,%s,Coach %d (%d-%d),Player %d\n" \
+               % (yr, (yr + 1) % 100, random.choice(LEAGUES), team, wins,
+                  losses, ("%.3f" % (wins / 82))[1:], random.choice(PLAYOFFS),
+                  r % 500, wins, losses, r % 3000)
+        history.setdefault(team, []).append(line)
+    return history
+
+def measure(build, history):
+    """
+    Build the cache with the given function and measure what it keeps.
+    :param build: function taking the csv lines of one team
+    :param history: dictionary of team name -> list of csv lines
+    :return: (bytes per season, the cache that was built)
+    """
+    tracemalloc.start()
+    cache = {team: build(lines) for team, lines in history.items()}
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / NUMBER_OF_ROWS, cache
+
+def main():
+    history = synthetic_history()
+
+    results = [
+        ("__dict__ SeasonData",
+         measure(lambda lines: [DictSeasonData(l) for l in lines], history)),
+        ("__slots__ SeasonData",
+         measure(lambda lines: [SeasonData(l) for l in lines], history)),
+        ("columnar TeamTable",
+         measure(lambda lines: TeamTable(SeasonData(l) for l in lines), history)),
+    ]
+
+    # Every layout must produce the same response text.
+    team = next(iter(history))
+    expected = [str(Response(s)) for s in results[0][1][1][team]]
+    for name, (per_row, cache) in results[1:]:
+        assert [str(Response(s)) for s in cache[team]] == expected, name
+
+    print("%d seasons, %d per team" % (NUMBER_OF_ROWS, SEASONS_PER_TEAM))
+    baseline = results[0][1][0]
+    for name, (per_row, cache) in results:
+        print("%-22s %8.1f bytes/season  (%5.1f%% of __dict__)"
+              % (name, per_row, per_row / baseline * 100))
+
+if __name__ == "__main__":
+    main()
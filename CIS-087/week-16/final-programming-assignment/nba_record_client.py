@@ -0,0 +1,341 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 19, 2022
+Purpose: Client side of the NBA record protocol, shared by the GUI and by
+         scripts.  Keeps a pool of keep-alive connections to the server, an
+         LRU cache of recent season lookups (entries expire after a TTL) and
+         a background thread pool so callers such as the GUI never block on
+         the network.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from socket import *
+from threading import Lock
+from time import monotonic
+
+from framing import LineReader, decode_message, encode_message
+from nba_record_server import ADDRESS
+from request import Request, StatsRequest, SuggestRequest
+from response import batch_size_from_message, build_response_from_message, is_busy_message
+from response import build_stat_from_message, build_totals_from_message, stats_size_from_message
+from response import suggest_size_from_message
+
+POOL_SIZE = 4
+CACHE_SIZE = 1024
+CACHE_TTL_SECONDS = 300.0
+
+class ServerBusyError(ConnectionError):
+    """ The server turned the connection away because it is overloaded. """
+
+def establish_connection_to_server(address=ADDRESS):
+    """
+    Connect to the lookup server.
+    return: the socket to communite with.
+    """
+    server_socket = socket(AF_INET, SOCK_STREAM)               # Create a socket
+    server_socket.connect(address)                             # Connect it to a host
+    return server_socket
+
+def open_reader(server_socket):
+    """
+    Wrap the socket in a buffered reader so each response can be read a line
+    at a time.  Keep-alive connections can have several responses in flight.
+    param server_socket: Communication channel
+    return: LineReader reading from the socket
+    """
+    return LineReader(server_socket)
+
+def send_request(server_socket, request):
+    """
+    Send the request to the server for a given team and year.
+    param server_socket: communication channel
+    param request: request object (contains team and year info)
+    """
+    text_response = str(request) + "\n"
+    server_socket.sendall(encode_message(text_response))
+
+def read_message( server_reader ):
+    """
+    Read one line sent by the server.
+    param server_reader: Reader returned by open_reader
+    return: the line as text
+    """
+    server_response = decode_message(server_reader.readline())
+    if server_response == "":
+        raise ConnectionError("Server closed the connection")
+    if is_busy_message(server_response):
+        raise ServerBusyError("Server is busy, try again later")
+    return server_response
+
+def get_response( server_reader ):
+    """
+    Get the server's response and store it into a season data object.
+    param server_reader: Reader returned by open_reader
+    return: Information from the server.
+    """
+    season_data = build_response_from_message(read_message(server_reader))
+    return season_data
+
+def get_batch_response( server_reader ):
+    """
+    Read the server's answer to a batch request.
+    param server_reader: Reader returned by open_reader
+    return: list of season data, in the order they were requested.
+    """
+    header = read_message(server_reader)
+    count = batch_size_from_message(header)
+    if count is None:
+        raise ConnectionError("Expected a batch response, got: %s" % header.strip())
+    return [get_response(server_reader) for _ in range(count)]
+
+def lookup_season( server_socket, server_reader, request ):
+    """
+    Look up one season.
+    param server_socket: Communication channel
+    param server_reader: Reader returned by open_reader
+    param request: request object (contains team and year info)
+    return: the season data sent by the server.
+    """
+    send_request( server_socket, request )
+    return get_response( server_reader )
+
+def lookup_batch( server_socket, server_reader, batch_request ):
+    """
+    Look up many seasons with one request and one response.
+    param server_socket: Communication channel
+    param server_reader: Reader returned by open_reader
+    param batch_request: BatchRequest listing the (team, season) pairs
+    return: list of season data, in the order they were requested.
+    """
+    send_request( server_socket, batch_request )
+    return get_batch_response( server_reader )
+
+def lookup_totals( server_socket, server_reader, totals_request ):
+    """
+    Ask the server for a team's totals over a range of seasons.
+    param server_socket: Communication channel
+    param server_reader: Reader returned by open_reader
+    param totals_request: AggregateRequest of kind TOTAL
+    return: SeasonTotals (wins, losses, seasons, playoffs, championships)
+    """
+    send_request( server_socket, totals_request )
+    return build_totals_from_message(read_message(server_reader))
+
+def lookup_stats( server_socket, server_reader ):
+    """
+    Ask the server for its metrics.
+    param server_socket: Communication channel
+    param server_reader: Reader returned by open_reader
+    return: list of (name, value) pairs in the order the server sent them
+    """
+    send_request( server_socket, StatsRequest() )
+    header = read_message(server_reader)
+    count = stats_size_from_message(header)
+    if count is None:
+        raise ConnectionError("Expected a stats response, got: %s" % header.strip())
+    return [build_stat_from_message(read_message(server_reader)) for _ in range(count)]
+
+def lookup_suggestions( server_socket, server_reader, text="" ):
+    """
+    Ask the server for team names matching what the user typed.
+    param server_socket: Communication channel
+    param server_reader: Reader returned by open_reader
+    param text: partial or misspelled team name, "" for every team
+    return: list of team names, best match first
+    """
+    send_request( server_socket, SuggestRequest(text) )
+    header = read_message(server_reader)
+    count = suggest_size_from_message(header)
+    if count is None:
+        raise ConnectionError("Expected a suggest response, got: %s" % header.strip())
+    return [read_message(server_reader).strip() for _ in range(count)]
+
+def lookup_seasons( server_socket, server_reader, requests ):
+    """
+    Pipeline several requests over one keep-alive connection.  Every request
+    is sent before any response is read.  The server answers in order.
+    param server_socket: Communication channel
+    param server_reader: Reader returned by open_reader
+    param requests: list of request objects
+    return: list of season data, one per request, in the same order.
+    """
+    message = "".join(str(req) + "\n" for req in requests)
+    server_socket.sendall(encode_message(message))
+    return [get_response(server_reader) for _ in requests]
+
+class Connection:
+    """
+    One keep-alive connection to the server.
+    """
+    def __init__(self, address=ADDRESS):
+        self.server_socket = establish_connection_to_server(address)
+        self.server_reader = open_reader(self.server_socket)
+
+    def close(self):
+        self.server_reader.close()
+        self.server_socket.close()
+
+class ConnectionPool:
+    """
+    Keeps up to max_idle idle connections to the server for reuse.  A
+    connection is taken out of the pool while in use so only one request is
+    on it at a time.
+    """
+    def __init__(self, address=ADDRESS, max_idle=POOL_SIZE):
+        self.address = address
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = Lock()
+
+    def acquire(self):
+        """
+        :return: (connection, True if it came from the pool and may have been
+                 closed by the server while idle)
+        """
+        with self.lock:
+            if len(self.idle) > 0:
+                return self.idle.pop(), True
+        return Connection(self.address), False
+
+    def release(self, connection):
+        """ Return a healthy connection to the pool (or close it if full). """
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def run(self, exchange):
+        """
+        Run a request/response exchange on a pooled connection.  An idle
+        connection the server dropped is replaced by a new one once.  The
+        connection goes back to the pool only if the exchange succeeds.
+        param exchange: function taking (server_socket, server_reader)
+        return: whatever the exchange returns.
+        """
+        while True:
+            connection, reused = self.acquire()
+            finished = False
+            try:
+                result = exchange(connection.server_socket, connection.server_reader)
+                finished = True
+            except ServerBusyError:
+                # The server hung up after saying it is busy.
+                raise
+            except OSError:
+                if reused:
+                    continue
+                raise
+            finally:
+                # After a failed exchange (a bad reply too) nobody knows
+                # where the next response starts: don't reuse it.
+                if finished:
+                    self.release(connection)
+                else:
+                    connection.close()
+            return result
+
+    def close(self):
+        """ Close every idle connection. """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+class ResponseCache:
+    """
+    Least recently used cache of season lookups.  Entries older than the TTL
+    are treated as missing so updated data on the server is picked up.
+    """
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        """ :return: the cached value for the key or None """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """ Cache a value, dropping the least recently used entry if full. """
+        with self.lock:
+            self.entries[key] = (monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class NbaRecordClient:
+    """
+    Client for the NBA record server with pooled connections and a cache of
+    recent lookups.  The *_async methods run on background threads and return
+    a concurrent.futures.Future.
+    """
+    def __init__(self, address=ADDRESS, pool_size=POOL_SIZE,
+                 cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL_SECONDS):
+        self.pool = ConnectionPool(address, pool_size)
+        self.cache = ResponseCache(cache_size, cache_ttl)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size,
+                                           thread_name_prefix="NbaRecordClient")
+
+    def cached_season(self, team, year):
+        """ :return: the season if it is in the cache, otherwise None """
+        return self.cache.get((team, year))
+
+    def lookup(self, team, year):
+        """
+        Look up one season, from the cache when possible.
+        :return: the season data sent by the server
+        """
+        season_data = self.cached_season(team, year)
+        if season_data is None:
+            request = Request(team, year)
+            season_data = self.pool.run(lambda sock, reader:
+                                        lookup_season(sock, reader, request))
+            self.cache.put((team, year), season_data)
+        return season_data
+
+    def lookup_async(self, team, year):
+        """ :return: Future for lookup(team, year) run on a background thread """
+        return self.executor.submit(self.lookup, team, year)
+
+    def lookup_batch(self, batch_request):
+        """ :return: list of season data for a BatchRequest (not cached) """
+        return self.pool.run(lambda sock, reader:
+                             lookup_batch(sock, reader, batch_request))
+
+    def lookup_totals(self, totals_request):
+        """ :return: SeasonTotals for an AggregateRequest of kind TOTAL """
+        return self.pool.run(lambda sock, reader:
+                             lookup_totals(sock, reader, totals_request))
+
+    def suggest(self, text=""):
+        """ :return: team names matching text (every team for "") """
+        return self.pool.run(lambda sock, reader:
+                             lookup_suggestions(sock, reader, text))
+
+    def suggest_async(self, text=""):
+        """ :return: Future for suggest(text) run on a background thread """
+        return self.executor.submit(self.suggest, text)
+
+    def stats(self):
+        """ :return: list of (name, value) metrics from the server """
+        return self.pool.run(lookup_stats)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.pool.close()
@@ -5,109 +5,862 @@ Purpose: Class to implement nba record server that will listen on a particular
          port and return the record of the given team in the given year.
 """
 
+import argparse
+import asyncio
+import gc
 import os
+import signal
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from selectors import EVENT_READ, DefaultSelector
 from socket import *
-from threading import Thread
-from time import ctime
+from threading import BoundedSemaphore, Condition, Event, Thread
+from time import ctime, monotonic, perf_counter, sleep
 
-from season_data import SeasonData
-from request_handler import RequestHandler
+from data_loader import LOAD_WORKERS, load_team_file, load_team_files, team_from_filename
+from framing import MAX_LINE_LENGTH, encode_message
+from season_index import SeasonIndex
+from server_metrics import ServerMetrics
+from servercore import ServerLimits, add_arguments, limits_from_arguments
+from snapshot import read_snapshot, write_snapshot
+from request_handler import RequestHandler, respond_to
+from response import BusyResponse, Response
+from response_cache import EncodedResponseCache, RESPONSE_CACHE_ENTRIES
 
 # CONSTANTS
 DATA_DIR = "data-dir"
+SNAPSHOT_FILE = "data-dir.snapshot"
 HOST = "localhost"
 PORT = 32123
 ADDRESS = (HOST, PORT)
 BACKLOG_ALLOWED = 25
+# Threads answering requests and connections allowed to wait for one of them.
+# A keep-alive connection holds its worker until the client hangs up.
+WORKER_THREADS = 16
+QUEUE_DEPTH = 64
+SERVER_MODES = ["threaded", "async", "prefork"]
+# Processes started by the prefork mode.  Each one runs a threaded listener.
+PROCESSES = os.cpu_count() or 1
+# A prefork worker that dies sooner than this after starting is not replaced
+# (it would most likely fail again straight away).
+RESPAWN_MIN_SECONDS = 1.0
+STOP_CHECK_SECONDS = 0.5
+# How long connections being handled get to finish once the server is asked
+# to stop.  Connections still open after that are cut off.
+SHUTDOWN_SECONDS = 10.0
+RELOAD_SECONDS = 5.0
+STATS_LOG = "nba_record_server.log"
+STATS_SECONDS = 60.0
+# A keep-alive connection that sends no request for this long is closed so
+# it stops holding a worker.
+IDLE_SECONDS = 60.0
 
 # NOT TECHNICALLY A CONSTANT - ALLOWS EXITING SERVER FROM COMMAND LINE
 STOP_SERVER = False
 
-def team_from_filename(filename: str):
-    """
-    Record data is stored in the data directory in the format <team name>.csv
-    :param filename: Name of file found in data directory.
-    :return: name of the team (as used in dictionary)
-    """
-    dot_idx = filename.index(".")
-    teamname = filename[0:dot_idx].lower().capitalize()
-    return teamname
-
 class NbaRecordServerListener(Thread):
     """
     Implements the listener thread for the server.
     """
     def load_data(self,data_dir=DATA_DIR):
+        start = perf_counter()
         # move into the data directory to read the files there.
         os.chdir(data_dir)
         # Process all files in the data directory.
+        filenames = []
+        for file in os.scandir("."):
+            if file.is_file():
+                self.FILE_MTIMES[file.name] = file.stat().st_mtime_ns
+                filenames.append(file.name)
+
+        # Skip parsing when the snapshot was made from these same files.
+        cache = None
+        if self.snapshot_path is not None:
+            cache = read_snapshot(self.snapshot_path, self.FILE_MTIMES)
+
+        problems = 0
+        if cache is not None:
+            print("Reading snapshot: %s" % self.snapshot_path)
+            self.DATA_CACHE.update(cache)
+        else:
+            print("Reading %d files from: %s" % (len(filenames), data_dir))
+            for result in load_team_files(filenames, self.load_workers):
+                self.store_team_file(*result)
+                problems += len(result[3])
+            self.save_snapshot()
+
+        # Index the cache so lookups do not have to scan a team's seasons.
+        self.SEASON_INDEX.load(self.DATA_CACHE)
+        seasons = sum(len(team_data) for team_data in self.DATA_CACHE.values())
+        print("Loaded %d teams (%d seasons) in %.3f seconds, %d problems found"
+              % (len(self.DATA_CACHE), seasons, perf_counter() - start, problems))
+
+    def save_snapshot(self):
+        """ Write the data cache to the snapshot file (if there is one). """
+        if self.snapshot_path is None:
+            return
+        try:
+            write_snapshot(self.snapshot_path, self.FILE_MTIMES, self.DATA_CACHE)
+        except OSError as e:
+            print("ERROR WRITING SNAPSHOT: %s: %s" % (self.snapshot_path, e))
+
+    def store_team_file(self, filename, teamname, team_data, errors, cache=None):
+        """
+        Report the problems found in a team file and cache its seasons.
+        :param filename: name of the file that was read
+        :param teamname: name of the team or None if the file wasn't usable
+        :param team_data: list of SeasonData or None if the file wasn't usable
+        :param errors: list of problems found in the file
+        :param cache: dictionary to store the seasons in, DATA_CACHE when None
+        :return: True if the team's data was cached.
+        """
+        for error in errors:
+            print("ERROR PROCESSING: %s: %s" % (filename, error))
+        if team_data is None:
+            print("ERROR PROCESSING: %s (ignoring file)" % filename)
+            return False
+        # Cache all team data for each team.
+        if cache is None:
+            cache = self.DATA_CACHE
+        cache[teamname] = team_data
+        return True
+
+    def refresh_data(self):
+        """
+        Re-read only the files in the data directory that were added, changed
+        or removed since they were last read.  The changes are collected and
+        indexed off to the side first.  Only once the new index is swapped in
+        are the teams written into the cache (each with a single assignment),
+        so request handlers never wait on a reload, never see a half loaded
+        team, and a reload that fails leaves the cache and the index as they
+        were (to be tried again next time).
+        :return: True if anything in the cache changed.
+        """
+        mtimes = dict(self.FILE_MTIMES)
+        updated = {}
+        removed = set()
+        seen = set()
         for file in os.scandir("."):
             try:
-                print("Reading data from: %s" % file.name)
-
-                with open(file.name, "r") as f:
-                    # read entire file (they are relatively short)
-                    lines = f.readlines()
-                    # Skip first line (header info)
-                    lines.pop(0)
-
-                    # all data for this team.
-                    team_data = []
-                    # Store each entry into a SeasonData object and store in a list.
-                    for l in lines:
-                        team_data.append( SeasonData(l) )
-
-                    # Get team's name from the filename
-                    teamname = team_from_filename(file.name)
-                    # Cache all tead data for each team.
-                    self.DATA_CACHE[teamname] = team_data
-
-            except:
-                # Handle errors by ignore them which will cause the file being
-                # read to be ignored.
-                print("ERROR PROCESSING: %s (ignoring file)" % file.name)
-                pass
+                if not file.is_file():
+                    continue
+                mtime = file.stat().st_mtime_ns
+            except OSError:
+                # Gone since scandir listed it (an editor's temporary file).
+                continue
+            seen.add(file.name)
+            if mtimes.get(file.name) == mtime:
+                continue
+            mtimes[file.name] = mtime
+            print("Reloading data from: %s" % file.name)
+            # A file that can't be used keeps serving what was loaded before.
+            self.store_team_file(*load_team_file(file.name), cache=updated)
+
+        for filename in set(mtimes) - seen:
+            print("Data file removed: %s" % filename)
+            del mtimes[filename]
+            try:
+                teamname = team_from_filename(filename)
+            except ValueError:
+                continue
+            if teamname in self.DATA_CACHE and teamname not in updated:
+                removed.add(teamname)
 
-    def __init__(self):
+        changed = len(updated) > 0 or len(removed) > 0
+        if changed:
+            cache = dict(self.DATA_CACHE)
+            cache.update(updated)
+            for teamname in removed:
+                del cache[teamname]
+            self.SEASON_INDEX.load(cache)
+            for teamname, team_data in updated.items():
+                self.DATA_CACHE[teamname] = team_data
+            for teamname in removed:
+                self.DATA_CACHE.pop(teamname, None)
+        self.FILE_MTIMES = mtimes
+        if changed:
+            self.save_snapshot()
+        return changed
+
+    def __init__(self,
+                 workers=WORKER_THREADS,
+                 queue_depth=QUEUE_DEPTH,
+                 backlog=BACKLOG_ALLOWED,
+                 load_workers=LOAD_WORKERS,
+                 snapshot_file=SNAPSHOT_FILE,
+                 data_dir=DATA_DIR,
+                 address=None,
+                 shutdown_seconds=SHUTDOWN_SECONDS,
+                 reuse_port=False,
+                 response_cache_entries=RESPONSE_CACHE_ENTRIES,
+                 limits=None
+                 ):
+        """
+        :param workers: number of threads in the request handler pool
+        :param queue_depth: connections allowed to wait for a free worker.
+                            Connections past this are told the server is busy.
+        :param backlog: connections the OS queues before they are accepted
+        :param load_workers: processes used to parse the data files
+        :param snapshot_file: binary copy of the data cache used to skip
+                              parsing at startup.  None to not use one.
+        :param data_dir: directory holding the team files
+        :param address: (host, port) to listen on, ADDRESS when None.  Port 0
+                        picks a free port; self.address holds the real one
+                        once self.ready is set.
+        :param shutdown_seconds: time the open connections get to finish
+                                 after stop() is called
+        :param reuse_port: bind with SO_REUSEPORT so several processes can
+                           listen on the same port (prefork mode)
+        :param response_cache_entries: encoded responses kept for repeated
+                                       requests, 0 to not cache them
+        :param limits: servercore.ServerLimits (idle timeout, connection
+                       rate and caps).  Idle connections are closed after
+                       IDLE_SECONDS when None.
+        """
         Thread.__init__(self)
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.backlog = backlog
+        self.load_workers = load_workers
+        self.address = address
+        self.ready = Event()
+        self.shutdown_seconds = shutdown_seconds
+        self.reuse_port = reuse_port
+        self.limits = limits if limits is not None else ServerLimits(IDLE_SECONDS)
+        self.stopping = Event()
+        # stop() writes to this pair to wake the accept loop.  Made when the
+        # listener starts so a forked copy doesn't share its parent's.
+        self.wakeup_reader = self.wakeup_writer = None
+        # Handlers accepted and not yet finished.
+        self.handlers = set()
+        self.handlers_changed = Condition()
+        self.snapshot_path = None
+        if snapshot_file:
+            # Resolved now since load_data moves into the data directory.
+            self.snapshot_path = os.path.abspath(snapshot_file)
 
         # Read data from disk into memory.
         self.DATA_CACHE = {}
-        self.load_data()
+        self.FILE_MTIMES = {}
+        self.SEASON_INDEX = SeasonIndex()
+        self.metrics = ServerMetrics()
+        self.response_cache = None
+        if response_cache_entries > 0:
+            self.response_cache = EncodedResponseCache(response_cache_entries)
+        self.load_data(data_dir)
 
     def run(self) -> None:
         svr_socket = socket(AF_INET, SOCK_STREAM)
-        svr_socket.bind(ADDRESS)
-        svr_socket.listen( BACKLOG_ALLOWED )
+        # Allow a restarted server to bind while old connections are in
+        # TIME_WAIT (asyncio.start_server does the same).
+        svr_socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        if self.reuse_port:
+            svr_socket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+        svr_socket.bind(self.address or ADDRESS)
+        svr_socket.listen( self.backlog )
+        # accept() is only called once the selector says a client is waiting,
+        # so the loop never blocks where stop() can't wake it up.
+        svr_socket.setblocking(False)
+        self.address = svr_socket.getsockname()
+        self.wakeup_reader, self.wakeup_writer = socketpair()
 
-        while not STOP_SERVER:
-            print("Listening for connections on port %d . . ." % PORT)
+        selector = DefaultSelector()
+        selector.register(svr_socket, EVENT_READ)
+        selector.register(self.wakeup_reader, EVENT_READ)
+        self.ready.set()
+
+        # Fixed size pool of handler threads.  The executor's own queue has no
+        # limit, so the semaphore counts connections that are being handled or
+        # waiting and caps them at workers + queue_depth.
+        pool = ThreadPoolExecutor(max_workers=self.workers,
+                                  thread_name_prefix="RequestHandler")
+        slots = BoundedSemaphore(self.workers + self.queue_depth)
+
+        print("Listening for connections on port %d . . ." % self.address[1])
+        try:
+            while not self.stopping.is_set() and not STOP_SERVER:
+                for key, events in selector.select(STOP_CHECK_SECONDS):
+                    if key.fileobj is svr_socket:
+                        self.accept(svr_socket, pool, slots)
+        finally:
+            selector.close()
+            svr_socket.close()
+            self.drain(pool)
+
+    def accept(self, svr_socket, pool, slots):
+        """
+        Accept a waiting client and queue it for a handler thread (or turn it
+        away if the server is full).
+        :param svr_socket: listening socket the selector found readable
+        :param pool: handler thread pool
+        :param slots: semaphore counting the connections handled or waiting
+        """
+        try:
             client, address = svr_socket.accept()
-            print("... connected from: %s at %s" % (address,ctime()))
-            req_handler = RequestHandler(client, self.DATA_CACHE)
-            req_handler.start()
+        except (BlockingIOError, InterruptedError):
+            # The client gave up before it could be accepted.
+            return
+        # Blocking, but a client quiet for the idle timeout is cut off
+        # instead of keeping its worker forever.
+        self.limits.set_timeout(client)
+        print("... connected from: %s at %s" % (address,ctime()))
+        refused = self.limits.admit(address)
+        if refused is not None:
+            print("... %s, turning away: %s" % (refused, address))
+            self.metrics.connection_rejected()
+            self.reject(client)
+            return
+        if not slots.acquire(blocking=False):
+            print("... server busy, turning away: %s" % (address,))
+            self.limits.release(address)
+            self.metrics.connection_rejected()
+            self.reject(client)
+            return
+        req_handler = RequestHandler(client, self.SEASON_INDEX, self.metrics,
+                                     self.response_cache)
+        with self.handlers_changed:
+            self.handlers.add(req_handler)
+        future = pool.submit(req_handler.run)
+        future.add_done_callback(
+            lambda f: self.handler_done(req_handler, f, slots, address))
+
+    def handler_done(self, req_handler, future, slots, address):
+        """ Forget a finished handler and free its slot. """
+        if future.cancelled():
+            # Never ran, so the connection was never closed.
+            req_handler.client.close()
+        slots.release()
+        self.limits.release(address)
+        with self.handlers_changed:
+            self.handlers.discard(req_handler)
+            self.handlers_changed.notify_all()
+
+    def stop(self):
+        """
+        Stop accepting connections and shut the server down.  Connections
+        being handled get shutdown_seconds to finish.  Safe to call from any
+        thread (or a signal handler); join() the listener to wait for it.
+        """
+        self.stopping.set()
+        try:
+            if self.wakeup_writer is not None:
+                self.wakeup_writer.send(b"x")
+        except OSError:
+            # Already woken (the buffer is full) or already shut down.
+            pass
+
+    def drain(self, pool):
+        """
+        Let the open connections finish within the shutdown deadline.  Every
+        handler is told to stop reading; the requests it already received
+        are answered before it hangs up.  Connections still open when the
+        deadline passes are cut off.
+        :param pool: handler thread pool
+        """
+        with self.handlers_changed:
+            handlers = list(self.handlers)
+        print("Shutting down: %d connections open" % len(handlers))
+        for req_handler in handlers:
+            req_handler.stop()
+
+        deadline = monotonic() + self.shutdown_seconds
+        with self.handlers_changed:
+            self.handlers_changed.wait_for(lambda: len(self.handlers) == 0,
+                                           max(0.0, deadline - monotonic()))
+            left = list(self.handlers)
+        for req_handler in left:
+            req_handler.abort()
+        if len(left) > 0:
+            print("Shutting down: cut off %d connections" % len(left))
+
+        pool.shutdown(wait=False, cancel_futures=True)
+        self.wakeup_reader.close()
+        self.wakeup_writer.close()
+        print("Server stopped")
+
+    def reject(self, client):
+        """
+        Tell a client the server is too busy to handle it and hang up.
+        :param client: socket of the connection being turned away
+        """
+        try:
+            client.sendall(encode_message(str(BusyResponse()) + "\n"))
+        except OSError:
+            pass
+        finally:
+            client.close()
+
+class AsyncNbaRecordServerListener(NbaRecordServerListener):
+    """
+    Listener that serves every client from a single asyncio event loop instead
+    of starting a RequestHandler thread per connection.  Uses the same data
+    cache, index and request/response messages as the threaded listener.
+    """
+    def run(self) -> None:
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """ Accept connections until stop() is called or STOP_SERVER is set. """
+        loop = asyncio.get_running_loop()
+        # stop() may be called from any thread.  The wakeup socket turns it
+        # into an event on this loop.
+        stop_requested = asyncio.Event()
+        self.wakeup_reader, self.wakeup_writer = socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.clients = {}
+        # Clients are closed by the loop below once idle too long.
+        self.idle = self.limits.idle_tracker()
+
+        host, port = self.address or ADDRESS
+        server = await asyncio.start_server(self.handle_client, host, port,
+                                            backlog=self.backlog,
+                                            limit=MAX_LINE_LENGTH,
+                                            reuse_port=self.reuse_port)
+        self.address = server.sockets[0].getsockname()
+        print("Listening (asyncio) for connections on port %d . . ." % self.address[1])
+        wakeup = loop.create_task(loop.sock_recv(self.wakeup_reader, 1))
+        wakeup.add_done_callback(lambda t: stop_requested.set())
+        self.ready.set()
+
+        while not self.stopping.is_set() and not STOP_SERVER:
+            try:
+                await asyncio.wait_for(stop_requested.wait(), self.check_seconds())
+            except asyncio.TimeoutError:
+                pass
+            self.close_idle_clients()
+        wakeup.cancel()
+        server.close()
+        await self.drain_clients()
+        await server.wait_closed()
+        self.wakeup_reader.close()
+        self.wakeup_writer.close()
+        print("Server stopped")
+
+    def check_seconds(self):
+        """ :return: how long serve waits before looking for idle clients """
+        if self.idle is None:
+            return STOP_CHECK_SECONDS
+        return min(STOP_CHECK_SECONDS, self.idle.check_seconds)
+
+    def close_idle_clients(self):
+        """ Cut off the clients that sent nothing for the idle timeout. """
+        if self.idle is None:
+            return
+        for writer in self.idle.expired():
+            self.metrics.connection_timed_out()
+            # abort, not close: a client that stopped reading its responses
+            # would keep close waiting for the buffer to drain.
+            writer.transport.abort()
+
+    async def drain_clients(self):
+        """
+        Coroutine version of drain.  Each client stops being read from, the
+        requests it already sent are answered and it is hung up on.  Clients
+        still open when the deadline passes are cut off.
+        """
+        clients = dict(self.clients)
+        print("Shutting down: %d connections open" % len(clients))
+        for reader, writer in clients.values():
+            writer.transport.pause_reading()
+            reader.feed_eof()
+        if len(clients) == 0:
+            return
+        done, left = await asyncio.wait(clients.keys(), timeout=self.shutdown_seconds)
+        # Aborting the connection (rather than cancelling the task) lets the
+        # handler see a ConnectionError and finish normally.
+        for task in left:
+            reader, writer = clients[task]
+            writer.transport.abort()
+        if len(left) > 0:
+            await asyncio.wait(left)
+            print("Shutting down: cut off %d connections" % len(left))
+
+    async def handle_client(self, reader, writer):
+        """
+        Coroutine version of RequestHandler.run.  Answers newline terminated
+        requests in order until the client closes the connection or sends a
+        request that does not ask for keep-alive.
+        param reader: asyncio stream to read requests from
+        param writer: asyncio stream to write responses to
+        """
+        address = writer.get_extra_info("peername")
+        refused = self.limits.admit(address)
+        if refused is not None:
+            print("... %s, turning away: %s" % (refused, address))
+            self.metrics.connection_rejected()
+            writer.write(encode_message(str(BusyResponse()) + "\n"))
+            writer.close()
+            return
+        keep_alive = True
+        task = asyncio.current_task()
+        self.clients[task] = (reader, writer)
+        self.metrics.handler_started()
+        try:
+            while keep_alive:
+                if self.idle is not None:
+                    self.idle.touch(writer)
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Request too long to be real.  Hang up.
+                    writer.write(encode_message(str(Response(None)) + "\n"))
+                    break
+                if not line.endswith(b"\n"):
+                    # Client closed the connection (possibly mid-request).
+                    break
+                if line.strip() == b"":
+                    continue
+                data, keep_alive = respond_to(line, self.SEASON_INDEX, self.metrics,
+                                              self.response_cache)
+                start = perf_counter()
+                writer.write(data)
+                await writer.drain()
+                self.metrics.response_sent(perf_counter() - start)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            del self.clients[task]
+            if self.idle is not None:
+                self.idle.forget(writer)
+            self.limits.release(address)
+            self.metrics.handler_finished()
+
+class PreforkServer:
+    """
+    Runs a listener in several worker processes that all accept connections
+    on the same port (SO_REUSEPORT), so answering requests is spread over
+    every core instead of sharing one interpreter lock.  The data is loaded
+    once, before forking; the workers share those pages copy-on-write.  This
+    process only starts the workers, replaces any that die and stops them.
+    """
+    def __init__(self, listener, processes=PROCESSES, start_helpers=None):
+        """
+        :param listener: loaded, not yet started listener made with
+                         reuse_port=True.  Every worker runs its own copy.
+        :param processes: number of worker processes
+        :param start_helpers: function(listener, worker number) called in each
+                              worker to start its background threads, or None
+        """
+        self.listener = listener
+        self.processes = processes
+        self.start_helpers = start_helpers
+        self.stopping = Event()
+        # pid -> (worker number, time it was started)
+        self.workers = {}
+
+    def start(self):
+        """ Fork the worker processes. """
+        # Everything loaded so far lives as long as the server.  Freezing it
+        # keeps the garbage collector from touching (and so copying) those
+        # pages in every worker.
+        gc.freeze()
+        for number in range(self.processes):
+            self.spawn(number)
+        print("Started %d worker processes" % self.processes)
+
+    def spawn(self, number):
+        """ Fork worker number.  The child never returns from here. """
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker(number)
+        self.workers[pid] = (number, monotonic())
+
+    def run_worker(self, number):
+        """ Body of a worker process. """
+        code = 0
+        try:
+            # ctrl-c reaches every process.  Only the parent acts on it and
+            # stops the workers with SIGTERM.
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.listener.stop())
+            if number > 0:
+                # Only one worker rewrites the snapshot after a reload.  The
+                # others would race it on the same temporary file.
+                self.listener.snapshot_path = None
+            if self.start_helpers is not None:
+                self.start_helpers(self.listener, number)
+            # Run on this (the only) thread rather than start()ing the Thread
+            # object made before the fork, which the child can't track.
+            # SIGTERM's stop() wakes the accept loop through its socketpair.
+            self.listener.run()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            # Skip the parent's exit handlers.
+            os._exit(code)
+
+    def stop(self):
+        """ Ask the workers to shut down.  Safe to call from a signal handler. """
+        self.stopping.set()
+
+    def wait(self):
+        """
+        Replace workers that die until stop() is called, then stop every
+        worker.  Workers get the listener's shutdown_seconds to drain their
+        connections before they are killed.
+        """
+        try:
+            while not self.stopping.is_set() and len(self.workers) > 0:
+                sleep(STOP_CHECK_SECONDS)
+                self.reap()
+        finally:
+            self.stop_workers()
+
+    def reap(self):
+        """ Collect workers that exited and start replacements. """
+        while len(self.workers) > 0:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if pid not in self.workers:
+                continue
+            number, started = self.workers.pop(pid)
+            if self.stopping.is_set():
+                continue
+            print("Worker %d (pid %d) exited with status %d"
+                  % (number, pid, os.waitstatus_to_exitcode(status)))
+            if monotonic() - started < RESPAWN_MIN_SECONDS:
+                print("Worker %d failed on startup, stopping the server" % number)
+                self.stop()
+            else:
+                self.spawn(number)
+
+    def stop_workers(self):
+        """ SIGTERM every worker, then SIGKILL the ones that outlast the deadline. """
+        self.stop()
+        self.signal_workers(signal.SIGTERM)
+        deadline = monotonic() + self.listener.shutdown_seconds + 1.0
+        while len(self.workers) > 0 and monotonic() < deadline:
+            sleep(0.05)
+            self.reap()
+        if len(self.workers) > 0:
+            print("Killing %d workers" % len(self.workers))
+            self.signal_workers(signal.SIGKILL)
+            for pid in list(self.workers):
+                os.waitpid(pid, 0)
+                del self.workers[pid]
+        print("Server stopped")
+
+    def signal_workers(self, signum):
+        for pid in self.workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+def worker_log_path(path, number):
+    """ :return: metrics log of a prefork worker (nba_record_server.3.log) """
+    root, ext = os.path.splitext(path)
+    return "%s.%d%s" % (root, number, ext)
+
+def start_helper_threads(listener, args, stats_log):
+    """
+    Start the data reload and metrics log threads for a listener.
+    :param listener: running listener
+    :param args: command line options
+    :param stats_log: absolute path of the metrics log
+    """
+    # Thread to pick up changes to the data files.
+    if args.reload_seconds > 0:
+        DataWatcherThread(listener, args.reload_seconds).start()
+
+    # Thread to write the metrics to the log.
+    if args.stats_seconds > 0:
+        MetricsLogThread(listener.metrics, stats_log, args.stats_seconds).start()
+
+class DataWatcherThread(Thread):
+    """
+    Background thread that checks the data directory every few seconds and
+    reloads the files that changed, so new data is served without restarting
+    the server.
+    """
+    def __init__(self, listener, interval=RELOAD_SECONDS):
+        """
+        :param listener: server whose data cache is kept up to date
+        :param interval: seconds between checks of the data directory
+        """
+        Thread.__init__(self, name="DataWatcher", daemon=True)
+        self.listener = listener
+        self.interval = interval
+
+    def run(self):
+        while not STOP_SERVER:
+            sleep(self.interval)
+            try:
+                self.listener.refresh_data()
+            except Exception as e:
+                # Keep serving what is loaded and try again next time.
+                print("ERROR RELOADING DATA: %s" % e)
+
+class MetricsLogThread(Thread):
+    """
+    Background thread that appends the server's metrics to a log file every
+    so often, so you can see where the time goes while it is under load.
+    """
+    def __init__(self, metrics, log_path, interval=STATS_SECONDS):
+        """
+        :param metrics: ServerMetrics of the running server
+        :param log_path: file the metrics are appended to
+        :param interval: seconds between dumps
+        """
+        Thread.__init__(self, name="MetricsLog", daemon=True)
+        self.metrics = metrics
+        self.log_path = log_path
+        self.interval = interval
+
+    def run(self):
+        while not STOP_SERVER:
+            sleep(self.interval)
+            self.dump()
+
+    def dump(self):
+        """ Append the current metrics to the log. """
+        try:
+            with open(self.log_path, "a") as log:
+                log.write(self.metrics.report())
+        except OSError as e:
+            print("ERROR WRITING METRICS: %s: %s" % (self.log_path, e))
 
 class QuitThread(Thread):
     """
-    A Thread to allow graceful termination of the server after the next request
-    is processed.
+    A Thread to allow graceful termination of the server.  Pressing enter
+    stops the listener, which finishes the requests in progress and exits.
     """
-    def __init__(self):
-        Thread.__init__(self)
+    def __init__(self, listener):
+        """ :param listener: server to stop (anything with a stop() method) """
+        Thread.__init__(self, daemon=True)
+        self.listener = listener
 
     def run(self):
-        input("Press enter to exit:\n")
+        try:
+            input("Press enter to exit:\n")
+        except EOFError:
+            # No console (started in the background).  Stop with a signal.
+            return
         global STOP_SERVER
         STOP_SERVER = True
+        self.listener.stop()
+
+def parse_arguments():
+    """ :return: command line options for the server """
+    parser = argparse.ArgumentParser(description="NBA season record server")
+    parser.add_argument("--mode", choices=SERVER_MODES, default="threaded",
+                        help="thread pool or a single asyncio loop")
+    parser.add_argument("--port", type=int, default=PORT,
+                        help="port to listen on (default %d)" % PORT)
+    parser.add_argument("--workers", type=int, default=WORKER_THREADS,
+                        help="request handler threads (per process in prefork "
+                             "mode, default %d)" % WORKER_THREADS)
+    parser.add_argument("--processes", type=int, default=PROCESSES,
+                        help="worker processes in prefork mode (default %d)"
+                             % PROCESSES)
+    parser.add_argument("--queue-depth", type=int, default=QUEUE_DEPTH,
+                        help="connections waiting for a worker before the "
+                             "server answers busy (default %d)" % QUEUE_DEPTH)
+    parser.add_argument("--load-workers", type=int, default=LOAD_WORKERS,
+                        help="processes used to parse the data files at "
+                             "startup (default %d)" % LOAD_WORKERS)
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE,
+                        help="binary snapshot of the data used to skip "
+                             "parsing at startup, '' for none (default %s)"
+                             % SNAPSHOT_FILE)
+    parser.add_argument("--reload-seconds", type=float, default=RELOAD_SECONDS,
+                        help="how often to check %s for changed files, 0 to "
+                             "never reload (default %g)" % (DATA_DIR, RELOAD_SECONDS))
+    parser.add_argument("--stats-log", default=STATS_LOG,
+                        help="file the server metrics are appended to "
+                             "(default %s)" % STATS_LOG)
+    parser.add_argument("--stats-seconds", type=float, default=STATS_SECONDS,
+                        help="how often to write the metrics, 0 to never "
+                             "write them (default %g)" % STATS_SECONDS)
+    parser.add_argument("--shutdown-seconds", type=float, default=SHUTDOWN_SECONDS,
+                        help="time open connections get to finish when the "
+                             "server is stopped (default %g)" % SHUTDOWN_SECONDS)
+    parser.add_argument("--response-cache", type=int, default=RESPONSE_CACHE_ENTRIES,
+                        help="encoded responses kept for repeated requests, "
+                             "0 to not cache them (default %d)" % RESPONSE_CACHE_ENTRIES)
+    parser.add_argument("--backlog", type=int, default=BACKLOG_ALLOWED,
+                        help="listen backlog (default %d)" % BACKLOG_ALLOWED)
+    add_arguments(parser, IDLE_SECONDS)
+    args = parser.parse_args()
+    # SO_REUSEPORT comes from "from socket import *" where the platform has it.
+    if args.mode == "prefork" and not (hasattr(os, "fork") and "SO_REUSEPORT" in globals()):
+        parser.error("prefork mode needs os.fork and SO_REUSEPORT")
+    return args
 
 def main():
-    # Graceful termination thread.
-    qt = QuitThread()
-    qt.start()
+    global PORT, ADDRESS
+    args = parse_arguments()
+    PORT = args.port
+    ADDRESS = (HOST, PORT)
+    # Resolved now since loading the data moves into the data directory.
+    stats_log = os.path.abspath(args.stats_log)
+
+    if args.mode == "prefork":
+        run_prefork(args, stats_log)
+        return
 
     # Thread to listen for new requests.
-    listener = NbaRecordServerListener()
+    if args.mode == "async":
+        listener = AsyncNbaRecordServerListener(backlog=args.backlog,
+                                                load_workers=args.load_workers,
+                                                snapshot_file=args.snapshot,
+                                                shutdown_seconds=args.shutdown_seconds,
+                                                response_cache_entries=args.response_cache,
+                                                limits=limits_from_arguments(args))
+    else:
+        listener = NbaRecordServerListener(args.workers, args.queue_depth,
+                                           args.backlog, args.load_workers,
+                                           args.snapshot,
+                                           shutdown_seconds=args.shutdown_seconds,
+                                           response_cache_entries=args.response_cache,
+                                           limits=limits_from_arguments(args))
     listener.start()
 
+    # Graceful termination: enter on the console, SIGTERM (what deploy tools
+    # send) or ctrl-c.
+    QuitThread(listener).start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: listener.stop())
+
+    start_helper_threads(listener, args, stats_log)
+
+    # Keep the main thread alive.  asyncio needs the interpreter to not be
+    # shutting down while it runs.
+    try:
+        while listener.is_alive():
+            listener.join(STOP_CHECK_SECONDS)
+    except KeyboardInterrupt:
+        listener.stop()
+        listener.join()
+
+def run_prefork(args, stats_log):
+    """
+    Load the data once and serve it from args.processes worker processes.
+    :param args: command line options
+    :param stats_log: absolute path of the metrics log (one per worker)
+    """
+    listener = NbaRecordServerListener(args.workers, args.queue_depth,
+                                       args.backlog, args.load_workers,
+                                       args.snapshot,
+                                       shutdown_seconds=args.shutdown_seconds,
+                                       reuse_port=True,
+                                       response_cache_entries=args.response_cache,
+                                       limits=limits_from_arguments(args))
+    server = PreforkServer(listener, args.processes,
+                           lambda worker_listener, number: start_helper_threads(
+                               worker_listener, args, worker_log_path(stats_log, number)))
+    server.start()
+
+    QuitThread(server).start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: server.stop())
+    server.wait()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,7 +4,43 @@ Date:    Nov 30, 2022
 Purpose: Data structure to contain all relevant portions of a information request.
 """
 
-from season_data import SeasonData
+from season_data import SeasonData, start_year_of
+
+# Version 1: one request per connection.  The server closes the connection
+#            after sending the response.
+# Version 2: keep-alive.  The connection carries any number of newline
+#            terminated requests which may be pipelined.  Responses are sent
+#            back in the order the requests arrived.
+SINGLE_REQUEST_VERSION = 1
+KEEP_ALIVE_VERSION = 2
+PROTOCOL_VERSION = KEEP_ALIVE_VERSION
+
+# Batch requests look like
+#     <version>,BATCH,Lakers:1980-81..1989-90;Pelicans:2019-20
+# Each item is a team and a season, or a team and an inclusive season range.
+BATCH = "BATCH"
+BATCH_ITEM_SEPARATOR = ";"
+BATCH_TEAM_SEPARATOR = ":"
+BATCH_RANGE_SEPARATOR = ".."
+MAX_BATCH_SIZE = 1000
+
+# Aggregate requests look like
+#     <version>,TOTAL,Lakers,1980-81..1989-90     wins, losses, playoffs ...
+#     <version>,BEST,Lakers,1980-81..1989-90      season with the best win %
+#     <version>,COACH,P. Riley                    every season a coach coached
+# The season range is optional.  Leaving it off means every season.
+TOTAL = "TOTAL"
+BEST = "BEST"
+COACH = "COACH"
+AGGREGATE_KINDS = (TOTAL, BEST, COACH)
+
+# Server metrics:
+#     <version>,STATS
+STATS = "STATS"
+
+# Team names completing (or close to) what a user typed.  No text for every team.
+#     <version>,SUGGEST,los ang
+SUGGEST = "SUGGEST"
 
 def build_request_from_message(user_request: str):
     """
@@ -12,15 +48,76 @@ def build_request_from_message(user_request: str):
     :param user_request: string version
     :return: request object version
     """
-    entries = user_request.split(",")
-    return Request( entries[1],entries[2])
+    entries = user_request.strip().split(",")
+    if entries[1] == BATCH:
+        return build_batch_request(int(entries[0]), entries[2])
+    if entries[1] in AGGREGATE_KINDS:
+        return build_aggregate_request(int(entries[0]), entries[1], entries[2:])
+    if entries[1] == STATS:
+        return StatsRequest(int(entries[0]))
+    if entries[1] == SUGGEST:
+        return SuggestRequest(",".join(entries[2:]), int(entries[0]))
+    return Request( entries[1],entries[2],int(entries[0]))
+
+def season_name(start_year: int):
+    """ :return: season in the format 1980-81 for the season starting in start_year """
+    return "%d-%02d" % (start_year, (start_year + 1) % 100)
+
+def expand_season_range(first: str, last: str):
+    """
+    List every season from first to last (inclusive).
+    :param first: first season in the format 1980-81
+    :param last: last season in the format 1989-90
+    :return: list of season names
+    """
+    first_year = start_year_of(first)
+    last_year = start_year_of(last)
+    if last_year < first_year or last_year - first_year >= MAX_BATCH_SIZE:
+        raise ValueError("bad season range %s..%s" % (first, last))
+    return [season_name(yr) for yr in range(first_year, last_year + 1)]
+
+def build_batch_request(version: int, items: str):
+    """
+    Build a batch request from the item list of a BATCH message.
+    :param version: protocol version of the message
+    :param items: Lakers:1980-81..1989-90;Pelicans:2019-20
+    :return: BatchRequest for every (team, season) pair in the items
+    """
+    pairs = []
+    for item in items.split(BATCH_ITEM_SEPARATOR):
+        team, seasons = item.split(BATCH_TEAM_SEPARATOR)
+        if BATCH_RANGE_SEPARATOR in seasons:
+            first, last = seasons.split(BATCH_RANGE_SEPARATOR)
+            years = expand_season_range(first, last)
+        else:
+            years = [seasons]
+        pairs.extend((team, year) for year in years)
+    if len(pairs) > MAX_BATCH_SIZE:
+        raise ValueError("batch of %d seasons is too large" % len(pairs))
+    return BatchRequest(pairs, version)
+
+def build_aggregate_request(version: int, kind: str, arguments):
+    """
+    Build an aggregate request from the fields after the request kind.
+    :param version: protocol version of the message
+    :param kind: TOTAL, BEST or COACH
+    :param arguments: [team or coach] or [team or coach, season range]
+    :return: AggregateRequest
+    """
+    subject = arguments[0]
+    first = last = None
+    if len(arguments) > 1 and arguments[1] != "":
+        first, last = arguments[1].split(BATCH_RANGE_SEPARATOR)
+        # Validates the range.
+        expand_season_range(first, last)
+    return AggregateRequest(kind, subject, first, last, version)
 
 class Request:
     """
     Stores all data about a single season for a single team.
     """
-    def __init__(self,team,year):
-        self.init_data(1,team,year)
+    def __init__(self,team,year,version=PROTOCOL_VERSION):
+        self.init_data(version,team,year)
 
     def init_data(self,
                   protocol_version,
@@ -33,7 +130,11 @@ class Request:
 
     def __str__(self):
         """ Convert request to a csv string """
-        return "%d,%s,%s" % (1,self.team,self.year)
+        return "%d,%s,%s" % (self.version,self.team,self.year)
+
+    def keep_alive(self):
+        """ :return: True if the connection stays open after the response. """
+        return self.version >= KEEP_ALIVE_VERSION
 
     def __eq__(self,other):
         """
@@ -43,12 +144,104 @@ class Request:
         return: True if there is a match, false if not.
         """
         if type(other) == Request:
-            return self.protocol_version == other.protocol_version and \
-                   self.team_name == other.team_name and \
+            return self.version == other.version and \
+                   self.team == other.team and \
                    self.year == other.year
 
         elif type(other) == SeasonData:
             return other.year == self.year
 
         else:
-            return False
\ No newline at end of file
+            return False
+
+class BatchRequest:
+    """
+    Many (team, season) lookups sent as one message.
+    """
+    def __init__(self, pairs, version=PROTOCOL_VERSION):
+        """
+        :param pairs: list of (team, season) tuples
+        :param version: protocol version
+        """
+        self.version = version
+        self.pairs = list(pairs)
+
+    @staticmethod
+    def for_range(team, first, last, version=PROTOCOL_VERSION):
+        """ :return: request for every season of a team from first to last """
+        return BatchRequest([(team, year) for year in expand_season_range(first, last)],
+                            version)
+
+    def __str__(self):
+        """ Convert request to a csv string """
+        items = [team + BATCH_TEAM_SEPARATOR + year for team, year in self.pairs]
+        return "%d,%s,%s" % (self.version, BATCH, BATCH_ITEM_SEPARATOR.join(items))
+
+    def keep_alive(self):
+        """ :return: True if the connection stays open after the response. """
+        return self.version >= KEEP_ALIVE_VERSION
+
+class AggregateRequest:
+    """
+    A question about many seasons answered by the server (totals over a
+    range, best season, a coach's seasons).
+    """
+    def __init__(self, kind, subject, first=None, last=None, version=PROTOCOL_VERSION):
+        """
+        :param kind: TOTAL, BEST or COACH
+        :param subject: team name (TOTAL, BEST) or coach name (COACH)
+        :param first: first season of the range or None for the first
+        :param last: last season of the range or None for the last
+        :param version: protocol version
+        """
+        self.version = version
+        self.kind = kind
+        self.subject = subject
+        self.first = first
+        self.last = last
+
+    def __str__(self):
+        """ Convert request to a csv string """
+        season_range = ""
+        if self.first is not None:
+            season_range = self.first + BATCH_RANGE_SEPARATOR + self.last
+        return "%d,%s,%s,%s" % (self.version, self.kind, self.subject, season_range)
+
+    def keep_alive(self):
+        """ :return: True if the connection stays open after the response. """
+        return self.version >= KEEP_ALIVE_VERSION
+
+class StatsRequest:
+    """
+    Asks the server for its request counts and latencies.
+    """
+    def __init__(self, version=PROTOCOL_VERSION):
+        self.version = version
+
+    def __str__(self):
+        """ Convert request to a csv string """
+        return "%d,%s" % (self.version, STATS)
+
+    def keep_alive(self):
+        """ :return: True if the connection stays open after the response. """
+        return self.version >= KEEP_ALIVE_VERSION
+
+class SuggestRequest:
+    """
+    Asks the server for team names matching what the user typed so far.
+    """
+    def __init__(self, text="", version=PROTOCOL_VERSION):
+        """
+        :param text: partial or misspelled team name, "" for every team
+        :param version: protocol version
+        """
+        self.version = version
+        self.text = text
+
+    def __str__(self):
+        """ Convert request to a csv string """
+        return "%d,%s,%s" % (self.version, SUGGEST, self.text)
+
+    def keep_alive(self):
+        """ :return: True if the connection stays open after the response. """
+        return self.version >= KEEP_ALIVE_VERSION
@@ -3,46 +3,193 @@ Author:  Jeff Alkire
 Date:    Nov 30, 2022
 Purpose: Thread to handle a user request.
 """
-from codecs import decode
+from socket import SHUT_RD, SHUT_RDWR, timeout
 from threading import Thread
+from time import perf_counter
 
-from request import Request, build_request_from_message
-from response import Response
+from framing import FramingError, LineReader, decode_message, encode_message
 
-BUFSIZE = 1024
+from request import AggregateRequest, BatchRequest, StatsRequest, SuggestRequest
+from request import BEST, COACH, TOTAL, build_request_from_message
+from response import BatchResponse, Response, StatsResponse, SuggestResponse, TotalsResponse
+from response_cache import CachedResponse
+
+def respond_to(line, index, metrics=None, cache=None):
+    """
+    Build the response for a single request line.  Shared by the threaded
+    and the asyncio servers.
+    param line: one request line from the client, as received.
+    param index: SeasonIndex to look the season up in.
+    param metrics: ServerMetrics to count the request in (or None)
+    param cache: EncodedResponseCache of earlier answers (or None).  A hit
+                 skips straight to sending; its time is counted as lookup.
+    return: (encoded response, True if the connection should stay open
+            for more requests)
+    """
+    start = perf_counter()
+    # Read before looking anything up so an answer built while the data is
+    # reloaded is filed under the old generation.
+    generation = index.generation
+    if cache is not None:
+        cached = cache.get(line, generation)
+        if cached is not None:
+            if metrics is not None:
+                metrics.request_answered(cached.hits, cached.misses, 0.0,
+                                         perf_counter() - start, cached=True)
+            return cached.data, cached.keep_alive
+
+    try:
+        request = build_request_from_message(decode_message(line))
+    except (IndexError, ValueError):
+        # Malformed request.  Answer with an empty record and hang up
+        # since the rest of the stream can't be trusted.
+        return encode_message(str(Response(None)) + "\n"), False
+    parsed = perf_counter()
+
+    hits = misses = 0
+    if isinstance(request, StatsRequest):
+        values = metrics.snapshot() if metrics is not None else []
+        response = StatsResponse(values, request.version)
+    elif isinstance(request, SuggestRequest):
+        teams = index.suggest(request.text)
+        hits, misses = (1, 0) if len(teams) > 0 else (0, 1)
+        response = SuggestResponse(teams, request.version)
+    elif isinstance(request, AggregateRequest):
+        response, found = answer_aggregate(request, index)
+        hits, misses = (1, 0) if found else (0, 1)
+    elif isinstance(request, BatchRequest):
+        seasons = [index.lookup(team, year) for team, year in request.pairs]
+        misses = seasons.count(None)
+        hits = len(seasons) - misses
+        response = BatchResponse(seasons, request.version)
+    else:
+        season_data = index.lookup(request.team, request.year)
+        hits, misses = (0, 1) if season_data is None else (1, 0)
+        response = Response(season_data, request.version)
+    data = encode_message(str(response) + "\n")
+    keep_alive = request.keep_alive()
+    if cache is not None and not isinstance(request, StatsRequest):
+        cache.put(line, generation, CachedResponse(data, keep_alive, hits, misses))
+
+    if metrics is not None:
+        metrics.request_answered(hits, misses, parsed - start, perf_counter() - parsed)
+    return data, keep_alive
+
+def answer_aggregate(request, index):
+    """
+    Answer a TOTAL, BEST or COACH request from the precomputed aggregates.
+    param request: AggregateRequest from the client
+    param index: SeasonIndex holding the aggregates
+    return: (the response object to send back, True if the team or coach
+            had any seasons to answer from)
+    """
+    if request.kind == TOTAL:
+        totals = index.totals(request.subject, request.first, request.last)
+        return TotalsResponse(totals, request.version), totals.seasons > 0
+    if request.kind == BEST:
+        season_data = index.best_season(request.subject, request.first, request.last)
+        return Response(season_data, request.version), season_data is not None
+    if request.kind == COACH:
+        seasons = index.by_coach(request.subject)
+        return BatchResponse(seasons, request.version), len(seasons) > 0
+    # Not a kind this server knows: an empty record, like a miss.
+    return Response(None, request.version), False
 
 class RequestHandler(Thread):
     """
-    Thread to handles a client request. One thread per request.
+    Handles a client connection.  The server runs it on one of its pool
+    threads; it can still be start()ed as a thread of its own.  A
+    version 1 connection carries a single request.  A keep-alive connection
+    carries newline terminated requests until the client closes it.
     """
-    def __init__(self, client, cache):
-        """initialize object's connection and data cache."""
+    def __init__(self, client, index, metrics=None, response_cache=None):
+        """
+        initialize object's connection, season index, metrics and cache of
+        encoded responses.
+        """
         Thread.__init__(self)
         self.client = client
-        self.cache = cache
+        self.index = index
+        self.metrics = metrics
+        self.response_cache = response_cache
 
     def run(self):
-        """Process single request and send response."""
-        user_request = decode(self.client.recv(BUFSIZE), "ascii").split()
-        request = build_request_from_message(user_request[0])
-        season_data = self.process(request)
-        text_response = str(Response(season_data)) + "\n"
-        self.client.send(bytes(text_response,"ascii"))
+        """
+        Process requests and send responses until the client closes the
+        connection or sends a request that does not ask for keep-alive.
+        Every complete request already received is answered with a single
+        send so pipelined requests do not cost a round trip each.
+        """
+        if self.metrics is not None:
+            self.metrics.handler_started()
+        try:
+            self.serve_requests()
+        except timeout:
+            # Quiet for the server's idle timeout (or not reading what it
+            # was sent).  Hang up so the thread can serve someone else.
+            if self.metrics is not None:
+                self.metrics.connection_timed_out()
+        finally:
+            self.client.close()
+            if self.metrics is not None:
+                self.metrics.handler_finished()
+
+    def stop(self):
+        """
+        Ask the handler to finish up.  Nothing more is read from the client:
+        requests already received are answered and then the connection is
+        closed.  Called from the listener's thread when the server stops.
+        """
+        self.shutdown_client(SHUT_RD)
 
-        self.client.close()
+    def abort(self):
+        """ Cut the connection off, even in the middle of a response. """
+        self.shutdown_client(SHUT_RDWR)
 
-    def process(self,req):
+    def shutdown_client(self, how):
+        try:
+            self.client.shutdown(how)
+        except OSError:
+            # Already closed by the handler or the client.
+            pass
+
+    def send(self, responses):
         """
-        Routine to process the request.  Search through the cache for the team
-        supplied in the request.  The search all data for this team for the data
-        for the specified year.
-        param req: Request object with the user's request.
-        return: The data for the given team in the given year.  If no data is
-                found, None is returned.
+        Send the responses that are ready in one call.
+        param responses: list of encoded responses
         """
+        start = perf_counter()
+        self.client.sendall(b"".join(responses))
+        if self.metrics is not None:
+            self.metrics.response_sent(perf_counter() - start)
+
+    def serve_requests(self):
+        """ Read, answer and send requests until the connection is done. """
+        reader = LineReader(self.client)
+        responses = []
+        keep_alive = True
         try:
-            team_data = self.cache[req.team]
-            matches = (x for x in team_data if req==x)
-            return next(matches)
-        except:
-            return None
+            while keep_alive:
+                try:
+                    line = reader.readline()
+                except FramingError:
+                    # Request too long to be real.  Hang up.
+                    responses.append(encode_message(str(Response(None)) + "\n"))
+                    break
+                if line == b"":
+                    break
+                if line.strip() == b"":
+                    continue
+                data, keep_alive = respond_to(line, self.index, self.metrics,
+                                              self.response_cache)
+                responses.append(data)
+
+                # Answer everything already received in one send.
+                if not reader.has_line() and len(responses) > 0:
+                    self.send(responses)
+                    responses = []
+
+            if len(responses) > 0:
+                self.send(responses)
+        finally:
+            reader.close()
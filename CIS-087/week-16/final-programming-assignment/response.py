@@ -5,8 +5,84 @@ Purpose: Data structure to contain all relevant portions of the server's
          response to a data request.
 """
 
+from request import BATCH, STATS, SUGGEST, TOTAL
+from season_aggregates import SeasonTotals
 from season_data import SeasonData
 
+# Sent in place of the season fields when the server has no room for another
+# connection.
+SERVER_BUSY = "BUSY"
+
+def is_busy_message(message: str):
+    """
+    :param message: response line from the server
+    :return: True if the server turned the request away because it is busy
+    """
+    entries = message.strip().split(",")
+    return len(entries) == 2 and entries[1] == SERVER_BUSY
+
+def count_from_header(message: str, kind: str):
+    """
+    Multi-line responses start with a header line "<version>,<kind>,<count>"
+    followed by count lines.
+    :param message: first line of a response from the server
+    :param kind: BATCH, STATS or SUGGEST
+    :return: number of lines that follow, or None if the message isn't the
+             header of that kind of response.
+    """
+    entries = message.strip().split(",")
+    if len(entries) == 3 and entries[1] == kind:
+        return int(entries[2])
+    return None
+
+def batch_size_from_message(message: str):
+    """
+    A batch response starts with a header line "<version>,BATCH,<count>"
+    followed by count season lines.
+    :param message: first line of a response from the server
+    :return: number of season lines that follow, or None if the message
+             isn't the header of a batch response.
+    """
+    return count_from_header(message, BATCH)
+
+def stats_size_from_message(message: str):
+    """
+    A stats response starts with a header line "<version>,STATS,<count>"
+    followed by count "name,value" lines.
+    :param message: first line of a response from the server
+    :return: number of lines that follow, or None if the message isn't the
+             header of a stats response.
+    """
+    return count_from_header(message, STATS)
+
+def suggest_size_from_message(message: str):
+    """
+    A suggest response starts with a header line "<version>,SUGGEST,<count>"
+    followed by count team names, one per line.
+    :param message: first line of a response from the server
+    :return: number of names that follow, or None if the message isn't the
+             header of a suggest response.
+    """
+    return count_from_header(message, SUGGEST)
+
+def build_stat_from_message(message: str):
+    """
+    :param message: one "name,value" line of a stats response
+    :return: (name, value) with the value as an int or float
+    """
+    name, value = message.strip().split(",")
+    return name, float(value) if "." in value else int(value)
+
+def build_totals_from_message(message: str):
+    """
+    :param message: response to a TOTAL request
+    :return: the totals as a SeasonTotals object
+    """
+    entries = message.strip().split(",")
+    if len(entries) != 7 or entries[1] != TOTAL:
+        raise ValueError("not a TOTAL response: %s" % message.strip())
+    return SeasonTotals(*[int(e) for e in entries[2:]])
+
 def build_response_from_message(user_request: str):
     """
     Given a comma separated message, build a response object.
@@ -25,8 +101,8 @@ class Response:
     """
     Stores all data about a single season for a single team.
     """
-    def __init__(self, season_info: SeasonData):
-        self.version = 1
+    def __init__(self, season_info: SeasonData, version=1):
+        self.version = version
         if season_info == None:
             self.data = SeasonData(",,,,,,,,,")
         else:
@@ -50,3 +126,90 @@ class Response:
                         self.data.coach_name,
                         self.data.best_player
                        )
+
+class BusyResponse(Response):
+    """
+    Response sent instead of a season when the server is overloaded.
+    """
+    def __init__(self, version=1):
+        Response.__init__(self, None, version)
+
+    def __str__(self):
+        return "%d,%s" % (self.version, SERVER_BUSY)
+
+class BatchResponse:
+    """
+    Response to a batch request.  A header line with the number of seasons is
+    followed by one season per line, in the order they were requested.
+    """
+    def __init__(self, seasons, version=1):
+        """
+        :param seasons: list of SeasonData (None for seasons not found)
+        :param version: protocol version
+        """
+        self.version = version
+        self.seasons = seasons
+
+    def __str__(self):
+        lines = ["%d,%s,%d" % (self.version, BATCH, len(self.seasons))]
+        lines.extend(str(Response(season, self.version)) for season in self.seasons)
+        return "\n".join(lines)
+
+class TotalsResponse:
+    """
+    Response to a TOTAL request:
+        <version>,TOTAL,wins,losses,seasons,playoff appearances,championships
+    """
+    def __init__(self, totals: SeasonTotals, version=1):
+        self.version = version
+        self.totals = totals
+
+    def __str__(self):
+        return "%d,%s,%d,%d,%d,%d,%d" % (self.version,
+                                         TOTAL,
+                                         self.totals.wins,
+                                         self.totals.losses,
+                                         self.totals.seasons,
+                                         self.totals.playoffs,
+                                         self.totals.championships
+                                        )
+
+class StatsResponse:
+    """
+    Response to a STATS request.  A header line with the number of values is
+    followed by one "name,value" line per value.
+    """
+    def __init__(self, values, version=1):
+        """
+        :param values: list of (name, value) pairs from ServerMetrics.snapshot
+        :param version: protocol version
+        """
+        self.version = version
+        self.values = values
+
+    def __str__(self):
+        lines = ["%d,%s,%d" % (self.version, STATS, len(self.values))]
+        for name, value in self.values:
+            if isinstance(value, float):
+                lines.append("%s,%.6f" % (name, value))
+            else:
+                lines.append("%s,%d" % (name, value))
+        return "\n".join(lines)
+
+class SuggestResponse:
+    """
+    Response to a SUGGEST request.  A header line with the number of team
+    names is followed by one name per line, best match first.
+    """
+    def __init__(self, teams, version=1):
+        """
+        :param teams: list of team names
+        :param version: protocol version
+        """
+        self.version = version
+        self.teams = teams
+
+    def __str__(self):
+        lines = ["%d,%s,%d" % (self.version, SUGGEST, len(self.teams))]
+        lines.extend(self.teams)
+        return "\n".join(lines)
@@ -0,0 +1,89 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 22, 2022
+Purpose: Cache of encoded responses keyed by the request line.  The data only
+         changes when it is reloaded, so the same request always gets the same
+         bytes back until then.  A hit skips parsing the request, looking the
+         seasons up, formatting the response and encoding it: the handler
+         just sends the cached bytes.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+# Most responses are one season (about 100 bytes).  Batches can be much
+# bigger, so the cache is limited by total size as well as by entries.
+RESPONSE_CACHE_ENTRIES = 4096
+RESPONSE_CACHE_BYTES = 16 * 1024 * 1024
+
+class CachedResponse:
+    """
+    A response ready to send, with what's needed to count it in the metrics.
+    """
+    __slots__ = ("data", "keep_alive", "hits", "misses")
+
+    def __init__(self, data, keep_alive, hits, misses):
+        """
+        :param data: encoded response, newline included
+        :param keep_alive: True if the connection stays open after sending it
+        :param hits: seasons (or subjects) that were found for the request
+        :param misses: seasons (or subjects) that were not found
+        """
+        self.data = data
+        self.keep_alive = keep_alive
+        self.hits = hits
+        self.misses = misses
+
+class EncodedResponseCache:
+    """
+    Least recently used cache of responses.  Every entry was built from one
+    generation of the SeasonIndex; once the index is reloaded the whole cache
+    is dropped.
+    """
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generation = None
+        self.lock = Lock()
+
+    def get(self, line, generation):
+        """
+        :param line: request line as received
+        :param generation: SeasonIndex.generation the answer has to come from
+        :return: the CachedResponse or None
+        """
+        with self.lock:
+            if generation != self.generation:
+                return None
+            entry = self.entries.get(line)
+            if entry is not None:
+                self.entries.move_to_end(line)
+            return entry
+
+    def put(self, line, generation, entry):
+        """
+        Cache a response, dropping the least recently used ones to make room.
+        :param line: request line as received
+        :param generation: SeasonIndex.generation the answer was built from
+        :param entry: CachedResponse
+        """
+        if len(entry.data) > self.max_bytes:
+            return
+        with self.lock:
+            if generation != self.generation:
+                if self.generation is not None and generation < self.generation:
+                    # Built from data that has since been reloaded.
+                    return
+                self.entries.clear()
+                self.size = 0
+                self.generation = generation
+            old = self.entries.pop(line, None)
+            if old is not None:
+                self.size -= len(old.data)
+            self.entries[line] = entry
+            self.size += len(entry.data)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= len(dropped.data)
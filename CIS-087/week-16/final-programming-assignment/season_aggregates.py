@@ -0,0 +1,96 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 17, 2022
+Purpose: Precomputed totals for each team so the server can answer aggregate
+         questions (wins over a range of seasons, best season, playoff
+         appearances) without walking every season for every request.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from season_data import start_year_of
+
+CHAMPIONSHIP = "Won Finals"
+
+def count_of(text):
+    """ :return: wins or losses column as an int (0 when blank) """
+    text = text.strip()
+    return int(text) if text.isdigit() else 0
+
+def percentage_of(text):
+    """ :return: win % column as a float (-1 when blank so it sorts last) """
+    try:
+        return float(text)
+    except ValueError:
+        return -1.0
+
+class SeasonTotals:
+    """
+    Totals over a range of seasons for one team.
+    """
+    def __init__(self, wins=0, losses=0, seasons=0, playoffs=0, championships=0):
+        self.wins = wins
+        self.losses = losses
+        self.seasons = seasons
+        self.playoffs = playoffs
+        self.championships = championships
+
+class TeamAggregates:
+    """
+    A team's seasons in order with running (prefix) totals of wins, losses,
+    playoff appearances and championships, plus the seasons sorted from best
+    win % to worst.  Totals over any range of seasons are two binary searches
+    and a subtraction.
+    """
+    def __init__(self, team_data):
+        """
+        :param team_data: list of SeasonData for the team (any order)
+        """
+        self.seasons = sorted(team_data, key=lambda s: start_year_of(s.year))
+        self.start_years = [start_year_of(s.year) for s in self.seasons]
+
+        # Entry i is the total of the first i seasons.
+        self.wins = [0]
+        self.losses = [0]
+        self.playoffs = [0]
+        self.championships = [0]
+        for season in self.seasons:
+            self.wins.append(self.wins[-1] + count_of(season.wins))
+            self.losses.append(self.losses[-1] + count_of(season.losses))
+            made_playoffs = season.playoff_results.strip() != ""
+            self.playoffs.append(self.playoffs[-1] + made_playoffs)
+            won_title = season.playoff_results.strip() == CHAMPIONSHIP
+            self.championships.append(self.championships[-1] + won_title)
+
+        # Positions of the seasons from best win % to worst.
+        self.by_win_percentage = sorted(range(len(self.seasons)),
+                                        key=lambda i: percentage_of(self.seasons[i].win_percentage),
+                                        reverse=True)
+
+    def season_range(self, first=None, last=None):
+        """
+        :param first: first season to include (1980-81) or None for the first
+        :param last: last season to include (1989-90) or None for the last
+        :return: (start, end) positions of the seasons in the range
+        """
+        start = 0 if first is None else bisect_left(self.start_years, start_year_of(first))
+        end = len(self.seasons) if last is None \
+              else bisect_right(self.start_years, start_year_of(last))
+        return start, max(start, end)
+
+    def totals(self, first=None, last=None):
+        """ :return: SeasonTotals over the seasons from first to last """
+        start, end = self.season_range(first, last)
+        return SeasonTotals(self.wins[end] - self.wins[start],
+                            self.losses[end] - self.losses[start],
+                            end - start,
+                            self.playoffs[end] - self.playoffs[start],
+                            self.championships[end] - self.championships[start])
+
+    def best_season(self, first=None, last=None):
+        """ :return: the season with the best win % from first to last or None """
+        start, end = self.season_range(first, last)
+        for i in self.by_win_percentage:
+            if start <= i < end:
+                return self.seasons[i]
+        return None
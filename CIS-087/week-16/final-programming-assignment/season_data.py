@@ -4,10 +4,52 @@ Date:    Nov 30, 2022
 Purpose: Data structure to contain all relevant portions of a single basketball season.
 """
 
+import re
+
+# Attributes of a season, in the order of the columns in the csv files.
+SEASON_FIELDS = ("year",
+                 "league_name",
+                 "team_name",
+                 "wins",
+                 "losses",
+                 "win_percentage",
+                 "playoff_results",
+                 "coach_name",
+                 "best_player"
+                )
+
+# A season as written in the Season column: 1980-81
+SEASON_PATTERN = re.compile(r"\s*\d{4}-\d{2}\s*")
+
+def is_season(year: str):
+    """ :return: True if year is a season in the format 1980-81 """
+    return SEASON_PATTERN.fullmatch(year) is not None
+
+def start_year_of(year: str):
+    """
+    :param year: season in the format 1980-81
+    :return: the year the season started in (1980)
+    """
+    return int(year.split("-")[0])
+
+def build_season_from_row(row):
+    """
+    Build a season from the fields of one row already split by the csv module.
+    :param row: list of the nine fields, in csv column order
+    :return: the data as a SeasonData object
+    """
+    season = SeasonData.__new__(SeasonData)
+    season.init_data(*row)
+    return season
+
 class SeasonData:
     """
-    Stores all data about a single season for a single team.
+    Stores all data about a single season for a single team.  Uses __slots__
+    instead of a per object __dict__ since the server keeps every season of
+    every team in memory.
     """
+    __slots__ = SEASON_FIELDS
+
     def __init__(self, line_from_csv_file):
         entries = line_from_csv_file.split(",")
         # Prune /n off end of each line
@@ -0,0 +1,163 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 12, 2022
+Purpose: Lookup tables built from the data cache when the server starts.  A
+         (team, season) lookup is a single dictionary access instead of a scan
+         through every season the team has played.
+"""
+
+import re
+
+from season_aggregates import SeasonTotals, TeamAggregates
+from season_data import start_year_of
+from team_names import TeamNameIndex
+
+# Coaches are stored as "P. Westhead (7-4)-P. Riley (50-21)".  Each match is
+# one coach's name without his record for the season.
+COACH_PATTERN = re.compile(r"-?\s*([^()]+?)\s*\(\d+-\d+\)")
+
+def coach_names(coach_field: str):
+    """
+    Split the coach(es) column of a season into the individual coach names.
+    :param coach_field: coach column from the csv file
+    :return: list of the names of each coach for the season
+    """
+    names = COACH_PATTERN.findall(coach_field)
+    if len(names) == 0 and coach_field.strip() not in ("", "???"):
+        names = [coach_field.strip()]
+    return names
+
+def add_to_index(index: dict, key, season_data):
+    """
+    Add a season to a secondary index that maps one key to many seasons.
+    :param index: dictionary of key -> list of seasons
+    :param key: value to file the season under
+    :param season_data: season to add
+    """
+    if key == "":
+        return
+    if key not in index:
+        index[key] = []
+    index[key].append(season_data)
+
+class SeasonIndex:
+    """
+    Indexes of the data cache.  The primary index maps (team, season) to the
+    record for that season.  Secondary indexes map a league, a coach or a best
+    player to every season they appear in.  Each team also gets a
+    TeamAggregates for range totals and best seasons, and a TeamNameIndex
+    lets a team be found by any of its names.
+    """
+    def __init__(self, cache=None):
+        """
+        Build the indexes for the given cache.
+        :param cache: dictionary of team name -> list of SeasonData
+        """
+        self.seasons = {}
+        self.leagues = {}
+        self.coaches = {}
+        self.best_players = {}
+        self.aggregates = {}
+        self.names = TeamNameIndex()
+        # Bumped every time the indexes are rebuilt, so anything derived from
+        # them (cached responses) can tell it is out of date.
+        self.generation = 0
+        if cache is not None:
+            self.load(cache)
+
+    def load(self, cache):
+        """
+        (Re)build every index from the cache.  The new tables are built off to
+        the side and then swapped in, so lookups running in other threads see
+        either the old tables or the new ones, never a half built one.
+        :param cache: dictionary of team name -> list of SeasonData
+        """
+        seasons = {}
+        leagues = {}
+        coaches = {}
+        best_players = {}
+        aggregates = {}
+        # The same coach column repeats for many seasons.  Split each once.
+        split_coaches = {}
+
+        for team, team_data in list(cache.items()):
+            aggregates[team] = TeamAggregates(team_data)
+            for season in team_data:
+                # Keep the first entry when a file lists a season twice.
+                seasons.setdefault((team, season.year), season)
+                add_to_index(leagues, season.league_name, season)
+                names = split_coaches.get(season.coach_name)
+                if names is None:
+                    names = coach_names(season.coach_name)
+                    split_coaches[season.coach_name] = names
+                for coach in names:
+                    add_to_index(coaches, coach, season)
+                add_to_index(best_players, season.best_player, season)
+
+        # A coach's seasons are listed in the order they were coached.
+        for coached in coaches.values():
+            coached.sort(key=lambda s: start_year_of(s.year))
+        names = TeamNameIndex(cache)
+
+        self.seasons = seasons
+        self.leagues = leagues
+        self.coaches = coaches
+        self.best_players = best_players
+        self.aggregates = aggregates
+        self.names = names
+        self.generation += 1
+
+    def lookup(self, team, year):
+        """
+        Find the record for a team in a given season.
+        :param team: team name (as used in the data cache)
+        :param year: season in the format 1980-81
+        :return: the SeasonData for that season or None if there is none.
+        """
+        season_data = self.seasons.get((team, year))
+        if season_data is None:
+            # Maybe the team was asked for by another name (LA Lakers).
+            team_key = self.names.resolve(team)
+            if team_key is not None:
+                season_data = self.seasons.get((team_key, year))
+        return season_data
+
+    def team_aggregates(self, team):
+        """ :return: TeamAggregates for the team (by any of its names) or None """
+        aggregates = self.aggregates.get(team)
+        if aggregates is None:
+            aggregates = self.aggregates.get(self.names.resolve(team))
+        return aggregates
+
+    def suggest(self, text):
+        """ :return: team names completing (or closest to) what the user typed """
+        return self.names.suggest(text)
+
+    def by_league(self, league):
+        """ :return: list of every season played in the given league """
+        return self.leagues.get(league, [])
+
+    def by_coach(self, coach):
+        """ :return: list of every season the given coach coached in, oldest first """
+        return self.coaches.get(coach, [])
+
+    def by_best_player(self, player):
+        """ :return: list of every season the given player was the top player """
+        return self.best_players.get(player, [])
+
+    def totals(self, team, first=None, last=None):
+        """
+        :return: SeasonTotals for the team's seasons from first to last
+                 (all zero for an unknown team)
+        """
+        aggregates = self.team_aggregates(team)
+        if aggregates is None:
+            return SeasonTotals()
+        return aggregates.totals(first, last)
+
+    def best_season(self, team, first=None, last=None):
+        """ :return: the team's best season by win % from first to last or None """
+        aggregates = self.team_aggregates(team)
+        if aggregates is None:
+            return None
+        return aggregates.best_season(first, last)
@@ -0,0 +1,304 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 21, 2022
+Purpose: Reproducible benchmark of the NBA record server.  Writes synthetic
+         team files (N teams x M seasons) to a temporary directory, starts the
+         listener in this process on a free port, drives it with concurrent
+         clients speaking the Request protocol and reports throughput, latency
+         percentiles, the server's own phase timings and the process RSS.
+
+         Results can be saved (tagged with the current git commit) and two
+         saved runs compared, so a change can be measured before and after:
+
+         python server_benchmark.py --save before.json
+         python server_benchmark.py --save after.json
+         python server_benchmark.py --compare before.json after.json
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from socket import create_connection
+from threading import Thread
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.  RSS is then read from /proc or left out.
+    resource = None
+
+import nba_record_server
+from framing import LineReader, encode_message
+from request import KEEP_ALIVE_VERSION, SINGLE_REQUEST_VERSION, Request, season_name
+from server_metrics import PHASES
+
+FIRST_YEAR = 1946
+STARTUP_TIMEOUT_SECONDS = 30
+HEADER = ["Season", "League", "Team", "W", "L", "Win %",
+          "Playoff Result", "Coach(es)", "Top Player"]
+
+# Values shown by --compare, and whether bigger is better.
+COMPARED = [("rps", True), ("p50_ms", False), ("p90_ms", False),
+            ("p99_ms", False), ("max_ms", False), ("rss_mb", False)]
+
+def team_name(number):
+    """ :return: name of a synthetic team as the server reports it """
+    return "Team%03d" % number
+
+def write_team_files(data_dir, teams, seasons):
+    """
+    Write one csv file per team in the same layout as data-dir.
+    :param data_dir: directory to write the files to
+    :param teams: number of teams
+    :param seasons: number of seasons per team
+    """
+    rng = random.Random(teams * 100003 + seasons)
+    for t in range(teams):
+        path = os.path.join(data_dir, team_name(t).lower() + ".csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            rows = csv.writer(f)
+            rows.writerow(HEADER)
+            for yr in range(FIRST_YEAR, FIRST_YEAR + seasons):
+                wins = rng.randint(10, 72)
+                losses = 82 - wins
+                rows.writerow([season_name(yr), "NBA", "City " + team_name(t),
+                               wins, losses, "%.3f" % (wins / 82),
+                               "Lost Finals" if wins > 60 else "",
+                               "Coach %d (%d-%d)" % (yr % 17, wins, losses),
+                               "Player %d" % (yr % 41)])
+
+def rss_mb():
+    """ :return: resident set size of this process in MB, or None if unknown """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Peak rather than current, in KB on Linux (bytes on macOS).
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+def git_commit():
+    """ :return: short hash of the commit being measured, or "" outside git """
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def percentile(sorted_values, fraction):
+    """
+    :param sorted_values: values in ascending order
+    :param fraction: 0.5 for the median, 0.99 for p99 ...
+    :return: value at the given percentile
+    """
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+def start_listener(mode, data_dir, workers, queue_depth):
+    """
+    Load data_dir and start a listener in this process on a free port.
+    :return: the listener, once it is accepting connections
+    """
+    cwd = os.getcwd()
+    if mode == "async":
+        listener = nba_record_server.AsyncNbaRecordServerListener(
+            snapshot_file=None, data_dir=data_dir,
+            address=(nba_record_server.HOST, 0))
+    else:
+        listener = nba_record_server.NbaRecordServerListener(
+            workers, queue_depth, snapshot_file=None, data_dir=data_dir,
+            address=(nba_record_server.HOST, 0))
+    # load_data moved into the data directory.
+    os.chdir(cwd)
+    listener.start()
+    if not listener.ready.wait(STARTUP_TIMEOUT_SECONDS):
+        raise RuntimeError("%s listener did not start" % mode)
+    return listener
+
+class BenchmarkClient(Thread):
+    """
+    One simulated client.  With keep-alive every request goes over one
+    connection, otherwise each request opens a new connection (version 1).
+    """
+    def __init__(self, address, requests, request_count, keep_alive, seed):
+        """
+        :param address: (host, port) of the server
+        :param requests: (team, season) pairs to choose from
+        :param request_count: number of requests to send
+        :param keep_alive: True to reuse one connection
+        :param seed: random seed so runs send the same requests
+        """
+        Thread.__init__(self)
+        self.address = address
+        self.requests = requests
+        self.request_count = request_count
+        self.keep_alive = keep_alive
+        self.rng = random.Random(seed)
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        version = KEEP_ALIVE_VERSION if self.keep_alive else SINGLE_REQUEST_VERSION
+        sock = reader = None
+        for _ in range(self.request_count):
+            team, year = self.rng.choice(self.requests)
+            message = encode_message(str(Request(team, year, version)) + "\n")
+            start = time.perf_counter()
+            try:
+                if sock is None:
+                    sock = create_connection(self.address)
+                    reader = LineReader(sock)
+                sock.sendall(message)
+                if reader.readline() == b"":
+                    raise ConnectionError("server closed the connection")
+            except OSError:
+                self.errors += 1
+                if sock is not None:
+                    sock.close()
+                sock = None
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            if not self.keep_alive:
+                sock.close()
+                sock = None
+        if sock is not None:
+            sock.close()
+
+def run_benchmark(args):
+    """
+    Generate the data, start the server, run the clients.
+    :return: dictionary of results
+    """
+    with tempfile.TemporaryDirectory(prefix="nba-benchmark-") as data_dir:
+        write_team_files(data_dir, args.teams, args.seasons)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            # The server's own output still costs it the formatting.
+            load_start = time.perf_counter()
+            listener = start_listener(args.mode, data_dir, args.workers, args.queue_depth)
+            load_seconds = time.perf_counter() - load_start
+            rss_loaded = rss_mb()
+
+            pairs = [(team_name(t), season_name(yr)) for t in range(args.teams)
+                     for yr in range(FIRST_YEAR, FIRST_YEAR + args.seasons)]
+            clients = [BenchmarkClient(listener.address, pairs, args.requests,
+                                       args.keep_alive, args.seed + c)
+                       for c in range(args.clients)]
+            start = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - start
+            server = dict(listener.metrics.snapshot())
+            listener.stop()
+            listener.join()
+
+    latencies = sorted(lat for client in clients for lat in client.latencies)
+    results = {"commit": git_commit(),
+               "date": time.ctime(),
+               "config": vars(args).copy(),
+               "requests": len(latencies),
+               "errors": sum(client.errors for client in clients),
+               "seconds": elapsed,
+               "load_seconds": load_seconds,
+               "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+               "p50_ms": percentile(latencies, 0.50) * 1000,
+               "p90_ms": percentile(latencies, 0.90) * 1000,
+               "p99_ms": percentile(latencies, 0.99) * 1000,
+               "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+               "rss_loaded_mb": rss_loaded,
+               "rss_mb": rss_mb(),
+               "server": server}
+    for name in ("save", "compare"):
+        results["config"].pop(name, None)
+    return results
+
+def print_results(results):
+    config = results["config"]
+    print("commit %s  %s" % (results["commit"] or "-", results["date"]))
+    print("%s server, %d teams x %d seasons, %d clients x %d requests (%s)"
+          % (config["mode"], config["teams"], config["seasons"], config["clients"],
+             config["requests"],
+             "keep-alive" if config["keep_alive"] else "connection per request"))
+    print("data loaded in %.3f seconds" % results["load_seconds"])
+    print("%d requests, %d errors in %.3f seconds: %.1f req/sec"
+          % (results["requests"], results["errors"], results["seconds"], results["rps"]))
+    print("latency ms   p50 %.3f   p90 %.3f   p99 %.3f   max %.3f"
+          % (results["p50_ms"], results["p90_ms"], results["p99_ms"], results["max_ms"]))
+    server = results["server"]
+    for phase in PHASES:
+        print("server %-6s p50 %.3f   p99 %.3f   mean %.3f ms"
+              % (phase, server[phase + ".p50_ms"], server[phase + ".p99_ms"],
+                 server[phase + ".mean_ms"]))
+    if results["rss_mb"] is not None:
+        print("RSS MB       after load %.1f   after run %.1f"
+              % (results["rss_loaded_mb"], results["rss_mb"]))
+
+def compare(before_path, after_path):
+    """ Print two saved runs side by side with the change between them. """
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    if before["config"] != after["config"]:
+        print("WARNING: the runs used different settings")
+    print("%-10s %14s %14s %10s" % ("", before["commit"] or before_path,
+                                    after["commit"] or after_path, "change"))
+    for name, bigger_is_better in COMPARED:
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        better = (change > 0) == bigger_is_better and change != 0
+        print("%-10s %14.3f %14.3f %+9.1f%% %s" % (name, old, new, change,
+                                                   "better" if better else ""))
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="NBA record server benchmark")
+    # prefork serves from other processes, so it can't be started in this one.
+    parser.add_argument("--mode", choices=["threaded", "async"],
+                        default="threaded", help="server mode to measure")
+    parser.add_argument("--teams", type=int, default=30, help="synthetic teams")
+    parser.add_argument("--seasons", type=int, default=80, help="seasons per team")
+    parser.add_argument("--clients", type=int, default=50,
+                        help="number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="requests sent by each client")
+    parser.add_argument("--keep-alive", action="store_true",
+                        help="send every request of a client over one connection")
+    parser.add_argument("--workers", type=int, default=nba_record_server.WORKER_THREADS,
+                        help="server handler threads (threaded mode)")
+    parser.add_argument("--queue-depth", type=int, default=nba_record_server.QUEUE_DEPTH,
+                        help="connections waiting for a worker (threaded mode)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--save", help="write the results to this json file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two saved runs instead of running one")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    if args.compare:
+        compare(*args.compare)
+        return
+    save_path = os.path.abspath(args.save) if args.save else None
+    results = run_benchmark(args)
+    print_results(results)
+    if save_path is not None:
+        with open(save_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print("saved to %s" % save_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 20, 2022
+Purpose: Counters and latency histograms for the NBA record server.  Tracks
+         requests, cache hits and misses, connections and the handlers busy
+         right now, plus how long each request spends being parsed, looked up
+         and sent.  The numbers are sent back for a STATS request and written
+         to the server's log every so often.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from time import ctime
+
+# Phases of answering a request that are timed.
+PARSE = "parse"
+LOOKUP = "lookup"
+SEND = "send"
+PHASES = (PARSE, LOOKUP, SEND)
+
+# Upper bounds (microseconds) of the histogram buckets.  The last bucket holds
+# everything slower.
+BUCKET_BOUNDS_US = (10, 20, 50, 100, 200, 500,
+                    1000, 2000, 5000, 10000, 20000, 50000,
+                    100000, 200000, 500000, 1000000)
+
+class LatencyHistogram:
+    """
+    Counts of latencies in fixed buckets.  Recording is a binary search and an
+    increment, so it is cheap enough to do for every request.  Percentiles are
+    reported as the upper bound of the bucket they fall in (or the maximum,
+    if that is lower).
+    """
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """ :param seconds: how long one request spent in the phase """
+        self.buckets[bisect_left(BUCKET_BOUNDS_US, seconds * 1000000)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def mean(self):
+        """ :return: average latency in seconds """
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def percentile(self, fraction):
+        """
+        :param fraction: 0.5 for the median, 0.99 for p99 ...
+        :return: latency (seconds) that fraction of the requests were within
+        """
+        if self.count == 0:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= wanted:
+                if i == len(BUCKET_BOUNDS_US):
+                    return self.max
+                # Never more than the slowest latency actually recorded.
+                return min(BUCKET_BOUNDS_US[i] / 1000000, self.max)
+        return self.max
+
+class ServerMetrics:
+    """
+    Everything measured about a running server.  Shared by all handler
+    threads, so updates are made under a lock.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = 0
+        self.cached = 0
+        self.hits = 0
+        self.misses = 0
+        self.connections = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.active_handlers = 0
+        self.latencies = {phase: LatencyHistogram() for phase in PHASES}
+
+    def handler_started(self):
+        """ A connection is being handled. """
+        with self.lock:
+            self.connections += 1
+            self.active_handlers += 1
+
+    def handler_finished(self):
+        """ A connection has been closed. """
+        with self.lock:
+            self.active_handlers -= 1
+
+    def connection_rejected(self):
+        """ A connection was turned away because the server was busy. """
+        with self.lock:
+            self.rejected += 1
+
+    def connection_timed_out(self):
+        """ A connection was closed for sending nothing for too long. """
+        with self.lock:
+            self.timed_out += 1
+
+    def request_answered(self, hits, misses, parse_seconds, lookup_seconds, cached=False):
+        """
+        Count one request.
+        :param hits: seasons (or subjects) found in the data cache
+        :param misses: seasons (or subjects) that were not found
+        :param parse_seconds: time spent turning the message into a request
+        :param lookup_seconds: time spent building the response
+        :param cached: True if the response came from the response cache
+        """
+        with self.lock:
+            self.requests += 1
+            self.cached += cached
+            self.hits += hits
+            self.misses += misses
+            self.latencies[PARSE].record(parse_seconds)
+            self.latencies[LOOKUP].record(lookup_seconds)
+
+    def response_sent(self, seconds):
+        """ :param seconds: time spent sending one batch of responses """
+        with self.lock:
+            self.latencies[SEND].record(seconds)
+
+    def snapshot(self):
+        """
+        :return: list of (name, value) pairs.  Latencies are in milliseconds.
+        """
+        with self.lock:
+            values = [("requests", self.requests),
+                      ("cached_responses", self.cached),
+                      ("hits", self.hits),
+                      ("misses", self.misses),
+                      ("connections", self.connections),
+                      ("rejected", self.rejected),
+                      ("timed_out", self.timed_out),
+                      ("active_handlers", self.active_handlers)]
+            for phase in PHASES:
+                histogram = self.latencies[phase]
+                values.extend([(phase + ".count", histogram.count),
+                               (phase + ".mean_ms", histogram.mean() * 1000),
+                               (phase + ".p50_ms", histogram.percentile(0.50) * 1000),
+                               (phase + ".p99_ms", histogram.percentile(0.99) * 1000),
+                               (phase + ".max_ms", histogram.max * 1000)])
+        return values
+
+    def report(self):
+        """ :return: the metrics as a block of text for the log """
+        lines = ["--- %s" % ctime()]
+        for name, value in self.snapshot():
+            if isinstance(value, float):
+                lines.append("%-18s %12.3f" % (name, value))
+            else:
+                lines.append("%-18s %12d" % (name, value))
+        return "\n".join(lines) + "\n"
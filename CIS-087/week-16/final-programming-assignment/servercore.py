@@ -0,0 +1,20 @@
+"""
+File: servercore.py
+The limits shared by the socket servers are kept in one file,
+data-files/Data Files/Ch_10_Student_Files/ClientServer/servercore.py.
+This loads that file in place of itself, so the servers here import
+servercore as usual and can't drift from the others.
+"""
+
+import importlib.util
+import os
+import sys
+
+SHARED = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+                      "data-files", "Data Files", "Ch_10_Student_Files", "ClientServer",
+                      "servercore.py")
+
+spec = importlib.util.spec_from_file_location(__name__, SHARED)
+module = importlib.util.module_from_spec(spec)
+sys.modules[__name__] = module
+spec.loader.exec_module(module)
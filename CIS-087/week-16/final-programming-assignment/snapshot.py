@@ -0,0 +1,134 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 16, 2022
+Purpose: Binary snapshot of the server's data cache.  After the csv files are
+         parsed the whole cache is written to one file which later starts
+         memory map and read back instead of parsing the csv files again, as
+         long as no data file has changed since the snapshot was written.
+
+         Layout (all numbers little endian):
+             header      magic, number of files, strings, teams and seasons,
+                         size of the string data
+             offsets     (strings + 1) uint32 offsets into the string data
+             strings     utf-8 text of every distinct string, back to back
+             files       per data file:  string id of its name, mtime (ns)
+             teams       per team:  string id of its name, first season,
+                         number of seasons
+             seasons     per season:  nine string ids, one per SeasonData field
+"""
+
+import mmap
+import os
+import struct
+
+from season_data import SEASON_FIELDS, build_season_from_row
+
+MAGIC = b"NBASNAP1"
+HEADER = struct.Struct("<8sIIIII")
+FILE_RECORD = struct.Struct("<Iq")
+TEAM_RECORD = struct.Struct("<III")
+SEASON_RECORD = struct.Struct("<%dI" % len(SEASON_FIELDS))
+
+class StringTable:
+    """ Gives each distinct string an id while a snapshot is written. """
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def id_of(self, text):
+        """ :return: id of the string, adding it to the table if it's new """
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[text] = string_id
+            self.strings.append(text)
+        return string_id
+
+def write_snapshot(path, file_mtimes, cache):
+    """
+    Write the cache to a snapshot file.  The file is written next to its final
+    name and then renamed so a reader never sees a partial snapshot.
+    :param path: file to write the snapshot to
+    :param file_mtimes: dictionary of data file name -> mtime (ns) the cache
+                        was loaded from
+    :param cache: dictionary of team name -> list of SeasonData
+    """
+    table = StringTable()
+    files = b"".join(FILE_RECORD.pack(table.id_of(name), mtime)
+                     for name, mtime in file_mtimes.items())
+    teams = []
+    seasons = []
+    for team, team_data in list(cache.items()):
+        teams.append(TEAM_RECORD.pack(table.id_of(team), len(seasons), len(team_data)))
+        for season in team_data:
+            seasons.append(SEASON_RECORD.pack(
+                *[table.id_of(getattr(season, field)) for field in SEASON_FIELDS]))
+
+    encoded = [text.encode("utf-8") for text in table.strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(file_mtimes), len(encoded), len(teams),
+                            len(seasons), offsets[-1]))
+        f.write(struct.pack("<%dI" % len(offsets), *offsets))
+        f.write(b"".join(encoded))
+        f.write(files)
+        f.write(b"".join(teams))
+        f.write(b"".join(seasons))
+    os.replace(temp_path, path)
+
+def read_snapshot(path, file_mtimes):
+    """
+    Load the cache from a snapshot file, if it was made from the data files as
+    they are now.
+    :param path: snapshot file to read
+    :param file_mtimes: dictionary of data file name -> mtime (ns) of the data
+                        files as they are now
+    :return: dictionary of team name -> list of SeasonData, or None when there
+             is no usable snapshot (missing, damaged or out of date).
+    """
+    try:
+        with open(path, "rb") as f, \
+             mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return decode_snapshot(mm, file_mtimes)
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+def decode_snapshot(mm, file_mtimes):
+    """ Body of read_snapshot, working on the mapped file. """
+    magic, file_count, string_count, team_count, season_count, string_bytes = \
+        HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or file_count != len(file_mtimes):
+        return None
+
+    pos = HEADER.size
+    offsets = struct.unpack_from("<%dI" % (string_count + 1), mm, pos)
+    pos += 4 * (string_count + 1)
+
+    data = mm[pos:pos + string_bytes]
+    strings = [str(data[offsets[i]:offsets[i + 1]], "utf-8")
+               for i in range(string_count)]
+    pos += string_bytes
+
+    # Out of date if any data file was added, removed or changed.
+    end = pos + FILE_RECORD.size * file_count
+    for name_id, mtime in FILE_RECORD.iter_unpack(mm[pos:end]):
+        if file_mtimes.get(strings[name_id]) != mtime:
+            return None
+    pos = end
+
+    end = pos + TEAM_RECORD.size * team_count
+    teams = list(TEAM_RECORD.iter_unpack(mm[pos:end]))
+    pos = end
+
+    end = pos + SEASON_RECORD.size * season_count
+    seasons = [build_season_from_row([strings[i] for i in record])
+               for record in SEASON_RECORD.iter_unpack(mm[pos:end])]
+
+    cache = {}
+    for name_id, first, count in teams:
+        cache[strings[name_id]] = seasons[first:first + count]
+    return cache
@@ -0,0 +1,171 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 23, 2022
+Purpose: Find teams by the names people actually type.  Every team is known
+         by its data file name (Lakers) and by aliases taken from its seasons:
+         the full names it played under (Minneapolis Lakers), its cities (Los
+         Angeles) and their initials (LA Lakers).  A trie of the aliases gives
+         prefix completions; names that aren't a prefix of anything fall back
+         to the closest aliases by edit distance.
+"""
+
+import re
+
+MAX_SUGGESTIONS = 10
+
+# Periods and apostrophes are dropped (L.A. is LA).  Anything else other than
+# letters and digits separates words.
+DROPPED = re.compile(r"[.']")
+NON_WORD = re.compile(r"[^0-9a-z]+")
+
+def normalize_name(name: str):
+    """ :return: the name in lower case with punctuation and extra spaces removed """
+    return " ".join(NON_WORD.split(DROPPED.sub("", name.lower()))).strip()
+
+def aliases_of(team_name: str):
+    """
+    Names a team went by in one season.
+    :param team_name: team column of a season (New Orleans/Oklahoma City Hornets)
+    :return: set of normalized aliases (full name, city, city initials + nickname ...)
+    """
+    aliases = {normalize_name(team_name)}
+    words = team_name.split()
+    if len(words) < 2:
+        return aliases - {""}
+    nickname = words[-1]
+    aliases.add(normalize_name(nickname))
+    for city in " ".join(words[:-1]).split("/"):
+        city_words = normalize_name(city).split()
+        if len(city_words) == 0:
+            continue
+        aliases.add(" ".join(city_words))
+        aliases.add(normalize_name(city + " " + nickname))
+        if len(city_words) > 1:
+            initials = "".join(word[0] for word in city_words)
+            aliases.add(initials)
+            aliases.add(initials + " " + normalize_name(nickname))
+    return aliases - {""}
+
+def edit_distance(a: str, b: str, limit: int):
+    """
+    Levenshtein distance between two strings.
+    :param limit: stop early and return limit + 1 once the distance must be
+                  greater than limit
+    :return: number of single character edits turning a into b
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class TrieNode:
+    """
+    One character of the aliases.  teams holds every team with an alias
+    passing through this node, so completing a prefix never has to walk the
+    nodes below it.
+    """
+    __slots__ = ("children", "teams")
+
+    def __init__(self):
+        self.children = {}
+        self.teams = set()
+
+class TeamNameIndex:
+    """
+    Alias table and trie for the teams in the data cache.
+    """
+    def __init__(self, cache=None):
+        """
+        :param cache: dictionary of team name -> list of SeasonData
+        """
+        self.teams = []
+        self.aliases = {}
+        self.root = TrieNode()
+        if cache is not None:
+            for team, team_data in cache.items():
+                self.add_team(team, {season.team_name for season in team_data})
+            self.teams.sort()
+
+    def add_team(self, team, team_names=()):
+        """
+        :param team: name the team is stored under (Lakers)
+        :param team_names: names it played under (Los Angeles Lakers ...)
+        """
+        self.teams.append(team)
+        self.add_alias(normalize_name(team), team)
+        for team_name in team_names:
+            for alias in aliases_of(team_name):
+                self.add_alias(alias, team)
+
+    def add_alias(self, alias, team):
+        """
+        Make a (normalized) alias find a team.  Every word of the alias starts
+        a trie entry, so "ange" completes to Los Angeles.
+        """
+        self.aliases.setdefault(alias, set()).add(team)
+        words = alias.split(" ")
+        for start in range(len(words)):
+            node = self.root
+            for char in " ".join(words[start:]):
+                node = node.children.setdefault(char, TrieNode())
+                node.teams.add(team)
+
+    def resolve(self, name):
+        """
+        :param name: name typed by a user (la lakers, L.A. Lakers, lakers ...)
+        :return: the name the team is stored under, or None if the name isn't
+                 an alias of exactly one team
+        """
+        teams = self.aliases.get(normalize_name(name))
+        if teams is None or len(teams) != 1:
+            return None
+        return next(iter(teams))
+
+    def complete(self, prefix):
+        """ :return: sorted list of the teams with an alias starting with prefix """
+        node = self.root
+        for char in normalize_name(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return sorted(node.teams)
+
+    def closest(self, name, limit=None):
+        """
+        :param name: name that isn't a prefix of any alias (a typo)
+        :param limit: most edits allowed, by default a third of the name
+        :return: teams with an alias within limit edits, closest first
+        """
+        name = normalize_name(name)
+        if limit is None:
+            limit = max(1, len(name) // 3)
+        best = {}
+        for alias, teams in self.aliases.items():
+            distance = edit_distance(name, alias, limit)
+            if distance <= limit:
+                for team in teams:
+                    best[team] = min(distance, best.get(team, distance))
+        return sorted(best, key=lambda team: (best[team], team))
+
+    def suggest(self, text, max_suggestions=MAX_SUGGESTIONS):
+        """
+        :param text: what the user typed so far
+        :return: team names to offer.  Every team for empty text, otherwise
+                 prefix completions or, when there are none, the closest
+                 matches (at most max_suggestions).
+        """
+        if normalize_name(text) == "":
+            return list(self.teams)
+        teams = self.complete(text)
+        if len(teams) == 0:
+            teams = self.closest(text)
+        return teams[:max_suggestions]
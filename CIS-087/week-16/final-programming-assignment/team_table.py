@@ -0,0 +1,136 @@
+"""
+Author:  Jeff Alkire
+Date:    Dec 14, 2022
+Purpose: Columnar storage for every season of a team.  Each attribute of a
+         season is kept in its own column (parallel arrays) instead of in one
+         object per season.  Wins and losses are stored as ints and the win
+         percentage as a float.  Rows read back with the same attributes as
+         SeasonData so they can be handed to Response.
+"""
+
+from array import array
+from sys import intern
+
+# Stored in the int columns when the csv file leaves wins or losses blank and
+# in the float column when the win percentage is blank.
+MISSING_INT = -1
+MISSING_FLOAT = -1.0
+
+def to_int(text):
+    """ :return: the text as an int or MISSING_INT if it is blank """
+    text = text.strip()
+    return int(text) if text != "" else MISSING_INT
+
+def to_float(text):
+    """ :return: the text as a float or MISSING_FLOAT if it is blank """
+    text = text.strip()
+    return float(text) if text != "" else MISSING_FLOAT
+
+def int_text(value):
+    """ :return: the int column value as the text the csv file had """
+    return "" if value == MISSING_INT else str(value)
+
+def percentage_text(value):
+    """ :return: win % formatted the way the csv files have it (.756) """
+    if value == MISSING_FLOAT:
+        return ""
+    text = "%.3f" % value
+    return text[1:] if text.startswith("0") else text
+
+class SeasonRow:
+    """
+    View of one row of a TeamTable.  Has the same attributes as SeasonData.
+    """
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def year(self):
+        return self.table.years[self.row]
+
+    @property
+    def league_name(self):
+        return self.table.league_names[self.row]
+
+    @property
+    def team_name(self):
+        return self.table.team_names[self.row]
+
+    @property
+    def wins(self):
+        return int_text(self.table.wins[self.row])
+
+    @property
+    def losses(self):
+        return int_text(self.table.losses[self.row])
+
+    @property
+    def win_percentage(self):
+        return percentage_text(self.table.win_percentages[self.row])
+
+    @property
+    def playoff_results(self):
+        return self.table.playoff_results[self.row]
+
+    @property
+    def coach_name(self):
+        return self.table.coach_names[self.row]
+
+    @property
+    def best_player(self):
+        return self.table.best_players[self.row]
+
+class TeamTable:
+    """
+    Every season of one team stored column by column.  Text columns are lists
+    of interned strings so repeated values (league, team name, coach) are
+    stored once.  Numeric columns are typed arrays.
+    """
+    def __init__(self, seasons=()):
+        """
+        :param seasons: SeasonData objects (or anything with the same
+                        attributes) to fill the table with
+        """
+        self.years = []
+        self.league_names = []
+        self.team_names = []
+        self.wins = array("i")
+        self.losses = array("i")
+        self.win_percentages = array("d")
+        self.playoff_results = []
+        self.coach_names = []
+        self.best_players = []
+        for season in seasons:
+            self.append(season)
+
+    def append(self, season):
+        """
+        Add a season as a new row at the bottom of the table.
+        :param season: SeasonData to copy into the columns
+        """
+        self.years.append(intern(season.year))
+        self.league_names.append(intern(season.league_name))
+        self.team_names.append(intern(season.team_name))
+        self.wins.append(to_int(season.wins))
+        self.losses.append(to_int(season.losses))
+        self.win_percentages.append(to_float(season.win_percentage))
+        self.playoff_results.append(intern(season.playoff_results))
+        self.coach_names.append(intern(season.coach_name))
+        self.best_players.append(intern(season.best_player))
+
+    def __len__(self):
+        return len(self.years)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if row < 0 or row >= len(self):
+            raise IndexError("season row out of range")
+        return SeasonRow(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield SeasonRow(self, row)